@@ -1,61 +1,232 @@
 import pandas as pd
-import json
 import time
-import csv
 import os
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv, find_dotenv
-from groq import Groq
 import streamlit as st
+try:
+    from streamlit.runtime.scriptrunner import RerunException, StopException
+except ImportError:
+    # Streamlit < 1.12: o módulo ficava fora de streamlit.runtime
+    from streamlit.scriptrunner import RerunException, StopException
+
+from utils.cliente import obter_cliente, estatisticas as estatisticas_conexao
+from utils.limites import obter_limitador, LimiteExcedido
+from utils.hedge import CorridaStreams, LimiarHedge, OrcamentoHedge
+from utils.geracao import GeracaoStream, RegistroGeracoes
+from utils.roteador import obter_roteador
+from utils.contexto import IndiceContexto, CacheContexto, assinatura_arquivos
+from utils.projecao import projetar_metas, texto_metas, aporte_estimado
+from utils.elegibilidade import IndiceElegibilidade, capital_disponivel
+from utils.rentabilidade import ModeloTaxas, carregar_referencias, ARQUIVO_REFERENCIAS
+from utils.clientes import ArmazemClientes, CLIENTE_PADRAO
+from utils.janela import JanelaConversa
+from utils.sessoes import ArmazemSessoes, PASTA_SESSOES, id_valido, novo_id
+from utils.cache_respostas import CacheRespostas, chave_cache
+from utils.metricas import obter_coletor
+from utils.escopo import AutomatoFrases
+from utils.render import RenderizadorStream
+from utils.tempos import CronometroRequisicao
+from utils.tokens import aplicar_teto, contar_tokens, tokens_em_cache, metodo as metodo_tokens
+from utils.banco_metricas import TABELA_CHAT, ler_periodo
 
 # Carrega as variáveis de ambiente do arquivo .env (ex: GROQ_API)
 load_dotenv(find_dotenv())
 
-# Instancia o cliente Groq usando a chave de API definida no .env
-client = Groq(
-    api_key=os.environ.get('GROQ_API')
-)
+# O que disparou esta execução — é o motivo de cancelar a resposta da
+# execução anterior, se ela ainda estiver sendo gerada (seção 11)
+if st.session_state.get('limpar_conversa'):
+    motivo_cancelamento = 'limpar'
+elif st.session_state.get('pergunta'):
+    motivo_cancelamento = 'nova_pergunta'
+else:
+    motivo_cancelamento = 'rerun'
+
+# A execução anterior foi interrompida no meio do stream e deixou a
+# geração aqui: cancela já, antes de qualquer trabalho desta execução
+# (carregar dados, montar contexto), para o prazo de reserva não vencer
+geracao_interrompida = st.session_state.pop('geracao_interrompida', None)
+if geracao_interrompida is not None:
+    geracao_interrompida.cancelar(motivo_cancelamento)
+
+# Cliente Groq único por processo (utils/cliente.py): compartilhado entre
+# sessões e reruns, com pool de conexões e keep-alive.
+# A chave de API vem do .env (GROQ_API).
+client = obter_cliente()
+
+# Limites de requisição por chave e por modelo (utils/limites.py):
+# acima da taxa, as chamadas esperam na fila; 429/5xx são repetidos
+# com backoff. A espera vai para a métrica espera_fila_s.
+limitador = obter_limitador()
+CHAVE_API = os.environ.get('GROQ_API')
 
 
 # ============================================================
 # 1. CARREGANDO OS DADOS COM CACHE
-# @st.cache_data faz o Streamlit guardar o resultado em memória.
-# Os arquivos só são lidos do disco UMA vez — nas próximas
-# interações, o Streamlit retorna direto do cache. Ganho real de performance.
+# Os dados de cada cliente ficam em data/clientes/<id>/ e são lidos
+# só quando o cliente é pedido (utils/clientes.py). O armazém fica em
+# @st.cache_resource — um por processo, compartilhado entre sessões —
+# e mantém em memória só os CLIENTES_EM_MEMORIA usados mais
+# recentemente. Os arquivos soltos em data/ são o cliente 'padrao'.
+#
+# Cada cliente tem um carregador (utils/dados.py) que, a cada rerun,
+# confere os arquivos com os.stat; se um CSV cresceu, parseia só as
+# linhas novas. Truncamento ou reescrita provocam releitura completa.
+# A assinatura (mtime + tamanho) identifica a versão dos dados para
+# os caches que dependem deles (índice do contexto).
+#
+# O cliente vem da URL (?cliente=<id>) ou de CLIENTE_ID.
 # ============================================================
-@st.cache_data
+ARQUIVO_PRODUTOS = 'data/produtos_financeiros.json'
+ARQUIVOS_PADRAO  = (
+    'data/historico_atendimento.csv',
+    'data/transacoes.csv',
+    'data/perfil_investidor.json',
+)
+
+CLIENTES_EM_MEMORIA = int(os.environ.get('CLIENTES_EM_MEMORIA', 256))
+
+# De quantos em quantos segundos a barra lateral confere os arquivos
+# sozinha (sem o usuário interagir); 0 desliga
+DADOS_OBSERVAR_S = float(os.environ.get('DADOS_OBSERVAR_S', 5))
+
+@st.cache_resource
+def obter_armazem_clientes():
+    return ArmazemClientes(ARQUIVO_PRODUTOS, padrao=ARQUIVOS_PADRAO, max_clientes=CLIENTES_EM_MEMORIA)
+
+armazem_clientes = obter_armazem_clientes()
+
+cliente_id = st.query_params.get('cliente', os.environ.get('CLIENTE_ID', CLIENTE_PADRAO))
+try:
+    carregador_dados = armazem_clientes.obter(cliente_id)
+except KeyError:
+    st.error(f'Cliente "{cliente_id}" não encontrado.')
+    st.stop()
+
 def carregar_dados():
-    historico  = pd.read_csv('data/historico_atendimento.csv')
-    transacoes = pd.read_csv('data/transacoes.csv')
-    with open('data/perfil_investidor.json', 'r', encoding='utf-8') as f:
-        perfil = json.load(f)
-    with open('data/produtos_financeiros.json', 'r', encoding='utf-8') as f:
-        produtos = json.load(f)
-    return historico, transacoes, perfil, produtos
+    return carregador_dados.carregar()
 
+# A assinatura é tirada ANTES da leitura: se um arquivo mudar entre as
+# duas, os dados novos ficam sob a assinatura antiga e o próximo rerun
+# reconstrói — nunca o contrário (dados antigos sob a versão nova)
+assinatura_dados = assinatura_arquivos(
+    list(armazem_clientes.caminhos(cliente_id)) + [ARQUIVO_PRODUTOS, ARQUIVO_REFERENCIAS]
+)
+versao_produtos = assinatura_arquivos([ARQUIVO_PRODUTOS])
 historico, transacoes, perfil, produtos = carregar_dados()
 
 
 # ============================================================
 # 2. MONTANDO O CONTEXTO
-# Reúne os dados do cliente em uma string formatada.
-# Enviado junto com cada mensagem para que o modelo
-# sempre tenha as informações do usuário disponíveis.
+# Em vez de enviar todas as transações, atendimentos e produtos
+# em toda mensagem, indexamos os dados UMA vez e, a cada pergunta,
+# selecionamos só os trechos relevantes (utils/contexto.py).
+# CONTEXTO_MAX_TOKENS define o orçamento dos trechos selecionados (o
+# cabeçalho fixo — perfil, fluxo de caixa, metas — vai por fora);
+# 0 envia o contexto completo.
+#
+# O índice (com o contexto completo já renderizado) fica num cache
+# por cliente, chaveado pela assinatura dos arquivos de dados: reruns
+# e cliques de feedback reaproveitam; só reconstrói se os dados mudarem.
 # ============================================================
-CONTEXTO = f"""
-CLIENTE: {perfil['nome']}, {perfil['idade']} anos, perfil {perfil['perfil_investidor']}
-OBJETIVO: {perfil['objetivo_principal']}
-PATRIMÔNIO R$: {perfil['patrimonio_total']} | RESERVA: R$ {perfil['reserva_emergencia_atual']}
+CONTEXTO_MAX_TOKENS = int(os.environ.get('CONTEXTO_MAX_TOKENS', 600))
+
+# Teto de tokens do prompt inteiro (system + contexto + histórico).
+# Conferido localmente antes de cada envio; 0 desliga.
+PROMPT_MAX_TOKENS = int(os.environ.get('PROMPT_MAX_TOKENS', 3000))
+
+# Transações no prompt (utils/agregados.py):
+# - 'resumo': fluxo de caixa mensal, poupança, maiores gastos,
+#   recorrentes e tendência — tamanho fixo, não cresce com o histórico;
+#   linhas só quando a pergunta cita algo específico delas
+# - 'linhas': linhas brutas selecionadas pela pergunta (modo antigo)
+# CONTEXTO_MAX_LINHAS: quantas transações recentes indexar no modo resumo
+CONTEXTO_TRANSACOES = os.environ.get('CONTEXTO_TRANSACOES', 'resumo')
+CONTEXTO_MAX_LINHAS = int(os.environ.get('CONTEXTO_MAX_LINHAS', 500))
+
+# Projeção das metas do perfil (utils/projecao.py): Monte Carlo com
+# PROJECAO_CAMINHOS caminhos por produto, calculada uma vez por versão
+# dos dados e enviada pronta no cabeçalho. 0 desliga.
+PROJECAO_CAMINHOS = int(os.environ.get('PROJECAO_CAMINHOS', 10_000))
+
+# Ordem das mensagens enviadas:
+# - 'relevancia': [system] + [contexto selecionado] + [conversa]
+# - 'prefixo':    [system] + [catálogo] + [perfil] + [transações e
+#   atendimentos selecionados] + [conversa] — do mais estável para o
+#   mais volátil. O início do prompt fica idêntico entre perguntas e o
+#   provedor pode reaproveitá-lo do cache de prompt (tokens_cache_prompt)
+PROMPT_LAYOUT = os.environ.get('PROMPT_LAYOUT', 'relevancia')
+
+@st.cache_resource
+def carregar_cache_contexto():
+    return CacheContexto(max_clientes=CLIENTES_EM_MEMORIA)
+
+# Catálogo compilado (utils/elegibilidade.py): um por versão do arquivo
+# de produtos, compartilhado por todos os clientes. Só os produtos
+# elegíveis para o perfil, o risco aceito e o capital do cliente vão
+# para o contexto e para a projeção das metas.
+#
+# As rentabilidades em texto ("102% do CDI") também são compiladas uma
+# vez por versão (utils/rentabilidade.py) e, com o CDI/Selic do arquivo
+# de referências, viram taxas e valores projetados no contexto.
+@st.cache_resource(max_entries=2)
+def compilar_elegibilidade(versao_produtos, _produtos):
+    return IndiceElegibilidade(_produtos)
+
+@st.cache_resource(max_entries=2)
+def compilar_taxas(versao_produtos, _produtos):
+    return ModeloTaxas(_produtos)
+
+elegibilidade   = compilar_elegibilidade(versao_produtos, produtos)
+modelo_taxas    = compilar_taxas(versao_produtos, produtos)
+
+def construir_indice():
+    agregados   = carregador_dados.agregados()
+    aporte      = aporte_estimado(agregados)
+    referencias = carregar_referencias()
+    elegiveis   = elegibilidade.elegiveis(perfil, capital_disponivel(perfil, aporte))
+    projecao    = modelo_taxas.legenda(referencias=referencias)
+    if PROJECAO_CAMINHOS > 0:
+        projecao += texto_metas(projetar_metas(
+            perfil, produtos, aporte, caminhos=PROJECAO_CAMINHOS,
+            elegibilidade=elegibilidade, taxas=modelo_taxas, referencias=referencias,
+        ))
+    return IndiceContexto(
+        perfil, transacoes, historico, produtos,
+        agregados    = agregados,
+        resumo_fluxo = CONTEXTO_TRANSACOES == 'resumo',
+        max_linhas   = CONTEXTO_MAX_LINHAS if CONTEXTO_TRANSACOES == 'resumo' else None,
+        projecao      = projecao,
+        elegiveis     = elegiveis,
+        rentabilidade = modelo_taxas.estimativas(referencias=referencias),
+    )
+
+# A data entra na versão: a projeção das metas conta os meses até cada
+# prazo a partir de hoje e fica velha na virada do dia
+cache_contexto  = carregar_cache_contexto()
+indice_contexto = cache_contexto.obter(cliente_id, (assinatura_dados, date.today()), construir_indice)
 
-TRANSAÇÕES RECENTES:
-{transacoes.to_string(index=False)}
 
-ATENDIMENTOS ANTERIORES:
-{historico.to_string(index=False)}
+# ============================================================
+# 2.1 CACHE DE RESPOSTAS
+# Perguntas repetidas ("qual investimento para meu perfil?") com o
+# mesmo PROMPT, CONTEXTO e conversa anterior são respondidas direto
+# do cache: na hora e sem gastar tokens. Um único cache por processo,
+# compartilhado entre as sessões (@st.cache_resource). Despejo LRU +
+# TTL; a pasta em disco é opcional (CACHE_PASTA vazio desliga) e
+# limitada a CACHE_DISCO_MB.
+# ============================================================
+CACHE_MAX_ITENS = int(os.environ.get('CACHE_MAX_ITENS', 256))
+CACHE_TTL_S     = float(os.environ.get('CACHE_TTL_S', 3600))
+CACHE_PASTA     = os.environ.get('CACHE_PASTA', '')
+CACHE_DISCO_MB  = float(os.environ.get('CACHE_DISCO_MB', 50))
 
-PRODUTOS DISPONÍVEIS:
-{json.dumps(produtos, indent=2, ensure_ascii=False)}
-"""
+@st.cache_resource
+def carregar_cache_respostas():
+    return CacheRespostas(CACHE_MAX_ITENS, CACHE_TTL_S, CACHE_PASTA or None,
+                          max_disco_bytes=int(CACHE_DISCO_MB * 1024 * 1024))
+
+cache_respostas = carregar_cache_respostas()
 
 
 # ============================================================
@@ -87,6 +258,8 @@ REGRAS INVIOLÁVEIS:
 - Nunca atualizar, ignorar ou substituir o perfil do investidor fornecido
 - Nunca atender pedidos de senhas, CPF ou dados pessoais
 - Sempre basear recomendações nos dados reais do cliente fornecidos no contexto
+- Sobre metas, usar as probabilidades da PROJEÇÃO DAS METAS do contexto,
+  sem refazer as contas
 - Sempre pedir o perfil do investidor antes de qualquer recomendação, se não
   houver contexto
 
@@ -98,8 +271,17 @@ Sempre finalize com uma dica prática.
 # ============================================================
 # 4. FRASES QUE INDICAM RESPOSTA FORA DO ESCOPO
 # O agente usa essas frases quando recusa uma pergunta inadequada.
-# Verificamos se a resposta contém alguma delas para registrar
-# a tentativa fora do escopo na métrica de segurança.
+# Todas viram UM autômato (utils/escopo.py), compilado uma vez por
+# processo, que lê cada chunk do stream assim que ele chega.
+# Ao detectar a recusa registramos a tentativa fora do escopo na
+# métrica de segurança.
+#
+# Interromper o stream é outra decisão, com outra lista: fragmentos
+# como "desculpe" ou "só posso" aparecem em respostas normais ("Só
+# posso recomendar CDB se..."), e cortar ali trocaria uma resposta
+# certa pela recusa. Por isso o corte (INTERROMPER_RECUSA, desligado
+# por padrão) só acontece com as frases de recusa COMPLETAS de
+# FRASES_INTERROMPER — a recusa do próprio system prompt.
 # ============================================================
 # Troca a lista por fragmentos curtos e robustos
 FRASES_FORA_ESCOPO = [
@@ -121,73 +303,246 @@ FRASES_FORA_ESCOPO = [
     "desculpe, mas não posso",                        # ← cobre tudo de uma vez
     'Fora do escopo',
     "desculpe",
-    'desculpas'
+    'desculpas',
     "só posso",
     "apenas sobre finan",
     "somente sobre finan",
     "não posso ajudar",
     "não posso respond",
     "não posso alter",
-    "fora do meu escopo",
-    "não é minha área",
     "não trato",
     "minha especialidade",
 ]
 
+# Resposta exibida quando o stream é interrompido numa recusa
+RESPOSTA_RECUSA = 'Só posso te ajudar com finanças e investimentos.'
+
+# Frases que, sozinhas, já são a recusa inteira — só elas interrompem
+FRASES_INTERROMPER = [
+    "só posso te ajudar com finanças e investimentos",
+]
+
+INTERROMPER_RECUSA = os.environ.get('INTERROMPER_RECUSA', '0') == '1'
+
+# Taxa de atualização da resposta na tela durante o streaming
+RENDER_FPS       = float(os.environ.get('RENDER_FPS', 12))
+RENDER_MAX_CHARS = int(os.environ.get('RENDER_MAX_CHARS', 400))
+
+# Geração interrompida por um rerun: a próxima execução a cancela logo
+# no início; se ela não vier nesse prazo (ex: aba fechada, outra
+# página), cancela sozinha como 'interrompida'
+ESPERA_NOVA_EXECUCAO_S = float(os.environ.get('ESPERA_NOVA_EXECUCAO_S', 10))
+
+@st.cache_resource
+def carregar_automato_recusa():
+    return AutomatoFrases(FRASES_FORA_ESCOPO)
+
+@st.cache_resource
+def carregar_automato_interrupcao():
+    return AutomatoFrases(FRASES_INTERROMPER)
+
+automato_recusa      = carregar_automato_recusa()
+automato_interrupcao = carregar_automato_interrupcao()
+
 
 # ============================================================
 # 5. FUNÇÃO PARA SALVAR MÉTRICAS NO CSV
-# Usa append ('a') para nunca sobrescrever dados anteriores.
+# salvar_metrica só enfileira o registro. Um coletor compartilhado
+# (utils/metricas.py) grava em lote numa thread de fundo, no banco
+# SQLite (data/metricas.db) e no CSV — o disco fica fora do caminho
+# da interação.
 # Cria o arquivo e o cabeçalho automaticamente na primeira vez.
 # ============================================================
+ARQUIVO_METRICAS = 'data/metricas.csv'
+
+CAMPOS_METRICAS = [
+    'timestamp',
+    'pergunta',
+    'tokens_prompt',
+    'tokens_resposta',
+    'tokens_total',
+    'latencia_s',
+    'tokens_por_segundo',
+    'feedback',          # 'positivo', 'negativo' ou 'sem_feedback'
+    'fora_do_escopo',    # True ou False
+    'tokens_contexto_economizados',
+    'cache_hit',         # True se a resposta veio do cache (0 tokens)
+    # Tempos por etapa (utils/tempos.py)
+    'tempo_contexto_s',
+    'tempo_envio_s',
+    'ttft_s',            # time to first token
+    'itl_p50_ms',        # intervalo entre chunks — mediana
+    'itl_p95_ms',        # intervalo entre chunks — percentil 95
+    'tempo_render_s',
+    # Contagem local de tokens (utils/tokens.py)
+    'tokens_prompt_estimado',   # prompt contado antes do envio
+    'tokens_estimados',         # True se os tokens vieram da estimativa (sem usage)
+    'metodo_estimativa',        # 'tiktoken' ou 'heuristica'
+    # Pool de conexões (utils/cliente.py)
+    'conexao_reutilizada',      # True se a requisição usou uma conexão já aberta
+    'handshake_ms',             # TCP + TLS, só quando abriu conexão nova
+    # Cache de prompt do provedor
+    'layout_prompt',            # 'relevancia' ou 'prefixo'
+    'tokens_cache_prompt',      # tokens do prompt lidos do cache do provedor
+    # Limites de requisição (utils/limites.py)
+    'espera_fila_s',            # fila + backoff antes da resposta (fora da latência)
+    'tentativas',               # 1 = sem repetição por 429/5xx
+    # Requisições hedged (utils/hedge.py)
+    'modelo_vencedor',          # modelo cujo stream foi exibido
+    'hedge_disparado',          # True se o modelo reserva foi chamado
+    'ttft_principal_s',         # TTFT observado do principal (vazio se perdeu e não chegou a tempo)
+    'ttft_principal_min_s',     # se vazio acima: o principal já esperava pelo menos isso
+    'limiar_hedge_s',           # espera antes de chamar o reserva
+    # Gerações canceladas (utils/geracao.py)
+    'geracao_cancelada',        # True se a resposta foi interrompida no meio
+    'motivo_cancelamento',      # 'nova_pergunta', 'limpar', 'rerun', 'parada' ou 'interrompida'
+    'tokens_economizados_cancelamento',  # média das respostas completas - gerados (estimativa; vazio sem média)
+]
+
+
 def salvar_metrica(pergunta, tokens_prompt, tokens_resposta, tokens_total,
-                   latencia, tokens_por_segundo, feedback, fora_do_escopo):
-
-    arquivo = 'data/metricas.csv'
-    arquivo_novo = not os.path.exists(arquivo)
-
-    with open(arquivo, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=[
-            'timestamp',
-            'pergunta',
-            'tokens_prompt',
-            'tokens_resposta',
-            'tokens_total',
-            'latencia_s',
-            'tokens_por_segundo',
-            'feedback',          # 'positivo', 'negativo' ou 'sem_feedback'
-            'fora_do_escopo',    # True ou False
-        ])
-        # Escreve o cabeçalho somente se o arquivo acabou de ser criado
-        if arquivo_novo:
-            writer.writeheader()
-
-        writer.writerow({
-            'timestamp':         datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'pergunta':          pergunta[:100],  # limita pra não pesar
-            'tokens_prompt':     tokens_prompt,
-            'tokens_resposta':   tokens_resposta,
-            'tokens_total':      tokens_total,
-            'latencia_s':        round(latencia, 2),
-            'tokens_por_segundo': round(tokens_por_segundo, 1),
-            'feedback':          feedback,
-            'fora_do_escopo':    fora_do_escopo,
-        })
+                   latencia, tokens_por_segundo, feedback, fora_do_escopo,
+                   extras=None):
+    # extras: demais colunas de CAMPOS_METRICAS (contexto, cache, tempos...)
+    registro = {
+        'timestamp':         datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'pergunta':          pergunta[:100],  # limita pra não pesar
+        'tokens_prompt':     tokens_prompt,
+        'tokens_resposta':   tokens_resposta,
+        'tokens_total':      tokens_total,
+        'latencia_s':        round(latencia, 2),
+        'tokens_por_segundo': round(tokens_por_segundo, 1),
+        'feedback':          feedback,
+        'fora_do_escopo':    fora_do_escopo,
+    }
+    registro.update(extras or {})
+
+    coletor = obter_coletor(ARQUIVO_METRICAS, CAMPOS_METRICAS, tabela=TABELA_CHAT)
+    coletor.registrar(registro)
 
 
 # ============================================================
 # 6. INICIALIZAR ESTADOS DA SESSÃO
-# Além do histórico de chat, guardamos:
+# O histórico do chat fica no armazém de sessões (utils/sessoes.py),
+# não no session_state: cada conversa tem um id na URL (?sessao=<id>)
+# e um log em disco; só as SESSAO_MAX_MENSAGENS mais recentes ficam em
+# memória, sessões paradas há SESSAO_OCIOSA_S (ou além de
+# SESSOES_EM_MEMORIA) saem da memória e voltam do disco ao reconectar.
+# Cada sessão tem sua janela_conversa: limita o histórico enviado ao
+# modelo a HISTORICO_MAX_TOKENS; turnos antigos viram um resumo gerado
+# em segundo plano por um modelo menor (utils/janela.py).
+# No session_state ficam só:
 # - pending_metric: dados da última chamada aguardando feedback
 # - feedback_registrado: evita registrar feedback duplicado
 # ============================================================
-if 'chat_history'       not in st.session_state:
-    st.session_state.chat_history        = []
+MODELO_CHAT          = 'openai/gpt-oss-120b'
+# MODELO_CHAT        = 'llama-3.3-70b-versatile'
+
+# Hedge (utils/hedge.py): se o 1º token do modelo principal não chegar até
+# o p95 dos TTFTs recentes, a mesma pergunta vai para HEDGE_MODELO e o
+# primeiro a responder vence. HEDGE_ORCAMENTO limita a fração de
+# perguntas com chamada extra. HEDGE_MODELO vazio desliga.
+HEDGE_MODELO    = os.environ.get('HEDGE_MODELO', 'openai/gpt-oss-20b')
+HEDGE_ORCAMENTO = float(os.environ.get('HEDGE_ORCAMENTO', 0.1))
+
+@st.cache_resource
+def obter_hedge():
+    # Um limiar e um orçamento por processo, compartilhados entre sessões
+    return LimiarHedge(), OrcamentoHedge(HEDGE_ORCAMENTO)
+
+limiar_hedge, orcamento_hedge = obter_hedge()
+
+# Roteador (utils/roteador.py): escolhe, a cada pergunta, o modelo
+# saudável mais rápido dentro do SLO de TTFT, pelo TTFT das respostas
+# anteriores do chat (o comparador só desempata modelos ainda sem
+# dados do chat). ROTEADOR_ATIVO=0 fixa o MODELO_CHAT.
+ROTEADOR_ATIVO = os.environ.get('ROTEADOR_ATIVO', '1') == '1'
+roteador       = obter_roteador()
+HISTORICO_MAX_TOKENS = int(os.environ.get('HISTORICO_MAX_TOKENS', 1500))
+MODELO_RESUMO        = os.environ.get('MODELO_RESUMO', 'openai/gpt-oss-20b')
+
+def resumir_com_modelo(resumo_atual, mensagens):
+    # Roda numa thread de fundo — nunca no caminho da resposta ao usuário
+    conversa = '\n'.join(f"{m['role']}: {m['content']}" for m in mensagens)
+    completion, _ = limitador.chamar(lambda: client.chat.completions.create(
+        model       = MODELO_RESUMO,
+        messages    = [
+            {'role': 'system', 'content': (
+                'Resuma a conversa entre um cliente e um agente financeiro em até '
+                '5 tópicos curtos, mantendo valores, produtos e decisões citados.'
+            )},
+            {'role': 'user', 'content': f'RESUMO ATUAL:\n{resumo_atual}\n\nNOVAS MENSAGENS:\n{conversa}'},
+        ],
+        temperature = 0,
+        max_tokens  = 200,
+        stream      = False,
+    ), CHAVE_API, MODELO_RESUMO)
+    return completion.choices[0].message.content
+
+SESSOES_PASTA        = os.environ.get('SESSOES_PASTA', PASTA_SESSOES)
+SESSAO_MAX_MENSAGENS = int(os.environ.get('SESSAO_MAX_MENSAGENS', 40))
+SESSOES_EM_MEMORIA   = int(os.environ.get('SESSOES_EM_MEMORIA', 500))
+SESSAO_OCIOSA_S      = float(os.environ.get('SESSAO_OCIOSA_S', 1800))
+
+@st.cache_resource
+def obter_armazem_sessoes():
+    return ArmazemSessoes(
+        lambda: JanelaConversa(HISTORICO_MAX_TOKENS, resumir=resumir_com_modelo),
+        pasta          = SESSOES_PASTA,
+        max_residentes = SESSAO_MAX_MENSAGENS,
+        max_sessoes    = SESSOES_EM_MEMORIA,
+        ociosa_s       = SESSAO_OCIOSA_S,
+    )
+
+armazem_sessoes = obter_armazem_sessoes()
+
+# O id vai para a URL: recarregar a página (ou voltar depois de um
+# reinício do servidor) retoma a mesma conversa
+sessao_id = st.query_params.get('sessao') or st.session_state.get('sessao_id')
+if not id_valido(sessao_id):
+    sessao_id = novo_id()
+sessao = armazem_sessoes.obter(sessao_id)
+
+# Conversa de outro cliente (ex: ?cliente= trocado na URL): começa uma
+# sessão nova — a conversa salva fica intacta no id antigo
+if sessao.cliente_id is not None and sessao.cliente_id != cliente_id:
+    sessao_id = novo_id()
+    sessao    = armazem_sessoes.obter(sessao_id)
+sessao.cliente_id = cliente_id
+
+st.session_state.sessao_id = sessao_id
+if st.query_params.get('sessao') != sessao_id:
+    st.query_params['sessao'] = sessao_id
+
+# Geração em andamento de cada sessão (utils/geracao.py). Toda execução
+# do script — nova pergunta, 🗑️ Limpar ou rerun — começa cancelando a
+# resposta anterior desta sessão, se ela ainda estiver sendo gerada: o
+# stream é fechado na hora e os tokens economizados (estimados pela
+# média de tokens das respostas completas, que parte do histórico de
+# métricas) vão para as métricas.
+@st.cache_resource
+def obter_geracoes():
+    registro = RegistroGeracoes()
+    try:
+        registro.carregar_historico(ler_periodo(TABELA_CHAT, inicio=date.today() - timedelta(days=7)))
+    except Exception:
+        pass  # sem histórico, a média começa na 1ª resposta completa
+    return registro
+
+geracoes = obter_geracoes()
+geracoes.cancelar(sessao_id, motivo_cancelamento)
+
 if 'pending_metric'     not in st.session_state:
     st.session_state.pending_metric      = None
 if 'feedback_registrado' not in st.session_state:
     st.session_state.feedback_registrado = False
 
+# Trocou de cliente: o feedback pendente era da conversa anterior
+if st.session_state.get('cliente_id') != cliente_id:
+    st.session_state.cliente_id          = cliente_id
+    st.session_state.pending_metric      = None
+    st.session_state.feedback_registrado = False
+
 
 # ============================================================
 # 7. INTERFACE — TÍTULO E SIDEBAR
@@ -208,24 +563,64 @@ with st.sidebar:
     # st.page_link('pages/dashboard.py', label='📊 Ver Dashboard de Métricas', icon='📊')
     st.markdown('<a href="/dashboard" target="_self">📊 Ver Dashboard de Métricas</a>', unsafe_allow_html=True)
 
+    # Acertos/reconstruções do cache do contexto (muda só quando data/ muda)
+    est_contexto = cache_contexto.estatisticas()
+    st.caption(f'🧠 Contexto em cache: {est_contexto["acertos"]} acertos · {est_contexto["falhas"]} reconstruções')
+    # Estado do roteador: latência e disjuntor de cada modelo
+    with st.expander('🧭 Roteador de modelos'):
+        st.caption(f'SLO TTFT p95: {roteador.slo_s:.1f}s' + ('' if ROTEADOR_ATIVO else ' — desligado, usando ' + MODELO_CHAT))
+        st.dataframe(pd.DataFrame(roteador.resumo()), hide_index=True, use_container_width=True)
+
+    est_clientes = armazem_clientes.estatisticas()
+    st.caption(f'👥 Clientes em memória: {est_clientes["em_memoria"]}/{CLIENTES_EM_MEMORIA} · {est_clientes["descartes"]} descartados')
+
+    # Memória das conversas (utils/sessoes.py): total e as maiores sessões
+    est_sessoes = armazem_sessoes.estatisticas()
+    with st.expander(f'💬 Sessões em memória: {est_sessoes["em_memoria"]} · {est_sessoes["memoria_kb"]:,.1f} KB'):
+        st.caption(f'{est_sessoes["restauradas"]} restauradas do disco · {est_sessoes["despejadas"]} despejadas')
+        st.dataframe(pd.DataFrame(est_sessoes['por_sessao'][:10]), hide_index=True, use_container_width=True)
+
     # Botão para limpar o histórico da conversa
-    if st.button('🗑️ Limpar conversa'):
-        st.session_state.chat_history        = []
+    est_geracoes = geracoes.estatisticas()
+    if est_geracoes['canceladas']:
+        st.caption(f'✋ {est_geracoes["canceladas"]} respostas canceladas · '
+                   f'~{est_geracoes["tokens_economizados"]} tokens economizados (estimativa)')
+
+    if st.button('🗑️ Limpar conversa', key='limpar_conversa'):
+        sessao.limpar()
         st.session_state.pending_metric      = None
         st.session_state.feedback_registrado = False
         st.rerun()
 
-    # Gráfico de gastos por categoria (se as colunas existirem no CSV)
-    if 'categoria' in transacoes.columns and 'valor' in transacoes.columns:
+    # Gráfico de gastos por categoria, separado de entradas e saídas.
+    # Os agregados (utils/agregados.py) são calculados uma vez por
+    # versão dos dados — o mesmo objeto que vai para o contexto.
+    # É um fragmento: a cada DADOS_OBSERVAR_S segundos só este trecho
+    # roda de novo, lendo as transações acrescentadas no CSV — o resto
+    # da página (e uma resposta em andamento) não é reexecutado.
+    @st.fragment(run_every=DADOS_OBSERVAR_S or None)
+    def grafico_gastos():
+        agregados = carregador_dados.agregados()
         st.subheader('📊 Gastos por Categoria')
-        gastos = transacoes.groupby('categoria')['valor'].sum().reset_index()
-        st.bar_chart(gastos.set_index('categoria'))
+        st.bar_chart(agregados.gastos_por_categoria().rename('saida'))
+
+        col_e, col_s = st.columns(2)
+        col_e.metric('Entradas', f'R$ {agregados.total_entradas:,.2f}')
+        col_s.metric('Saídas',   f'R$ {agregados.total_saidas:,.2f}')
+        st.caption(f'Saldo do período: R$ {agregados.saldo:,.2f} · {len(agregados.por_mes)} mês(es)')
+        if len(agregados.saldo_acumulado) > 1:
+            st.line_chart(agregados.saldo_acumulado.rename('saldo acumulado'), height=150)
+
+    grafico_gastos()
 
 
 # ============================================================
 # 8. EXIBIR HISTÓRICO DA CONVERSA
 # ============================================================
-for msg in st.session_state.chat_history:
+# Só a parte residente; o começo de conversas longas fica no disco
+if sessao.anteriores():
+    st.caption(f'🗂️ {sessao.anteriores()} mensagens anteriores salvas — o agente ainda considera o resumo delas')
+for msg in sessao.recentes():
     with st.chat_message(msg['role']):
         st.write(msg['content'])
 
@@ -253,6 +648,7 @@ if st.session_state.pending_metric and not st.session_state.feedback_registrado:
                 tokens_por_segundo= m['tokens_por_segundo'],
                 feedback          = 'positivo',
                 fora_do_escopo    = m['fora_do_escopo'],
+                extras            = m['extras'],
             )
             st.session_state.feedback_registrado = True
             st.session_state.pending_metric = None # ← limpa o pendente
@@ -271,6 +667,7 @@ if st.session_state.pending_metric and not st.session_state.feedback_registrado:
                 tokens_por_segundo= m['tokens_por_segundo'],
                 feedback          = 'negativo',
                 fora_do_escopo    = m['fora_do_escopo'],
+                extras            = m['extras'],
             )
             st.session_state.feedback_registrado = True
             st.session_state.pending_metric = None # ← limpa o pendente
@@ -280,7 +677,7 @@ if st.session_state.pending_metric and not st.session_state.feedback_registrado:
 # ============================================================
 # 10. CAMPO DE ENTRADA DO USUÁRIO
 # ============================================================
-USER_QUESTION = st.chat_input('Digite sua pergunta...')
+USER_QUESTION = st.chat_input('Digite sua pergunta...', key='pergunta')
 
 if USER_QUESTION:
 
@@ -289,58 +686,264 @@ if USER_QUESTION:
     start_time = time.time()
 
     # Exibe a pergunta do usuário na tela e salva no histórico
-    st.session_state.chat_history.append({'role': 'user', 'content': USER_QUESTION})
+    mensagem_pergunta = sessao.append({'role': 'user', 'content': USER_QUESTION})
     with st.chat_message('user'):
         st.write(USER_QUESTION)
 
-    # Monta a lista de mensagens: [system] + [contexto] + [histórico]
-    messages = [
-        {'role': 'system', 'content': PROMPT},
-        {'role': 'user',   'content': CONTEXTO},
-    ] + st.session_state.chat_history
+    # Cronômetro por etapa: contexto → envio → 1º chunk → chunks → render
+    cronometro = CronometroRequisicao()
+
+    # Seleciona só os trechos do contexto relevantes para esta pergunta.
+    # No layout por prefixo, catálogo e perfil vão inteiros logo após o
+    # system prompt e a seleção cobre só transações e atendimentos.
+    prefixo = PROMPT_LAYOUT == 'prefixo'
+    CONTEXTO, relatorio_contexto = indice_contexto.montar(USER_QUESTION, CONTEXTO_MAX_TOKENS, prefixo=prefixo)
+
+    fixas = [{'role': 'system', 'content': PROMPT}]
+    if prefixo:
+        fixas += [{'role': 'user', 'content': bloco} for bloco in indice_contexto.blocos_estaveis()]
+
+    # Monta a lista de mensagens: [fixas] + [contexto] + [resumo + turnos recentes]
+    # e conta os tokens localmente ANTES do envio (utils/tokens.py).
+    # Se passar de PROMPT_MAX_TOKENS, reduz o contexto e depois o histórico.
+    messages, CONTEXTO, tokens_prompt_estimado, cortes_teto = aplicar_teto(
+        fixas             = fixas,
+        contexto          = CONTEXTO,
+        historico         = sessao.janela.mensagens(sessao),
+        teto              = PROMPT_MAX_TOKENS,
+        # O teto fala do contexto inteiro; o orçamento de montar() não inclui o cabeçalho
+        remontar_contexto = lambda orcamento: indice_contexto.montar(
+            USER_QUESTION, max(orcamento - (0 if prefixo else indice_contexto.tokens_cabecalho), 1), prefixo=prefixo,
+        )[0],
+    )
+    relatorio_contexto['tokens_economizados'] += cortes_teto['contexto']
 
     # Convert messages to proper ChatCompletionMessageParam format
     typed_messages = [
         {'role': msg['role'], 'content': msg['content']} 
         for msg in messages
     ]
+    cronometro.marcar_contexto()
+
+    # Procura a resposta no cache antes de chamar o modelo. A chave é a
+    # pergunta normalizada + tudo o que vai antes dela (system, contexto,
+    # resumo e turnos anteriores): uma pergunta de seguimento só acerta
+    # na mesma conversa. A última mensagem é a própria pergunta, crua —
+    # fica de fora para "Qual investimento?" e "qual investimento"
+    # caírem na mesma chave
+    chave = chave_cache(USER_QUESTION, *(f'{m["role"]}:{m["content"]}' for m in typed_messages[:-1]))
+    resposta_cache = cache_respostas.obter(chave)
+    cache_hit = resposta_cache is not None
 
     # ============================================================
     # 11. CHAMADA AO GROQ COM STREAMING
+    # A chamada passa pelo limitador: espera na fila se a taxa do
+    # modelo foi atingida e repete 429/5xx com backoff.
     # O modelo envia a resposta em chunks (pedaços) em tempo real.
-    # Iteramos cada chunk e montamos a resposta progressivamente,
-    # dando o efeito de digitação na tela.
+    # Os chunks vão para o RenderizadorStream (utils/render.py), que
+    # atualiza a tela no máximo RENDER_FPS vezes por segundo (ou a cada
+    # RENDER_MAX_CHARS caracteres) — efeito de digitação sem reenviar
+    # o texto inteiro ao navegador em todo chunk.
+    # Quem lê o stream é uma thread de fundo (GeracaoStream): se chegar
+    # uma nova pergunta, um clique em 🗑️ Limpar ou um rerun, a geração é
+    # cancelada e o stream fechado — sem gastar tokens até o fim.
+    # Se a resposta veio do cache, exibimos direto — sem chamada.
     # ============================================================
     with st.chat_message('assistant'):
         response_placeholder = st.empty()
-        full_response        = ''
-
-        stream = client.chat.completions.create(
-            model       = 'openai/gpt-oss-120b',
-            # model = 'llama-3.3-70b-versatile',
-            messages    = messages,
-            temperature = 0.2,
-            stream      = True
-        )
-
-        for chunk in stream:
-            delta          = chunk.choices[0].delta.content or ''
-            full_response += delta
-            response_placeholder.write(full_response + '▌')
-
-        # Exibe a resposta final sem o cursor
-        response_placeholder.write(full_response)
-
-    # Calcula a latência total (do envio até o fim do stream)
-    latencia = time.time() - start_time
-
-    # Salva a resposta no histórico para as próximas interações
-    st.session_state.chat_history.append({'role': 'assistant', 'content': full_response})
+        usage                = None
+        varredura            = automato_recusa.nova_varredura()
+        varredura_corte      = automato_interrupcao.nova_varredura()
+
+        texto_gerado         = None   # o que o modelo gerou, se diferente do exibido
+
+        if cache_hit:
+            full_response = resposta_cache
+            varredura.alimentar(full_response)
+            response_placeholder.write(full_response)
+        else:
+            render = RenderizadorStream(response_placeholder, RENDER_FPS, RENDER_MAX_CHARS)
+
+            # Cada modelo da corrida abre seu stream numa thread própria;
+            # limite e conexão ficam guardados por modelo
+            chamadas = {}
+
+            def abrir_stream(modelo, principal):
+                def abrir(ao_enviar):
+                    def enviar():
+                        # Marca o envio a cada tentativa: fila e backoff não entram
+                        # no TTFT. A corrida usa o mesmo instante (prazo do hedge e
+                        # ttft_principal_s), então ttft_s fica no mesmo relógio
+                        instante = ao_enviar()
+                        if principal:
+                            cronometro.iniciar_envio(instante)
+                        return client.chat.completions.create(
+                            model       = modelo,
+                            messages    = messages,
+                            temperature = 0.2,
+                            stream      = True
+                        )
+
+                    roteador.iniciar(modelo)
+                    try:
+                        stream, limite = limitador.chamar(enviar, CHAVE_API, modelo)
+                    except Exception:
+                        roteador.registrar(modelo, None, False)
+                        raise
+                    if principal:
+                        cronometro.marcar_envio()
+                    chamadas[modelo] = (limite, estatisticas_conexao.ultima())
+                    return stream
+                return abrir
+
+            # Principal: escolhido pelo roteador. Reserva do hedge: HEDGE_MODELO,
+            # ou o próximo do roteador se o principal já for o HEDGE_MODELO
+            modelo_principal = (roteador.escolher() if ROTEADOR_ATIVO else None) or MODELO_CHAT
+            modelo_reserva   = HEDGE_MODELO
+            if HEDGE_MODELO and HEDGE_MODELO == modelo_principal:
+                modelo_reserva = roteador.escolher(excluir={modelo_principal})
+
+            def registrar_cancelamento(geracao):
+                # Roda em quem cancelou (a próxima execução do script ou o
+                # tratamento da interrupção abaixo): descarta a pergunta
+                # sem resposta e grava a métrica da geração interrompida
+                gerados, economizados = geracoes.contabilizar(geracao)
+                sessao.descartar(mensagem_pergunta)
+                salvar_metrica(
+                    pergunta           = USER_QUESTION,
+                    tokens_prompt      = tokens_prompt_estimado,
+                    tokens_resposta    = gerados,
+                    tokens_total       = tokens_prompt_estimado + gerados,
+                    latencia           = time.time() - start_time,
+                    tokens_por_segundo = 0,
+                    feedback           = 'sem_feedback',
+                    fora_do_escopo     = varredura.encontrou,
+                    extras = {
+                        'tokens_contexto_economizados':     relatorio_contexto['tokens_economizados'],
+                        'cache_hit':                        False,
+                        'tokens_prompt_estimado':           tokens_prompt_estimado,
+                        'tokens_estimados':                 True,
+                        'metodo_estimativa':                metodo_tokens(),
+                        'layout_prompt':                    PROMPT_LAYOUT,
+                        'geracao_cancelada':                True,
+                        'motivo_cancelamento':              geracao.motivo,
+                        'tokens_economizados_cancelamento': economizados,
+                    },
+                )
+
+            # TTFT observado do principal: alimenta o limiar do hedge e o
+            # roteador (que compara só TTFTs do chat com o SLO)
+            def registrar_ttft_principal(ttft_s):
+                limiar_hedge.registrar(ttft_s)
+                roteador.registrar(modelo_principal, ttft_s, True)
+
+            # Erro do provedor no meio do stream conta como falha do modelo
+            # (a corrida já ignora streams que ela mesma fechou: cancelamento
+            # pelo usuário, recusa detectada, perdedor do hedge)
+            def registrar_falha_stream(modelo):
+                roteador.registrar(modelo, None, False)
+
+            cronometro.iniciar_envio()
+            stream = CorridaStreams(
+                abrir_principal = abrir_stream(modelo_principal, principal=True),
+                abrir_reserva   = abrir_stream(modelo_reserva, principal=False) if modelo_reserva else None,
+                limiar_s        = limiar_hedge.limiar(),
+                orcamento       = orcamento_hedge,
+                modelos         = (modelo_principal, modelo_reserva),
+                registrar_ttft  = registrar_ttft_principal,
+                registrar_falha = registrar_falha_stream,
+            )
+            # A corrida (inclusive a espera pelo 1º token) roda na thread da
+            # GeracaoStream; enquanto não chega chunk, manter_vivo() toca a
+            # tela e o Streamlit consegue interromper o script
+            geracao = GeracaoStream(stream, ao_cancelar=registrar_cancelamento,
+                                    ao_esperar=render.manter_vivo)
+            geracoes.iniciar(sessao_id, geracao)
+
+            try:
+                for chunk in geracao:
+                    delta = chunk.choices[0].delta.content or ''
+                    cronometro.chunk(delta, geracao.instante)
+                    render.adicionar(delta)
+
+                    # Recusa completa detectada: fecha o stream e para de gerar tokens
+                    varredura.alimentar(delta)
+                    if INTERROMPER_RECUSA and varredura_corte.alimentar(delta):
+                        geracao.fechar()
+                        texto_gerado = render.texto()
+                        render.substituir(RESPOSTA_RECUSA)
+                        break
+
+                    # O último chunk traz o uso de tokens (quando disponível).
+                    # A Groq manda em chunk.x_groq.usage; o formato OpenAI, em chunk.usage
+                    if hasattr(chunk, 'usage') and chunk.usage:
+                        usage = chunk.usage
+                    elif getattr(getattr(chunk, 'x_groq', None), 'usage', None):
+                        usage = chunk.x_groq.usage
+            except LimiteExcedido:
+                # Fila e repetições não bastaram: avisa e descarta a pergunta,
+                # sem registrar uma métrica falsa
+                geracoes.concluir(sessao_id, geracao)
+                sessao.pop()
+                response_placeholder.error('⏳ Muitas requisições no momento. Tente novamente em alguns segundos.')
+                st.stop()
+            except Exception:
+                geracao.fechar()
+                geracoes.concluir(sessao_id, geracao)
+                raise
+            except RerunException:
+                # O Streamlit interrompe o script (nova pergunta, 🗑️ Limpar,
+                # rerun) com uma exceção no próximo st.*. Quem cancela é a
+                # próxima execução, logo no início, que sabe o motivo; se ela
+                # não vier, o prazo cancela como 'interrompida'
+                st.session_state.geracao_interrompida = geracao
+                geracoes.cancelar_depois(sessao_id, geracao, 'interrompida', ESPERA_NOVA_EXECUCAO_S)
+                raise
+            except StopException:
+                # Sessão encerrada (aba fechada, botão Stop): não vem próxima
+                # execução — cancela na hora
+                geracoes.cancelar(sessao_id, 'parada', geracao)
+                raise
+            except BaseException:
+                geracoes.cancelar(sessao_id, 'interrompida', geracao)
+                raise
+
+            # Cancelada de fora (a próxima execução do script já assumiu)
+            if geracao.cancelada:
+                st.stop()
+
+            # Exibe a resposta final sem o cursor
+            full_response = render.finalizar()
+
+            # O TTFT do principal derrotado pode ter chegado durante o stream
+            hedge = stream.resultado()
+            limite, conexao = chamadas[hedge['modelo_vencedor']]
+
+    tempos = cronometro.resumo(None if cache_hit else render.tempo_escrita)
+    if cache_hit:
+        conexao = {'conexao_reutilizada': None, 'handshake_ms': None}
+        limite  = {'espera_fila_s': None, 'tentativas': None}
+        hedge   = {'modelo_vencedor': None, 'hedge_disparado': None, 'ttft_principal_s': None,
+                   'ttft_principal_min_s': None, 'limiar_hedge_s': None}
+
+    # Calcula a latência total (da pergunta até o fim do stream),
+    # sem o tempo parado na fila do limitador — esse vai em espera_fila_s
+    latencia = time.time() - start_time - (limite['espera_fila_s'] or 0)
+    if not cache_hit and hedge['modelo_vencedor'] == modelo_reserva and hedge['hedge_disparado']:
+        # O principal registra o próprio TTFT ao medi-lo (registrar_ttft_principal)
+        roteador.registrar(modelo_reserva, stream.ttft_reserva_s, True)
+
+    # Salva a resposta no histórico para as próximas interações e grava
+    # o turno (pergunta + resposta) no log da sessão
+    sessao.append({'role': 'assistant', 'content': full_response})
+    sessao.salvar()
 
 
     # ============================================================
     # 12. CALCULANDO AS MÉTRICAS
-    # Tokens vêm do último chunk via chunk.usage (quando disponível).
+    # Tokens vêm do último chunk via chunk.usage (quando disponível);
+    # se faltar, usamos a estimativa local e marcamos tokens_estimados.
+    # Respostas do cache não gastam tokens — ficam zeradas.
     # tokens_por_segundo = velocidade real de geração do modelo.
     # fora_do_escopo = True se a resposta contiver frases de recusa.
     # ============================================================
@@ -348,20 +951,37 @@ if USER_QUESTION:
     tokens_resposta   = 0
     tokens_total      = 0
 
-    if hasattr(chunk, 'usage') and chunk.usage:
-        tokens_prompt   = chunk.usage.prompt_tokens
-        tokens_resposta = chunk.usage.completion_tokens
-        tokens_total    = chunk.usage.total_tokens
+    tokens_estimados  = False
+    tokens_cache_prompt = tokens_em_cache(usage)
+
+    if usage:
+        tokens_prompt   = usage.prompt_tokens
+        tokens_resposta = usage.completion_tokens
+        tokens_total    = usage.total_tokens
+    elif not cache_hit:
+        # Sem usage (stream interrompido ou provedor omitiu): usa a
+        # contagem local em vez de registrar 0 e distorcer as médias
+        tokens_prompt    = tokens_prompt_estimado
+        tokens_resposta  = contar_tokens(texto_gerado if texto_gerado is not None else full_response)
+        tokens_total     = tokens_prompt + tokens_resposta
+        tokens_estimados = True
 
     # Evita divisão por zero se a latência for muito pequena
     tokens_por_segundo = tokens_resposta / latencia if latencia > 0 else 0
 
-    # Verifica se a resposta indica que o agente recusou a pergunta
-    resposta_lower = full_response.lower()
-    fora_do_escopo = any(frase in resposta_lower for frase in FRASES_FORA_ESCOPO)
+    # A varredura já leu a resposta chunk a chunk durante o stream
+    fora_do_escopo = varredura.encontrou
+
+    # Guarda a resposta nova para as próximas perguntas iguais (nunca a
+    # recusa colocada no lugar de um stream interrompido)
+    if not cache_hit and full_response and texto_gerado is None:
+        cache_respostas.guardar(chave, full_response)
+
+    # Resposta completa alimenta a média usada para estimar os tokens
+    # economizados quando uma geração é cancelada (recusa não conta)
+    if not cache_hit:
+        geracoes.concluir(sessao_id, geracao, tokens_resposta if texto_gerado is None else None)
 
-    # st.write(f'DEBUG fora_do_escopo: {fora_do_escopo}')  # ← temporário para testar
-    # st.write(f'DEBUG resposta: {resposta_lower[:100]}')   # ← primeiros 100 chars
 
 
     # ============================================================
@@ -384,6 +1004,7 @@ if USER_QUESTION:
             tokens_por_segundo = m['tokens_por_segundo'],
             feedback           = 'sem_feedback',
             fora_do_escopo     = m['fora_do_escopo'],
+            extras             = m['extras'],
         )
 
     # Armazena os dados da interação atual aguardando o clique de feedback
@@ -395,6 +1016,20 @@ if USER_QUESTION:
         'latencia':           latencia,
         'tokens_por_segundo': tokens_por_segundo,
         'fora_do_escopo':     fora_do_escopo,
+        'extras': {
+            'tokens_contexto_economizados': relatorio_contexto['tokens_economizados'],
+            'cache_hit':                    cache_hit,
+            'tokens_prompt_estimado':       tokens_prompt_estimado,
+            'tokens_estimados':             tokens_estimados,
+            'metodo_estimativa':            metodo_tokens(),
+            'layout_prompt':                PROMPT_LAYOUT,
+            'tokens_cache_prompt':          tokens_cache_prompt,
+            'geracao_cancelada':            False,
+            **tempos,
+            **conexao,
+            **limite,
+            **hedge,
+        },
     }
 
 
@@ -407,10 +1042,29 @@ if USER_QUESTION:
         col2.metric('⚡ Tokens/segundo', f'{tokens_por_segundo:.1f}')
         col3.metric('🔢 Tokens totais',  tokens_total)
 
-        col4, col5 = st.columns(2)
+        col4, col5, col6 = st.columns(3)
         col4.metric('📥 Tokens prompt',   tokens_prompt)
         col5.metric('📤 Tokens resposta', tokens_resposta)
-
+        col6.metric('🪶 Tokens economizados (contexto)', relatorio_contexto['tokens_economizados'])
+
+        if not cache_hit:
+            col7, col8, col9 = st.columns(3)
+            col7.metric('🚀 TTFT', f'{tempos["ttft_s"]}s' if tempos['ttft_s'] is not None else '—')
+            col8.metric('⏳ Entre tokens p50/p95', f'{tempos["itl_p50_ms"]} / {tempos["itl_p95_ms"]} ms')
+            col9.metric('🧱 Contexto + render', f'{tempos["tempo_contexto_s"]:.3f}s + {tempos["tempo_render_s"]:.3f}s')
+
+        if cache_hit:
+            st.info('⚡ Resposta servida do cache — nenhum token consumido.')
+        if hedge['hedge_disparado']:
+            st.caption(f'🏁 Sem 1º token em {hedge["limiar_hedge_s"]}s — pergunta repetida no modelo reserva; venceu {hedge["modelo_vencedor"]}.')
+        if limite['espera_fila_s']:
+            st.caption(f'⏳ {limite["espera_fila_s"]:.2f}s na fila do limite de requisições ({limite["tentativas"]} tentativa(s)) — fora da latência.')
+        if tokens_cache_prompt:
+            st.caption(f'♻️ {tokens_cache_prompt} de {tokens_prompt} tokens do prompt vieram do cache do provedor.')
+        if tokens_estimados:
+            st.caption(f'ℹ️ O provedor não informou o uso — tokens estimados localmente ({metodo_tokens()}).')
+        if cortes_teto['historico']:
+            st.caption(f'✂️ {cortes_teto["historico"]} mensagem(ns) antiga(s) cortada(s) para caber em {PROMPT_MAX_TOKENS} tokens.')
         if fora_do_escopo:
             st.warning('⚠️ Pergunta fora do escopo detectada — resposta de recusa registrada.')
 
@@ -1,7 +1,6 @@
 import pandas as pd
 import json
 import time
-import csv
 import os
 import sys
 from datetime import datetime
@@ -21,6 +20,17 @@ from utils.charts_comparador import (
     grafico_historico_comparativo
 
 )
+from utils.cliente import obter_cliente
+from utils.limites import obter_limitador, LimiteExcedido
+from utils.roteador import MODELOS, COMPARADOR, obter_roteador
+from utils.metricas import obter_coletor, descarregar_todos
+from utils.banco_metricas import (
+    TABELA_COMPARADOR,
+    preparar,
+    intervalo_datas,
+    listar_modelos,
+    ler_periodo,
+)
 
 # ============================================================
 # pages/comparador.py
@@ -48,17 +58,11 @@ st.caption('Digite uma pergunta e compare as respostas e métricas de múltiplos
 
 # ============================================================
 # 1. CONFIGURAÇÃO DOS MODELOS DISPONÍVEIS
-# Dicionário com nome amigável → identificador da API
+# Dicionário com nome amigável → identificador da API.
+# MODELOS vem de utils/roteador.py — a mesma lista usada pelo
+# roteador do chat, que também aprende com estas comparações.
 # ============================================================
 
-MODELOS = {
-    'GPT OSS 120B':  'openai/gpt-oss-120b',
-    'GPT OSS 20B': 'openai/gpt-oss-20b', 
-    'LLaMA 70B VERSATILE':      'llama-3.3-70b-versatile', 
-    'Kimi K2 - Moonshot AI': 'moonshotai/kimi-k2-instruct-0905',
-    'Qwen3-32B - Alibaba Cloud': 'qwen/qwen3-32b', 
-}
-
 ARQUIVO_COMPARADOR = 'data/metricas_comparador.csv'
 
 # ============================================================
@@ -115,17 +119,24 @@ def chamar_modelo(client: Groq, modelo_id: str, pergunta: str) -> dict:
     Retorna:
         dict com resposta, tokens e latência
     """
-    start = time.time()
+    start  = time.time()
+    limite = {'espera_fila_s': 0.0, 'tentativas': 1}
 
     try:
-        completion = client.chat.completions.create(
-            model       = modelo_id,
-            messages    = [
-                {'role': 'system', 'content': PROMPT},
-                {'role': 'user',   'content': pergunta},
-            ],
-            temperature = 0.2,
-            stream      = False,  # ← sem streaming — retorna tudo de uma vez
+        # O limitador (utils/limites.py) segura a chamada na fila se a
+        # taxa do modelo foi atingida e repete 429/5xx com backoff
+        completion, limite = obter_limitador().chamar(
+            lambda: client.chat.completions.create(
+                model       = modelo_id,
+                messages    = [
+                    {'role': 'system', 'content': PROMPT},
+                    {'role': 'user',   'content': pergunta},
+                ],
+                temperature = 0.2,
+                stream      = False,  # ← sem streaming — retorna tudo de uma vez
+            ),
+            os.environ.get('GROQ_API'),
+            modelo_id,
         )
 
         # Com stream=False, os dados chegam direto no objeto completion.
@@ -135,7 +146,8 @@ def chamar_modelo(client: Groq, modelo_id: str, pergunta: str) -> dict:
         tokens_resposta = completion.usage.completion_tokens
         tokens_total    = completion.usage.total_tokens
 
-        latencia           = time.time() - start
+        # A espera na fila não é latência do modelo — vai em espera_fila_s
+        latencia           = time.time() - start - limite['espera_fila_s']
         tokens_por_segundo = tokens_resposta / latencia if latencia > 0 else 0
 
         return {
@@ -147,6 +159,22 @@ def chamar_modelo(client: Groq, modelo_id: str, pergunta: str) -> dict:
             'latencia':           round(latencia, 2),
             'tokens_por_segundo': round(tokens_por_segundo, 1),
             'erro':               None,
+            **limite,
+        }
+
+    except LimiteExcedido as e:
+        # Rate limit mesmo depois das repetições: registrado à parte
+        return {
+            'sucesso':            False,
+            'resposta':           '⏳ Limite de requisições do modelo atingido. Tente novamente em alguns segundos.',
+            'tokens_prompt':      0,
+            'tokens_resposta':    0,
+            'tokens_total':       0,
+            'latencia':           0,
+            'tokens_por_segundo': 0,
+            'erro':               str(e),
+            'espera_fila_s':      round(time.time() - start, 2),
+            'tentativas':         e.tentativas,
         }
 
     except Exception as e:
@@ -160,42 +188,45 @@ def chamar_modelo(client: Groq, modelo_id: str, pergunta: str) -> dict:
             'latencia':           round(time.time() - start, 2),
             'tokens_por_segundo': 0,
             'erro':               str(e),
+            **limite,
         }
 
 
 # ============================================================
 # 4. FUNÇÃO PARA SALVAR MÉTRICAS DO COMPARADOR
+# Só enfileira — o coletor compartilhado (utils/metricas.py) grava
+# em lote numa thread de fundo.
 # ============================================================
+CAMPOS_COMPARADOR = [
+    'timestamp', 'pergunta', 'modelo',
+    'tokens_prompt', 'tokens_resposta', 'tokens_total',
+    'latencia_s', 'tokens_por_segundo', 'sucesso',
+    'espera_fila_s', 'tentativas',   # limitador (utils/limites.py)
+]
+
 def salvar_metrica_comparador(pergunta: str, modelo: str, resultado: dict):
-    arquivo_novo = not os.path.exists(ARQUIVO_COMPARADOR)
-
-    with open(ARQUIVO_COMPARADOR, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=[
-            'timestamp', 'pergunta', 'modelo',
-            'tokens_prompt', 'tokens_resposta', 'tokens_total',
-            'latencia_s', 'tokens_por_segundo', 'sucesso',
-        ])
-        if arquivo_novo:
-            writer.writeheader()
-
-        writer.writerow({
-            'timestamp':          datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'pergunta':           pergunta[:100],
-            'modelo':             modelo,
-            'tokens_prompt':      resultado['tokens_prompt'],
-            'tokens_resposta':    resultado['tokens_resposta'],
-            'tokens_total':       resultado['tokens_total'],
-            'latencia_s':         resultado['latencia'],
-            'tokens_por_segundo': resultado['tokens_por_segundo'],
-            'sucesso':            resultado['sucesso'],
-        })
+    coletor = obter_coletor(ARQUIVO_COMPARADOR, CAMPOS_COMPARADOR, tabela=TABELA_COMPARADOR)
+    coletor.registrar({
+        'timestamp':          datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'pergunta':           pergunta[:100],
+        'modelo':             modelo,
+        'tokens_prompt':      resultado['tokens_prompt'],
+        'tokens_resposta':    resultado['tokens_resposta'],
+        'tokens_total':       resultado['tokens_total'],
+        'latencia_s':         resultado['latencia'],
+        'tokens_por_segundo': resultado['tokens_por_segundo'],
+        'sucesso':            resultado['sucesso'],
+        'espera_fila_s':      resultado['espera_fila_s'],
+        'tentativas':         resultado['tentativas'],
+    })
 
 
 # ============================================================
 # 5. SIDEBAR — SELEÇÃO DE MODELOS E NAVEGAÇÃO
 # ============================================================
 
-client = Groq(api_key=os.environ.get('GROQ_API'))
+# Mesmo cliente do chat: um por processo, com pool de conexões (utils/cliente.py)
+client = obter_cliente()
 
 with st.sidebar:
     st.header('⚙️ Configurações')
@@ -253,6 +284,11 @@ if comparar and pergunta.strip():
             # Spinner enquanto o modelo processa
             with st.spinner(f'Consultando {nome_modelo}...'):
                 resultado = chamar_modelo(client, modelo_id, pergunta)
+                # Cada comparação também alimenta o roteador do chat
+                obter_roteador().registrar(
+                    modelo_id, resultado['latencia'] if resultado['sucesso'] else None, resultado['sucesso'],
+                    fonte=COMPARADOR,
+                )
 
             resultados[nome_modelo] = resultado
 
@@ -301,28 +337,47 @@ elif comparar and not pergunta.strip():
 
 # ============================================================
 # 9. HISTÓRICO DE COMPARAÇÕES
-# Carrega o CSV e exibe os gráficos históricos
+# Consulta o banco de métricas (utils/banco_metricas.py) só no
+# período e nos modelos selecionados — sem reler o histórico inteiro.
 # ============================================================
 st.divider()
 st.subheader('📈 Histórico de Comparações')
 
-if not os.path.exists(ARQUIVO_COMPARADOR):
+# Grava o que ainda estiver na fila para o histórico sair completo
+descarregar_todos()
+preparar(TABELA_COMPARADOR)
+
+data_min, data_max = intervalo_datas(TABELA_COMPARADOR)
+
+if data_min is None:
     st.info('Nenhuma comparação realizada ainda. Faça sua primeira comparação acima!')
 else:
-    df = pd.read_csv(ARQUIVO_COMPARADOR, parse_dates=['timestamp'])
-
-    if df.empty:
-        st.info('Nenhuma comparação registrada ainda.')
-    else:
+    col_periodo, col_modelos = st.columns([1, 2])
+    with col_periodo:
+        datas = st.date_input(
+            'Período do histórico:',
+            value     = (data_min, data_max),
+            min_value = data_min,
+            max_value = data_max,
+        )
+    with col_modelos:
         # Filtro de modelos no histórico
-        modelos_historico = df['modelo'].unique().tolist()
+        modelos_historico = listar_modelos(TABELA_COMPARADOR)
         filtro_modelos    = st.multiselect(
             'Filtrar modelos no histórico:',
             options = modelos_historico,
             default = modelos_historico,
         )
-        df = df[df['modelo'].isin(filtro_modelos)]
 
+    if len(datas) == 2:
+        df = ler_periodo(TABELA_COMPARADOR, datas[0], datas[1], modelos=filtro_modelos)
+    else:
+        st.warning('Selecione as duas datas para filtrar o período.')
+        df = pd.DataFrame()
+
+    if df.empty:
+        st.info('Nenhuma comparação registrada no período selecionado.')
+    else:
         # --- Linha 1: Latência e Velocidade ---
         st.subheader('Gráficos de Latência e Velocidade')
 
@@ -15,9 +15,12 @@ from utils.charts import (
     grafico_velocidade,
     grafico_tokens_por_interacao,
     grafico_proporcao_tokens,
-    grafico_feedbacks
-    
+    grafico_feedbacks,
+    grafico_etapas_latencia,
+    grafico_latencia_entre_tokens,
 )
+from utils.metricas import descarregar_todos
+from utils.banco_metricas import TABELA_CHAT, preparar, intervalo_datas, ler_periodo
 
 # ============================================================
 # DASHBOARD DE MÉTRICAS — pages/dashboard.py
@@ -38,40 +41,32 @@ st.set_page_config(
 
 st.title('📊 Dashboard de Métricas do Agente Money Journey')
 
-ARQUIVO_METRICAS = 'data/metricas.csv'
+# Métricas do chat ficam numa fila em memória até o próximo lote;
+# grava o que estiver pendente antes de consultar o banco
+descarregar_todos()
+
+# Na primeira execução, importa o data/metricas.csv antigo para o banco
+preparar(TABELA_CHAT)
 
 # ============================================================
-# 1. VERIFICAR SE O ARQUIVO DE MÉTRICAS EXISTE
+# 1. VERIFICAR SE EXISTEM MÉTRICAS
+# MIN/MAX do timestamp vêm do índice — não lê a tabela inteira.
 # ============================================================
-if not os.path.exists(ARQUIVO_METRICAS):
+data_min, data_max = intervalo_datas(TABELA_CHAT)
+
+if data_min is None:
     st.info('Nenhuma métrica registrada ainda. Faça sua primeira pergunta no chat')
     st.page_link('app.py', label='💬 Ir para o Chat', icon='💬')
     st.stop()
 
 
 # ============================================================
-# 2. CARREGAR O CSV
-# ============================================================
-
-def carregar_metricas():
-    return pd.read_csv(ARQUIVO_METRICAS, parse_dates=['timestamp'])
-
-df = carregar_metricas()  # ← carrega primeiro
-df_completo = df.copy()   # ← copia antes de qualquer filtro
-
-
-
-
-# ============================================================
-# 3. SIDEBAR — FILTROS E NAVEGAÇÃO
+# 2. SIDEBAR — FILTROS E NAVEGAÇÃO
 # ============================================================
 
 with st.sidebar:
     st.header('🔎 Filtros')
 
-    data_min = df['timestamp'].min().date()
-    data_max = df['timestamp'].max().date()
-
     datas = st.date_input(
     'Período',
     value     = (data_min, data_max),
@@ -82,15 +77,18 @@ with st.sidebar:
     # Só aplica o filtro se as duas datas estiverem preenchidas
     if len(datas) == 2:
         data_inicio, data_fim = datas
-        df = df[
-            (df['timestamp'].dt.date >= data_inicio) &
-            (df['timestamp'].dt.date <= data_fim)
-        ]
     else:
         st.warning('Selecione as duas datas para filtrar o período.')
         st.stop()
 
 
+# ============================================================
+# 3. CARREGAR SÓ O PERÍODO SELECIONADO
+# A consulta usa o índice de timestamp do banco SQLite.
+# ============================================================
+df = ler_periodo(TABELA_CHAT, data_inicio, data_fim)
+
+with st.sidebar:
     st.divider()
     st.metric('Total de interações', len(df))
     st.divider()
@@ -165,6 +163,82 @@ with col_d:
     else:
         st.caption('Nenhum feedback registrado ainda.')
 
+# --- Linha 4: Etapas da latência e intervalo entre tokens ---
+# Só aparece quando há interações com tempos por etapa registrados
+if 'ttft_s' in df.columns and df['ttft_s'].notna().any():
+    col_e, col_f = st.columns(2)
+    with col_e:
+        st.plotly_chart(
+            grafico_etapas_latencia(df),
+            use_container_width=True,
+        )
+    with col_f:
+        st.plotly_chart(
+            grafico_latencia_entre_tokens(df),
+            use_container_width=True,
+        )
+
+# --- Linha 5: Reuso de conexões do pool (utils/cliente.py) ---
+if 'conexao_reutilizada' in df.columns and df['conexao_reutilizada'].notna().any():
+    conexoes       = df['conexao_reutilizada'].dropna().astype(bool)
+    reutilizadas   = int(conexoes.sum())
+    handshake_medio = df['handshake_ms'].mean() if df['handshake_ms'].notna().any() else 0
+
+    col_g, col_h, col_i = st.columns(3)
+    col_g.metric('🔁 Reuso de Conexões',       f'{conexoes.mean() * 100:.0f}%')
+    col_h.metric('🤝 Handshake Médio (TLS)',   f'{handshake_medio:.0f} ms')
+    col_i.metric('💾 Handshake Evitado',       f'{reutilizadas * handshake_medio / 1000:.2f}s')
+
+# --- Linha 6: Cache de prompt do provedor (PROMPT_LAYOUT='prefixo') ---
+if 'tokens_cache_prompt' in df.columns and df['tokens_cache_prompt'].notna().any():
+    com_usage   = df[df['tokens_cache_prompt'].notna()]
+    em_cache    = pd.to_numeric(com_usage['tokens_cache_prompt'], errors='coerce').fillna(0)
+    prompt      = pd.to_numeric(com_usage['tokens_prompt'], errors='coerce').fillna(0)
+    ttft        = pd.to_numeric(com_usage.get('ttft_s'), errors='coerce')
+    ttft_com    = ttft[em_cache > 0].mean()
+    ttft_sem    = ttft[em_cache == 0].mean()
+
+    col_j, col_k, col_l = st.columns(3)
+    col_j.metric('♻️ Prompt em Cache',     f'{em_cache.sum() / prompt.sum() * 100:.0f}%' if prompt.sum() else '—')
+    col_k.metric('🚀 TTFT com cache',      f'{ttft_com:.2f}s' if pd.notna(ttft_com) else '—')
+    col_l.metric('🐢 TTFT sem cache',      f'{ttft_sem:.2f}s' if pd.notna(ttft_sem) else '—')
+
+# --- Linha 7: Hedge — TTFT p99 com e sem a chamada ao modelo reserva ---
+# Os dois lados contam do envio do principal (depois da fila do
+# limitador) e usam as MESMAS linhas. ttft_principal_s é o TTFT
+# observado do principal; se ele perdeu e não foi medido a tempo, entra
+# ttft_principal_min_s (limite inferior) — descartar essas linhas, que
+# são as piores esperas, puxaria o p99 "sem hedge" para baixo.
+if 'ttft_principal_s' in df.columns and df['ttft_principal_s'].notna().any():
+    principal = pd.to_numeric(df['ttft_principal_s'], errors='coerce')
+    if 'ttft_principal_min_s' in df.columns:
+        principal = principal.fillna(pd.to_numeric(df['ttft_principal_min_s'], errors='coerce'))
+    exibido   = pd.to_numeric(df['ttft_s'], errors='coerce')
+    comparaveis = principal.notna() & exibido.notna()
+    disparados  = df.loc[principal.notna(), 'hedge_disparado'] == True
+    p99_sem     = principal[comparaveis].quantile(0.99)
+    p99_com     = exibido[comparaveis].quantile(0.99)
+
+    col_m, col_n, col_o = st.columns(3)
+    col_m.metric('🏁 Hedges Disparados',     f'{disparados.mean() * 100:.1f}%')
+    col_n.metric('🐢 TTFT p99 sem hedge',    f'{p99_sem:.2f}s' if pd.notna(p99_sem) else '—')
+    col_o.metric('🚀 TTFT p99 com hedge',    f'{p99_com:.2f}s' if pd.notna(p99_com) else '—',
+                 delta=f'{p99_com - p99_sem:.2f}s' if pd.notna(p99_com) and pd.notna(p99_sem) else None,
+                 delta_color='inverse')
+
+# --- Linha 8: Gerações canceladas (nova pergunta, limpar, rerun) ---
+# Tokens economizados é uma ESTIMATIVA: média de tokens das respostas
+# completas menos o que já tinha sido gerado quando a resposta parou.
+if 'geracao_cancelada' in df.columns and df['geracao_cancelada'].notna().any():
+    canceladas   = df[df['geracao_cancelada'] == True]
+    economizados = pd.to_numeric(canceladas['tokens_economizados_cancelamento'], errors='coerce').fillna(0)
+    motivos      = canceladas['motivo_cancelamento'].value_counts()
+
+    col_p, col_q, col_r = st.columns(3)
+    col_p.metric('✋ Respostas Canceladas',  len(canceladas))
+    col_q.metric('🪙 Tokens Economizados (estimativa)', f'~{economizados.sum():.0f}')
+    col_r.metric('🔁 Motivo mais comum',     motivos.index[0] if len(motivos) else '—')
+
 st.divider()
 
 
@@ -174,11 +248,11 @@ st.divider()
 
 with st.expander('🗂️ Ver todos os registros'):
     st.dataframe(
-        df_completo.sort_values('timestamp', ascending=False),
+        df.sort_values('timestamp', ascending=False),
         use_container_width=True,
     )
 
-    csv_export = df_completo.to_csv(index=False).encode('utf-8')
+    csv_export = df.to_csv(index=False).encode('utf-8')
     st.download_button(
         label='⬇️ Baixar métricas filtradas (CSV)',
         data = csv_export,
@@ -0,0 +1,252 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# ============================================================
+# utils/agregados.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Calcular UMA vez por versão dos dados os totais das transações.
+#
+# Antes: a cada rerun a barra lateral refazia
+# transacoes.groupby('categoria')['valor'].sum() — somando entradas
+# e saídas juntas, como se salário e aluguel fossem a mesma coisa —
+# e o prompt levava todas as linhas do CSV.
+# Agora os agregados são materializados e reaproveitados pela barra
+# lateral e pelo contexto do modelo:
+# - por categoria (entrada e saída separadas) e por tipo
+# - por mês (entradas, saídas, saldo e taxa de poupança)
+# - saldo acumulado dia a dia
+# - gastos recorrentes (mesma descrição, valor estável, vários meses)
+# - tendência das despesas
+# O resumo de fluxo de caixa (texto_fluxo) substitui as linhas
+# brutas no prompt: algumas dezenas de tokens em vez de milhares.
+#
+# Desempenho: tudo é feito com códigos inteiros (pd.factorize) e
+# somas por código (np.bincount) — sem groupby em strings, sem laço
+# por linha. Benchmark com dados sintéticos:
+#     python -m utils.agregados [linhas]
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não lê arquivos do disco
+# ============================================================
+
+TIPOS = ['entrada', 'saida']
+
+# Recorrente: aparece em pelo menos MIN_MESES_RECORRENTE meses distintos
+# com variação de valor (desvio/média) de no máximo VARIACAO_RECORRENTE
+MIN_MESES_RECORRENTE = 2
+VARIACAO_RECORRENTE  = 0.15
+
+
+class AgregadosTransacoes:
+    """Totais das transações, calculados na criação e só lidos depois.
+
+    Parâmetros:
+        transacoes (pd.DataFrame): colunas data, descricao, categoria, valor, tipo
+    """
+
+    def __init__(self, transacoes: pd.DataFrame):
+        df = transacoes
+        self.linhas = len(df)
+
+        valor = pd.to_numeric(df['valor'], errors='coerce').to_numpy(dtype=float, na_value=0.0)
+        codigos_tipo, nomes_tipo = pd.factorize(df['tipo'])
+        nomes_tipo = pd.Index(nomes_tipo).astype(str).str.strip().str.lower()
+        # saida[i] = True se a linha i é uma saída; entrada idem
+        saida   = np.isin(codigos_tipo, np.flatnonzero(nomes_tipo == 'saida'))
+        entrada = np.isin(codigos_tipo, np.flatnonzero(nomes_tipo == 'entrada'))
+        liquido = np.where(entrada, valor, np.where(saida, -valor, 0.0))
+
+        # --- Por tipo e por categoria: bincount sobre (categoria, tipo) ---
+        codigos_cat, nomes_cat = pd.factorize(df['categoria'])
+        n_cat = len(nomes_cat)
+        valido = codigos_cat >= 0
+        somas = {
+            nome: np.bincount(codigos_cat[valido & mascara], weights=valor[valido & mascara], minlength=n_cat)
+            for nome, mascara in (('entrada', entrada), ('saida', saida))
+        }
+        self.por_categoria = pd.DataFrame(somas, index=pd.Index(nomes_cat.astype(str), name='categoria')) \
+            .sort_index()
+        self.por_tipo = pd.Series(
+            {'entrada': float(valor[entrada].sum()), 'saida': float(valor[saida].sum())}, name='valor'
+        )
+        self.total_entradas = float(self.por_tipo['entrada'])
+        self.total_saidas   = float(self.por_tipo['saida'])
+        self.saldo          = self.total_entradas - self.total_saidas
+
+        # --- Datas: dias e meses como inteiros ---
+        # Há poucas datas distintas (no máximo uma por dia): converte só
+        # os valores únicos e espalha pelos códigos
+        codigos_data, datas_unicas = pd.factorize(df['data'])
+        datas_unicas = pd.to_datetime(datas_unicas, errors='coerce', format='ISO8601').to_numpy()
+        datas = np.append(datas_unicas, np.datetime64('NaT'))[codigos_data]   # código -1 → NaT
+        com_data = ~np.isnat(datas)
+        dias   = datas[com_data].astype('datetime64[D]').astype(np.int64)
+        meses  = datas[com_data].astype('datetime64[M]').astype(np.int64)
+
+        # --- Por mês ---
+        if com_data.any():
+            mes0, n_meses = meses.min(), meses.max() - meses.min() + 1
+            idx_mes = meses - mes0
+            por_mes = pd.DataFrame({
+                nome: np.bincount(idx_mes, weights=valor[com_data] * mascara[com_data], minlength=n_meses)
+                for nome, mascara in (('entrada', entrada), ('saida', saida))
+            }, index=pd.Index(
+                np.datetime_as_string(np.arange(mes0, mes0 + n_meses).astype('datetime64[M]'), unit='M'),
+                name='mes',
+            ))
+            # Meses sem nenhuma transação ficam de fora
+            contagem = np.bincount(idx_mes, minlength=n_meses)
+            self.por_mes = por_mes[contagem > 0].copy()
+
+            # --- Saldo acumulado ao fim de cada dia com movimento ---
+            dia0, n_dias = dias.min(), dias.max() - dias.min() + 1
+            por_dia = np.bincount(dias - dia0, weights=liquido[com_data], minlength=n_dias)
+            tem_mov = np.bincount(dias - dia0, minlength=n_dias) > 0
+            self.saldo_acumulado = pd.Series(
+                np.cumsum(por_dia)[tem_mov],
+                index=pd.DatetimeIndex(np.arange(dia0, dia0 + n_dias).astype('datetime64[D]')[tem_mov], name='data'),
+                name='saldo',
+            )
+        else:
+            self.por_mes = pd.DataFrame(columns=TIPOS, index=pd.Index([], name='mes'), dtype=float)
+            self.saldo_acumulado = pd.Series(dtype=float, name='saldo')
+
+        self.por_mes['saldo'] = self.por_mes['entrada'] - self.por_mes['saida']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.por_mes['taxa_poupanca'] = np.where(
+                self.por_mes['entrada'] > 0, self.por_mes['saldo'] / self.por_mes['entrada'], np.nan
+            )
+        self.taxa_poupanca = self.saldo / self.total_entradas if self.total_entradas > 0 else None
+
+        self.recorrentes = self._recorrentes(df, valor, saida, com_data, meses)
+        self.tendencia   = self._tendencia()
+
+    @staticmethod
+    def _recorrentes(df, valor, saida, com_data, meses) -> pd.DataFrame:
+        """Saídas com a mesma descrição em vários meses e valor estável."""
+        vazio = pd.DataFrame(columns=['descricao', 'meses', 'valor_medio'])
+        if 'descricao' not in df.columns or not saida.any():
+            return vazio
+
+        linhas = saida & com_data
+        codigos, nomes = pd.factorize(df['descricao'].to_numpy()[linhas])
+        if not len(nomes):
+            return vazio
+        # meses é só das linhas com data: alinha com as saídas datadas
+        meses_saida = meses[saida[com_data]]
+        v = valor[linhas]
+        n = len(nomes)
+
+        # Meses distintos por descrição: pares únicos (descrição, mês)
+        vao     = meses_saida.max() - meses_saida.min() + 1
+        pares   = np.unique(codigos.astype(np.int64) * vao + (meses_saida - meses_saida.min()))
+        n_meses = np.bincount(pares // vao, minlength=n)
+
+        contagem = np.bincount(codigos, minlength=n)
+        soma     = np.bincount(codigos, weights=v, minlength=n)
+        soma_q   = np.bincount(codigos, weights=v * v, minlength=n)
+        media    = soma / np.maximum(contagem, 1)
+        desvio   = np.sqrt(np.maximum(soma_q / np.maximum(contagem, 1) - media ** 2, 0))
+
+        recorrente = (n_meses >= MIN_MESES_RECORRENTE) & (desvio <= VARIACAO_RECORRENTE * media)
+        resultado = pd.DataFrame({
+            'descricao':   np.asarray(nomes)[recorrente].astype(str),
+            'meses':       n_meses[recorrente],
+            'valor_medio': media[recorrente],
+        })
+        return resultado.sort_values('valor_medio', ascending=False, ignore_index=True)
+
+    def _tendencia(self) -> dict:
+        """Variação das despesas: último mês contra a média dos 3 anteriores."""
+        saidas = self.por_mes['saida'].to_numpy()
+        if len(saidas) < 2:
+            return None
+        anteriores = saidas[-4:-1]
+        base = anteriores.mean()
+        return {
+            'mes':         self.por_mes.index[-1],
+            'variacao':    (saidas[-1] - base) / base if base > 0 else None,
+            'media_base':  float(base),
+        }
+
+    def gastos_por_categoria(self) -> pd.Series:
+        """Saídas por categoria, da maior para a menor (sem categorias zeradas)."""
+        gastos = self.por_categoria['saida']
+        return gastos[gastos > 0].sort_values(ascending=False)
+
+    def texto(self) -> str:
+        """Resumo curto para o contexto do modelo."""
+        gastos = ', '.join(f'{c} R$ {v:.2f}' for c, v in self.gastos_por_categoria().items())
+        return (
+            f'TOTAIS DAS TRANSAÇÕES: entradas R$ {self.total_entradas:.2f} | '
+            f'saídas R$ {self.total_saidas:.2f} | saldo R$ {self.saldo:.2f}\n'
+            f'GASTOS POR CATEGORIA: {gastos}\n'
+        )
+
+    def texto_fluxo(self, max_meses: int = 6, max_categorias: int = 5, max_recorrentes: int = 8) -> str:
+        """Resumo de fluxo de caixa para o prompt, no lugar das linhas brutas.
+
+        O tamanho não depende de quantas transações existem — só dos
+        limites de meses, categorias e recorrentes.
+        """
+        partes = [f'FLUXO DE CAIXA ({self.linhas} transações, {len(self.por_mes)} mês(es)):']
+        partes.append('mês | entradas | saídas | saldo | poupança')
+        for mes, linha in self.por_mes.tail(max_meses).iterrows():
+            poupanca = '—' if pd.isna(linha['taxa_poupanca']) else f'{linha["taxa_poupanca"] * 100:.0f}%'
+            partes.append(f'{mes} | {linha["entrada"]:.2f} | {linha["saida"]:.2f} | {linha["saldo"]:.2f} | {poupanca}')
+
+        if self.taxa_poupanca is not None:
+            partes.append(f'TAXA DE POUPANÇA NO PERÍODO: {self.taxa_poupanca * 100:.1f}%')
+
+        gastos = self.gastos_por_categoria().head(max_categorias)
+        if len(gastos) and self.total_saidas > 0:
+            partes.append('MAIORES GASTOS: ' + ', '.join(
+                f'{c} R$ {v:.2f} ({v / self.total_saidas * 100:.0f}%)' for c, v in gastos.items()
+            ))
+
+        if len(self.recorrentes):
+            partes.append('GASTOS RECORRENTES: ' + ', '.join(
+                f'{r.descricao} ~R$ {r.valor_medio:.2f}/mês ({r.meses} meses)'
+                for r in self.recorrentes.head(max_recorrentes).itertuples()
+            ))
+
+        if self.tendencia and self.tendencia['variacao'] is not None:
+            partes.append(
+                f'TENDÊNCIA: despesas de {self.tendencia["mes"]} {self.tendencia["variacao"] * 100:+.0f}% '
+                f'em relação à média dos meses anteriores (R$ {self.tendencia["media_base"]:.2f})'
+            )
+        return '\n'.join(partes) + '\n'
+
+
+if __name__ == '__main__':
+    # Gera N transações sintéticas e mede o tempo dos agregados
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    rng = np.random.default_rng(0)
+    descricoes = np.array(['Salário', 'Aluguel', 'Supermercado', 'Netflix', 'Farmácia',
+                           'Restaurante', 'Uber', 'Conta de Luz', 'Academia', 'Combustível'])
+    categorias = np.array(['receita', 'moradia', 'alimentacao', 'lazer', 'saude',
+                           'alimentacao', 'transporte', 'moradia', 'saude', 'transporte'])
+    escolha = rng.integers(0, len(descricoes), n)
+    dias    = np.datetime64('2020-01-01') + rng.integers(0, 365 * 5, n).astype('timedelta64[D]')
+    sintetico = pd.DataFrame({
+        'data':      np.datetime_as_string(dias, unit='D'),
+        'descricao': descricoes[escolha],
+        'categoria': categorias[escolha],
+        'valor':     rng.uniform(10, 500, n).round(2),
+        'tipo':      np.where(escolha == 0, 'entrada', 'saida'),
+    })
+
+    inicio = time.perf_counter()
+    agregados = AgregadosTransacoes(sintetico)
+    decorrido = time.perf_counter() - inicio
+
+    from utils.tokens import contar_tokens
+    amostra = sintetico.tail(2000).to_string(index=False)
+    print(f'{n:,} linhas em {decorrido:.2f}s')
+    print(f'tokens: resumo {contar_tokens(agregados.texto_fluxo())} · '
+          f'só as últimas 2.000 linhas brutas {contar_tokens(amostra)}')
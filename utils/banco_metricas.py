@@ -0,0 +1,265 @@
+import os
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+import pandas as pd
+
+# ============================================================
+# utils/banco_metricas.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Guardar e consultar as métricas num banco SQLite local.
+#
+# Por que SQLite e não só o CSV?
+# - O dashboard e o comparador liam o CSV INTEIRO com pd.read_csv a
+#   cada rerun. Com índice em timestamp (e modelo), lemos só o
+#   período selecionado.
+# - Modo WAL: leitores não bloqueiam a escrita e vice-versa, então
+#   o dashboard pode consultar enquanto o chat grava.
+#
+# Cada operação abre sua própria conexão — conexões SQLite não
+# devem ser compartilhadas entre threads, e abrir uma é barato.
+#
+# Para importar os CSVs antigos manualmente:
+#     python -m utils.banco_metricas
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não monta gráficos
+# ============================================================
+
+ARQUIVO_BANCO = 'data/metricas.db'
+
+TABELA_CHAT       = 'metricas'
+TABELA_COMPARADOR = 'metricas_comparador'
+
+# Colunas True/False. O SQLite devolve 1/0 (e o CSV legado, 'True'/
+# 'False'); ler_periodo converte todas para True/False/None uma vez,
+# para as páginas não precisarem reinterpretar
+COLUNAS_BOOLEANAS = (
+    'fora_do_escopo', 'cache_hit', 'tokens_estimados', 'conexao_reutilizada',
+    'hedge_disparado', 'geracao_cancelada', 'sucesso',
+)
+
+_VERDADEIROS = {'1', 'true', '1.0'}
+_FALSOS      = {'0', 'false', '0.0'}
+
+# CSVs antigos, importados automaticamente quando a tabela ainda não existe
+CSV_LEGADO = {
+    TABELA_CHAT:       'data/metricas.csv',
+    TABELA_COMPARADOR: 'data/metricas_comparador.csv',
+}
+
+
+def conectar(banco: str = ARQUIVO_BANCO) -> sqlite3.Connection:
+    """Abre uma conexão com WAL ligado e espera em caso de disputa."""
+    conn = sqlite3.connect(banco, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')  # seguro com WAL e bem mais rápido
+    return conn
+
+
+def _colunas(conn: sqlite3.Connection, tabela: str) -> list:
+    return [linha[1] for linha in conn.execute(f'PRAGMA table_info("{tabela}")')]
+
+
+def garantir_tabela(conn: sqlite3.Connection, tabela: str, campos: list):
+    """Cria a tabela e os índices; acrescenta colunas novas se faltarem.
+
+    Parâmetros:
+        conn: conexão aberta
+        tabela (str): nome da tabela
+        campos (list): colunas esperadas (a primeira deve ser 'timestamp')
+    """
+    existentes = _colunas(conn, tabela)
+    if not existentes:
+        # timestamp como TEXT 'AAAA-MM-DD HH:MM:SS' — ordenável e indexável.
+        # As demais colunas ficam sem tipo: o SQLite guarda o valor como veio.
+        colunas = ', '.join(f'"{c}"' if c != 'timestamp' else '"timestamp" TEXT' for c in campos)
+        conn.execute(f'CREATE TABLE "{tabela}" ({colunas})')
+    else:
+        for campo in campos:
+            if campo not in existentes:
+                conn.execute(f'ALTER TABLE "{tabela}" ADD COLUMN "{campo}"')
+
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{tabela}_timestamp" ON "{tabela}" ("timestamp")')
+    if 'modelo' in _colunas(conn, tabela):
+        conn.execute(
+            f'CREATE INDEX IF NOT EXISTS "idx_{tabela}_modelo" ON "{tabela}" ("modelo", "timestamp")'
+        )
+    conn.commit()
+
+
+def inserir(tabela: str, campos: list, registros: list, banco: str = ARQUIVO_BANCO):
+    """Insere um lote de registros numa única transação."""
+    if not registros:
+        return
+    conn = conectar(banco)
+    try:
+        garantir_tabela(conn, tabela, campos)
+        colunas = ', '.join(f'"{c}"' for c in campos)
+        marcadores = ', '.join('?' for _ in campos)
+        with conn:
+            conn.executemany(
+                f'INSERT INTO "{tabela}" ({colunas}) VALUES ({marcadores})',
+                [tuple(r.get(c) for c in campos) for r in registros],
+            )
+    finally:
+        conn.close()
+
+
+def _contar(conn: sqlite3.Connection, tabela: str) -> int:
+    if not _colunas(conn, tabela):
+        return 0
+    (linhas,) = conn.execute(f'SELECT COUNT(*) FROM "{tabela}"').fetchone()
+    return linhas
+
+
+def importar_csv(caminho_csv: str, tabela: str, banco: str = ARQUIVO_BANCO) -> int:
+    """Importa um CSV de métricas para a tabela, se ela ainda estiver vazia.
+
+    Só importa uma vez: se a tabela já tiver linhas, não faz nada —
+    a partir daí o coletor grava no banco diretamente.
+
+    Retorna:
+        int: quantidade de linhas importadas
+    """
+    if not os.path.exists(caminho_csv) or os.path.getsize(caminho_csv) == 0:
+        return 0
+
+    conn = conectar(banco)
+    try:
+        if _contar(conn, tabela):
+            return 0
+
+        df = pd.read_csv(caminho_csv)
+        campos = list(df.columns)
+        # astype(object) converte os tipos do NumPy em tipos Python,
+        # que o sqlite3 sabe gravar; NaN vira NULL
+        registros = df.astype(object).where(df.notna(), None).values.tolist()
+
+        garantir_tabela(conn, tabela, campos)
+
+        # BEGIN IMMEDIATE trava a escrita: se dois processos subirem
+        # juntos, só o primeiro importa — o segundo vê a tabela cheia
+        conn.execute('BEGIN IMMEDIATE')
+        if _contar(conn, tabela):
+            conn.rollback()
+            return 0
+        colunas = ', '.join(f'"{c}"' for c in campos)
+        marcadores = ', '.join('?' for _ in campos)
+        conn.executemany(f'INSERT INTO "{tabela}" ({colunas}) VALUES ({marcadores})', registros)
+        conn.commit()
+        return len(registros)
+    finally:
+        conn.close()
+
+
+def preparar(tabela: str, campos: list = None, banco: str = ARQUIVO_BANCO):
+    """Garante a tabela pronta para leitura/escrita, importando o CSV legado."""
+    csv_legado = CSV_LEGADO.get(tabela)
+    if csv_legado:
+        importar_csv(csv_legado, tabela, banco)
+    if campos:
+        conn = conectar(banco)
+        try:
+            garantir_tabela(conn, tabela, campos)
+        finally:
+            conn.close()
+
+
+def intervalo_datas(tabela: str, banco: str = ARQUIVO_BANCO):
+    """Primeira e última data registradas — (None, None) se vazio.
+
+    MIN/MAX sobre a coluna indexada não percorre a tabela.
+    """
+    conn = conectar(banco)
+    try:
+        if not _colunas(conn, tabela):
+            return None, None
+        minimo, maximo = conn.execute(
+            f'SELECT MIN("timestamp"), MAX("timestamp") FROM "{tabela}"'
+        ).fetchone()
+    finally:
+        conn.close()
+
+    if minimo is None:
+        return None, None
+    return pd.Timestamp(minimo).date(), pd.Timestamp(maximo).date()
+
+
+def listar_modelos(tabela: str, banco: str = ARQUIVO_BANCO) -> list:
+    conn = conectar(banco)
+    try:
+        if 'modelo' not in _colunas(conn, tabela):
+            return []
+        return [m for (m,) in conn.execute(f'SELECT DISTINCT "modelo" FROM "{tabela}" ORDER BY 1')]
+    finally:
+        conn.close()
+
+
+def ler_periodo(tabela: str, inicio: date = None, fim: date = None,
+                modelos: list = None, banco: str = ARQUIVO_BANCO) -> pd.DataFrame:
+    """Lê só as linhas do período (e dos modelos) pedidos.
+
+    Parâmetros:
+        tabela (str): tabela de métricas
+        inicio (date): primeiro dia, inclusive (None = sem limite)
+        fim (date): último dia, inclusive (None = sem limite)
+        modelos (list): filtra pela coluna 'modelo' (None = todos)
+
+    Retorna:
+        pd.DataFrame: linhas do período, com 'timestamp' já em datetime e
+            as COLUNAS_BOOLEANAS em True/False/None
+    """
+    filtros, parametros = [], []
+    if inicio is not None:
+        filtros.append('"timestamp" >= ?')
+        parametros.append(f'{inicio} 00:00:00')
+    if fim is not None:
+        filtros.append('"timestamp" < ?')
+        parametros.append(f'{fim + timedelta(days=1)} 00:00:00')
+    if modelos is not None:
+        if not modelos:
+            filtros.append('0')  # nenhum modelo selecionado
+        else:
+            filtros.append(f'"modelo" IN ({", ".join("?" for _ in modelos)})')
+            parametros.extend(modelos)
+
+    sql = f'SELECT * FROM "{tabela}"'
+    if filtros:
+        sql += ' WHERE ' + ' AND '.join(filtros)
+    sql += ' ORDER BY "timestamp"'
+
+    conn = conectar(banco)
+    try:
+        if not _colunas(conn, tabela):
+            return pd.DataFrame()
+        df = pd.read_sql_query(sql, conn, params=parametros, parse_dates=['timestamp'])
+    finally:
+        conn.close()
+    for coluna in COLUNAS_BOOLEANAS:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].map(_booleano).astype(object)
+    return df
+
+
+def _booleano(valor):
+    """1/0, 'True'/'False' ou bool -> True/False; vazio ou desconhecido -> None."""
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return None
+    texto = str(valor).strip().lower()
+    if texto in _VERDADEIROS:
+        return True
+    if texto in _FALSOS:
+        return False
+    return None
+
+
+if __name__ == '__main__':
+    # Importa os CSVs antigos: python -m utils.banco_metricas [banco]
+    destino = sys.argv[1] if len(sys.argv) > 1 else ARQUIVO_BANCO
+    for tabela, caminho in CSV_LEGADO.items():
+        total = importar_csv(caminho, tabela, destino)
+        print(f'{caminho} → {tabela}: {total} linhas importadas')
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# ============================================================
+# utils/cache_respostas.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Guardar respostas já geradas para perguntas repetidas.
+#
+# A chave é a pergunta normalizada + um hash de TODAS as mensagens
+# enviadas (PROMPT, CONTEXTO, resumo e turnos anteriores). Se o
+# contexto do cliente ou a conversa mudarem, a chave muda e a resposta
+# antiga simplesmente deixa de ser encontrada — "e o segundo?" numa
+# conversa nunca recebe a resposta de outra.
+#
+# Dois níveis:
+# - memória: OrderedDict com despejo LRU (tamanho máximo) e TTL
+# - disco (opcional): um arquivo JSON por chave, sobrevive a reinícios.
+#   Arquivos vencidos são apagados e a pasta tem tamanho máximo
+#   (max_disco_bytes): a faxina roda na criação e a cada
+#   FAXINA_ESCRITAS gravações, removendo primeiro os mais antigos
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não chama o modelo
+# ============================================================
+
+
+def normalizar_pergunta(pergunta: str) -> str:
+    """Minúsculas, sem acentos, sem pontuação e com espaços simples.
+
+    "Qual investimento para meu perfil?" e "qual investimento para
+    meu  perfil" viram a mesma chave.
+    """
+    texto = unicodedata.normalize('NFKD', pergunta)
+    texto = texto.encode('ascii', 'ignore').decode('ascii').lower()
+    texto = re.sub(r'[^a-z0-9 ]+', ' ', texto)
+    return ' '.join(texto.split())
+
+
+def chave_cache(pergunta: str, *partes: str) -> str:
+    """Gera a chave do cache.
+
+    Parâmetros:
+        pergunta (str): pergunta do usuário
+        *partes (str): textos que influenciam a resposta (PROMPT, CONTEXTO...)
+
+    Retorna:
+        str: hash sha256 em hexadecimal
+    """
+    h = hashlib.sha256(normalizar_pergunta(pergunta).encode('utf-8'))
+    for parte in partes:
+        h.update(b'\0')
+        h.update(parte.encode('utf-8'))
+    return h.hexdigest()
+
+
+# De quantas em quantas gravações em disco a pasta é conferida
+FAXINA_ESCRITAS = 64
+
+
+class CacheRespostas:
+    """Cache LRU + TTL em memória, com nível opcional em disco.
+
+    Parâmetros:
+        max_itens (int): quantas respostas ficam em memória
+        ttl_s (float): validade de cada resposta, em segundos
+        pasta_disco (str | None): pasta do nível em disco; None desliga
+        max_disco_bytes (int): tamanho máximo da pasta em disco
+    """
+
+    def __init__(self, max_itens: int = 256, ttl_s: float = 3600, pasta_disco: str = None,
+                 max_disco_bytes: int = 50 * 1024 * 1024):
+        self.max_itens       = max_itens
+        self.ttl_s           = ttl_s
+        self.pasta_disco     = pasta_disco
+        self.max_disco_bytes = max_disco_bytes
+        self._escritas       = 0
+        self.falhas_disco    = 0   # gravações em disco que falharam (disco cheio, sem permissão)
+
+        self._itens = OrderedDict()   # chave -> (expira_em, valor)
+        self._lock  = threading.Lock()
+
+        self.acertos = 0
+        self.falhas  = 0
+
+        if pasta_disco:
+            os.makedirs(pasta_disco, exist_ok=True)
+            self.faxina_disco()
+
+    def obter(self, chave: str):
+        """Devolve o valor guardado ou None (ausente ou expirado)."""
+        agora = time.time()
+
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                expira_em, valor = item
+                if expira_em > agora:
+                    self._itens.move_to_end(chave)  # marca como usado recentemente
+                    self.acertos += 1
+                    return valor
+                del self._itens[chave]
+
+        # Nível em disco: se achar, promove de volta para a memória
+        item = self._ler_disco(chave)
+        if item is not None and item['expira_em'] > agora:
+            with self._lock:
+                self._guardar_memoria(chave, item['expira_em'], item['valor'])
+                self.acertos += 1
+            return item['valor']
+        if item is not None:
+            self._apagar(self._caminho(chave))  # vencido: não fica ocupando a pasta
+
+        with self._lock:
+            self.falhas += 1
+        return None
+
+    def guardar(self, chave: str, valor):
+        """Guarda um valor serializável em JSON."""
+        expira_em = time.time() + self.ttl_s
+        with self._lock:
+            self._guardar_memoria(chave, expira_em, valor)
+        try:
+            self._escrever_disco(chave, expira_em, valor)
+        except OSError:
+            # O nível em disco é só otimização: a resposta já foi dada e
+            # continua no nível em memória
+            with self._lock:
+                self.falhas_disco += 1
+            return
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def _guardar_memoria(self, chave, expira_em, valor):
+        self._itens[chave] = (expira_em, valor)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)  # remove o menos usado
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta_disco, f'{chave}.json')
+
+    def _ler_disco(self, chave):
+        if not self.pasta_disco:
+            return None
+        try:
+            with open(self._caminho(chave), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _escrever_disco(self, chave, expira_em, valor):
+        if not self.pasta_disco:
+            return
+        # Escreve num arquivo temporário e renomeia — leitores nunca
+        # veem um JSON pela metade
+        caminho = self._caminho(chave)
+        temporario = f'{caminho}.{os.getpid()}.tmp'
+        try:
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump({'expira_em': expira_em, 'valor': valor}, f, ensure_ascii=False)
+            os.replace(temporario, caminho)
+        except OSError:
+            self._apagar(temporario)
+            raise
+
+        with self._lock:
+            self._escritas += 1
+            faxina = self._escritas % FAXINA_ESCRITAS == 0
+        if faxina:
+            self.faxina_disco()
+
+    def faxina_disco(self) -> int:
+        """Apaga os arquivos vencidos e os mais antigos acima de max_disco_bytes.
+
+        O vencimento vem do mtime (momento da gravação) + ttl_s, sem abrir
+        os arquivos.
+
+        Retorna:
+            int: quantos arquivos foram apagados
+        """
+        if not self.pasta_disco:
+            return 0
+        agora = time.time()
+        arquivos = []
+        try:
+            entradas = list(os.scandir(self.pasta_disco))
+        except OSError:
+            return 0
+        for entrada in entradas:
+            if not entrada.name.endswith('.json'):
+                continue
+            try:
+                info = entrada.stat()
+            except OSError:
+                continue
+            arquivos.append((info.st_mtime, info.st_size, entrada.path))
+
+        apagados = 0
+        total = 0
+        restantes = []
+        for mtime, tamanho, caminho in arquivos:
+            if mtime + self.ttl_s <= agora:
+                apagados += self._apagar(caminho)
+            else:
+                restantes.append((mtime, tamanho, caminho))
+                total += tamanho
+
+        # Acima do tamanho máximo: remove do mais antigo para o mais novo
+        restantes.sort()
+        for mtime, tamanho, caminho in restantes:
+            if total <= self.max_disco_bytes:
+                break
+            apagados += self._apagar(caminho)
+            total -= tamanho
+        return apagados
+
+    @staticmethod
+    def _apagar(caminho) -> int:
+        try:
+            os.remove(caminho)
+            return 1
+        except OSError:
+            return 0
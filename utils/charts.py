@@ -265,4 +265,113 @@ def grafico_feedbacks(df: pd.DataFrame) -> go.Figure:
         yaxis       = dict(title=''),  # ← se precisar usar yaxis diretamente
     )
 
-    return fig
\ No newline at end of file
+    return fig
+
+def grafico_etapas_latencia(df: pd.DataFrame) -> go.Figure:
+    """
+    Gráfico de barras empilhadas - Em que etapa a latência é gasta.
+
+    Separa cada interação em montagem do contexto, espera pelo
+    primeiro token (rede + fila do provedor) e geração do restante.
+    Barra alta de TTFT = problema de rede/fila; barra alta de
+    geração = modelo lento ou resposta longa.
+
+    Parâmetros:
+        df (pd.DataFrame): DataFrame com colunas 'timestamp', 'latencia_s',
+            'tempo_contexto_s' e 'ttft_s'
+
+    Returna:
+        go.Figure: Objeto Figure do Plotly
+    """
+    # Só interações com tempos medidos (registros antigos e cache ficam de fora)
+    etapas = df.dropna(subset=['tempo_contexto_s', 'ttft_s']).copy()
+
+    # Geração = o que sobra da latência depois do contexto e do 1º token
+    etapas['geracao_s'] = (
+        etapas['latencia_s'] - etapas['tempo_contexto_s'] - etapas['ttft_s']
+    ).clip(lower=0)
+
+    df_long = etapas.melt(
+        id_vars    = 'timestamp',
+        value_vars = ['tempo_contexto_s', 'ttft_s', 'geracao_s'],
+        var_name   = 'etapa',
+        value_name = 'segundos',
+    )
+    df_long['etapa'] = df_long['etapa'].map({
+        'tempo_contexto_s': '🧱 Contexto',
+        'ttft_s':           '🚀 Até o 1º token',
+        'geracao_s':        '✍️ Geração',
+    })
+
+    fig = px.bar(
+        df_long,
+        x       = 'timestamp',
+        y       = 'segundos',
+        color   = 'etapa',
+        barmode = 'stack',   # empilhadas: a altura total é a latência
+        title   = '⏱️ Latência por Etapa',
+        labels  = {
+            'timestamp': 'Horário',
+            'segundos':  'Segundos',
+            'etapa':     'Etapa',
+        },
+    )
+
+    fig.update_layout(
+        xaxis_title  = 'Horário',
+        yaxis_title  = 'Segundos',
+        hovermode    = 'x unified',
+        legend_title = 'Etapa',
+    )
+
+    return fig
+
+def grafico_latencia_entre_tokens(df: pd.DataFrame) -> go.Figure:
+    """
+    Gráfico de linhas - Intervalo entre tokens (p50 e p95).
+
+    Mede a fluidez do streaming. p50 é o intervalo típico entre
+    chunks; p95 mostra as "engasgadas". p95 muito acima do p50
+    indica geração irregular no provedor.
+
+    Parâmetros:
+        df (pd.DataFrame): DataFrame com colunas 'timestamp', 'itl_p50_ms' e 'itl_p95_ms'
+
+    Returna:
+        go.Figure: Objeto Figure do Plotly
+    """
+    itl = df.dropna(subset=['itl_p50_ms', 'itl_p95_ms'])
+
+    df_long = itl.melt(
+        id_vars    = 'timestamp',
+        value_vars = ['itl_p50_ms', 'itl_p95_ms'],
+        var_name   = 'percentil',
+        value_name = 'ms',
+    )
+    df_long['percentil'] = df_long['percentil'].map({
+        'itl_p50_ms': 'p50 (mediana)',
+        'itl_p95_ms': 'p95',
+    })
+
+    fig = px.line(
+        df_long,
+        x       = 'timestamp',
+        y       = 'ms',
+        color   = 'percentil',
+        markers = True,
+        title   = '⏳ Intervalo entre Tokens (ms)',
+        labels  = {
+            'timestamp': 'Horário',
+            'ms':        'Milissegundos',
+            'percentil': 'Percentil',
+        },
+    )
+
+    fig.update_layout(
+        xaxis_title  = 'Horário',
+        yaxis_title  = 'Milissegundos',
+        hovermode    = 'x unified',
+        legend_title = 'Percentil',
+    )
+
+    return fig
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+
+import httpx
+from groq import Groq
+
+# ============================================================
+# utils/cliente.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Fornecer UM cliente Groq por processo, com pool de conexões.
+#
+# Antes, app.py e pages/comparador.py criavam Groq(api_key=...) no
+# topo do script — o Streamlit reexecuta isso a cada rerun e em cada
+# sessão, e cada cliente novo abre conexões novas (TCP + TLS).
+# Agora todas as sessões e páginas compartilham o mesmo cliente e o
+# mesmo pool httpx, com keep-alive: a conexão TLS aberta na primeira
+# pergunta é reaproveitada nas seguintes.
+#
+# O pool é instrumentado: contamos quantas requisições reaproveitaram
+# uma conexão e quanto tempo de handshake (TCP + TLS) foi evitado.
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não monta prompts nem trata respostas
+# ============================================================
+
+class EstatisticasConexao:
+    """Contadores do pool, alimentados pelos eventos de trace do httpcore.
+
+    Cada requisição sem evento de conexão reaproveitou uma conexão
+    do pool; o tempo economizado é estimado pela média dos handshakes
+    que de fato aconteceram.
+    """
+
+    def __init__(self):
+        self._lock              = threading.Lock()
+        self._local             = threading.local()   # última requisição desta thread
+        self.requisicoes        = 0
+        self.conexoes_novas     = 0
+        self.tempo_handshake_s  = 0.0
+
+    def iniciar_requisicao(self, request: httpx.Request):
+        """Hook de request do httpx: liga o trace desta requisição."""
+        estado = {'nova_conexao': False, 'inicio': None, 'handshake_s': 0.0}
+        self._local.ultima = estado
+
+        def trace(evento, info):
+            agora = time.perf_counter()
+            if evento == 'connection.connect_tcp.started':
+                estado['nova_conexao'] = True
+                estado['inicio'] = agora
+                with self._lock:
+                    self.conexoes_novas += 1
+            elif evento in ('connection.connect_tcp.complete', 'connection.start_tls.complete') \
+                    and estado['inicio'] is not None:
+                # Soma TCP e, se houver, TLS: cada etapa conta do fim da anterior
+                etapa = agora - estado['inicio']
+                estado['inicio'] = agora
+                estado['handshake_s'] += etapa
+                with self._lock:
+                    self.tempo_handshake_s += etapa
+
+        request.extensions['trace'] = trace
+        with self._lock:
+            self.requisicoes += 1
+
+    def ultima(self) -> dict:
+        """Dados da última requisição feita pela thread atual."""
+        estado = getattr(self._local, 'ultima', None)
+        if estado is None:
+            return {'conexao_reutilizada': None, 'handshake_ms': None}
+        return {
+            'conexao_reutilizada': not estado['nova_conexao'],
+            'handshake_ms':        round(estado['handshake_s'] * 1000, 1) if estado['nova_conexao'] else None,
+        }
+
+    def resumo(self) -> dict:
+        """Taxa de reuso e tempo de handshake evitado no processo."""
+        with self._lock:
+            requisicoes = self.requisicoes
+            novas       = self.conexoes_novas
+            handshake   = self.tempo_handshake_s
+
+        reusadas = max(requisicoes - novas, 0)
+        media    = handshake / novas if novas else 0.0
+        return {
+            'requisicoes':           requisicoes,
+            'conexoes_novas':        novas,
+            'taxa_reuso':            reusadas / requisicoes if requisicoes else 0.0,
+            'handshake_medio_ms':    media * 1000,
+            'handshake_evitado_s':   reusadas * media,
+        }
+
+
+estatisticas = EstatisticasConexao()
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def obter_cliente() -> Groq:
+    """Devolve o cliente Groq do processo, criando-o na primeira chamada.
+
+    Configuração (lida na primeira chamada, depois do load_dotenv):
+        GROQ_MAX_CONEXOES  conexões simultâneas no pool (padrão 20)
+        GROQ_MAX_KEEPALIVE conexões ociosas mantidas abertas (padrão 10)
+        GROQ_KEEPALIVE_S   tempo que uma conexão ociosa fica aberta (padrão 120)
+        GROQ_TIMEOUT_S     timeout de leitura (padrão 60)
+        GROQ_AQUECER       '1' abre a primeira conexão em segundo plano
+        GROQ_SIMULADOR     URL do servidor local (python -m utils.simulador);
+                           se definida, nenhuma requisição vai para a API real
+    """
+    global _cliente
+    with _cliente_lock:
+        if _cliente is None:
+            http_client = httpx.Client(
+                limits  = httpx.Limits(
+                    max_connections           = int(os.environ.get('GROQ_MAX_CONEXOES', 20)),
+                    max_keepalive_connections = int(os.environ.get('GROQ_MAX_KEEPALIVE', 10)),
+                    keepalive_expiry          = float(os.environ.get('GROQ_KEEPALIVE_S', 120)),
+                ),
+                timeout     = httpx.Timeout(float(os.environ.get('GROQ_TIMEOUT_S', 60)), connect=10),
+                event_hooks = {'request': [estatisticas.iniciar_requisicao]},
+            )
+            simulador = os.environ.get('GROQ_SIMULADOR')
+            _cliente = Groq(
+                api_key     = 'simulador' if simulador else os.environ.get('GROQ_API'),
+                base_url    = simulador or None,
+                http_client = http_client,
+                # Sem repetição no SDK: 429/5xx voltam direto para o
+                # LimitadorRequisicoes (utils/limites.py), a única camada
+                # de retry — com token bucket, Retry-After e a espera
+                # contada em espera_fila_s e tentativas
+                max_retries = 0,
+            )
+            if os.environ.get('GROQ_AQUECER', '1') == '1':
+                aquecer(_cliente)
+        return _cliente
+
+
+def aquecer(cliente: Groq):
+    """Abre a primeira conexão (DNS + TCP + TLS) em segundo plano.
+
+    Uma chamada barata (lista de modelos) deixa a conexão no pool,
+    pronta para a primeira pergunta do usuário.
+    """
+    def _aquecer():
+        try:
+            cliente.models.list()
+        except Exception:
+            pass  # aquecimento é só otimização — falhar aqui não importa
+
+    threading.Thread(target=_aquecer, daemon=True).start()
@@ -0,0 +1,127 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from utils.dados import CarregadorDados
+
+# ============================================================
+# utils/clientes.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Encontrar os dados de UM cliente entre muitos, sem carregar os outros.
+#
+# Antes: data/perfil_investidor.json tinha um único cliente, lido
+# inteiro no início do app. Agora cada cliente tem sua pasta:
+#
+#     data/clientes/<cliente_id>/perfil_investidor.json
+#     data/clientes/<cliente_id>/transacoes.csv
+#     data/clientes/<cliente_id>/historico_atendimento.csv
+#
+# - busca pelo id: o caminho vem direto do id — nenhum índice para
+#   montar ou varrer, então a partida não depende de quantos clientes há
+# - carga preguiçosa: os arquivos de um cliente só são lidos quando
+#   ele é pedido (e depois atualizados incrementalmente, utils/dados.py)
+# - memória limitada: só os `max_clientes` usados mais recentemente
+#   ficam em memória (LRU); os demais são descartados
+#
+# O catálogo de produtos é o mesmo para todos (data/produtos_financeiros.json).
+# Os arquivos soltos em data/ continuam valendo como o cliente padrão.
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não cria nem altera clientes
+# ============================================================
+
+PASTA_CLIENTES   = 'data/clientes'
+CLIENTE_PADRAO   = 'padrao'
+
+ARQUIVO_PERFIL     = 'perfil_investidor.json'
+ARQUIVO_TRANSACOES = 'transacoes.csv'
+ARQUIVO_HISTORICO  = 'historico_atendimento.csv'
+
+# Ids viram nomes de pasta: só letras, números, '_' e '-'
+_ID_VALIDO = re.compile(r'^[\w-]{1,64}$')
+
+
+class ArmazemClientes:
+    """Dados por cliente, carregados sob demanda e com memória limitada.
+
+    Parâmetros:
+        arquivo_produtos (str): catálogo compartilhado por todos
+        pasta (str): pasta com uma subpasta por cliente
+        padrao (tuple): (historico, transacoes, perfil) do cliente padrão
+        max_clientes (int): clientes mantidos em memória ao mesmo tempo
+    """
+
+    def __init__(self, arquivo_produtos: str, pasta: str = PASTA_CLIENTES,
+                 padrao: tuple = None, max_clientes: int = 256):
+        self.arquivo_produtos = arquivo_produtos
+        self.pasta            = pasta
+        self.padrao           = padrao
+        self.max_clientes     = max_clientes
+
+        self._carregadores = OrderedDict()   # cliente_id -> CarregadorDados
+        self._lock         = threading.Lock()
+        self.acertos       = 0
+        self.cargas        = 0
+        self.descartes     = 0
+
+    def caminhos(self, cliente_id: str) -> tuple:
+        """(historico, transacoes, perfil) do cliente; KeyError se não existir."""
+        if cliente_id == CLIENTE_PADRAO and self.padrao is not None:
+            return self.padrao
+        if not _ID_VALIDO.match(cliente_id or ''):
+            raise KeyError(cliente_id)
+
+        pasta = os.path.join(self.pasta, cliente_id)
+        arquivos = (
+            os.path.join(pasta, ARQUIVO_HISTORICO),
+            os.path.join(pasta, ARQUIVO_TRANSACOES),
+            os.path.join(pasta, ARQUIVO_PERFIL),
+        )
+        if not all(os.path.isfile(a) for a in arquivos):
+            raise KeyError(cliente_id)
+        return arquivos
+
+    def existe(self, cliente_id: str) -> bool:
+        try:
+            self.caminhos(cliente_id)
+            return True
+        except KeyError:
+            return False
+
+    def obter(self, cliente_id: str) -> CarregadorDados:
+        """Carregador dos dados do cliente (criado na primeira vez).
+
+        Raises:
+            KeyError: se o cliente não existir
+        """
+        with self._lock:
+            carregador = self._carregadores.get(cliente_id)
+            if carregador is not None:
+                self._carregadores.move_to_end(cliente_id)
+                self.acertos += 1
+                return carregador
+
+        historico, transacoes, perfil = self.caminhos(cliente_id)
+        carregador = CarregadorDados(historico, transacoes, perfil, self.arquivo_produtos)
+
+        with self._lock:
+            # Outra sessão pode ter criado o mesmo cliente enquanto isso
+            carregador = self._carregadores.setdefault(cliente_id, carregador)
+            self._carregadores.move_to_end(cliente_id)
+            self.cargas += 1
+            while len(self._carregadores) > self.max_clientes:
+                self._carregadores.popitem(last=False)
+                self.descartes += 1
+        return carregador
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                'em_memoria': len(self._carregadores),
+                'acertos':    self.acertos,
+                'cargas':     self.cargas,
+                'descartes':  self.descartes,
+            }
@@ -0,0 +1,377 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import pandas as pd
+
+from utils.agregados import AgregadosTransacoes
+from utils.tokens import contar_tokens
+
+# ============================================================
+# utils/contexto.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Montar o CONTEXTO enviado ao modelo a partir dos dados do cliente.
+#
+# Em vez de despejar todas as transações, atendimentos e produtos
+# em toda mensagem, indexamos cada linha por palavras-chave e
+# selecionamos apenas os trechos relevantes para a pergunta atual,
+# respeitando um orçamento de tokens configurável.
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não lê arquivos do disco
+# - Não chama o modelo
+# ============================================================
+
+# Cada palavra é reduzida aos primeiros caracteres ("radical" simples).
+# Assim "gastos", "gastei" e "gasto" caem no mesmo termo do índice.
+TAMANHO_RADICAL = 5
+
+# Palavras muito comuns que não ajudam a escolher trechos do contexto
+STOPWORDS = {
+    'para', 'como', 'qual', 'quais', 'quanto', 'quanta', 'quantos', 'quantas',
+    'minha', 'minhas', 'meus', 'voce', 'esse', 'essa', 'isso', 'este', 'esta',
+    'com', 'sem', 'que', 'uma', 'umas', 'uns', 'dos', 'das', 'nos', 'nas',
+    'pelo', 'pela', 'mais', 'menos', 'sobre', 'tenho', 'posso', 'pode',
+    'seria', 'sim', 'nao', 'por', 'favor', 'ola', 'oi', 'mim',
+}
+
+# Palavras que indicam que a pergunta é sobre uma seção inteira.
+# Se aparecerem, todas as linhas da seção viram candidatas.
+GATILHOS_SECAO = {
+    'transacoes': [
+        'gasto', 'gastei', 'gastar', 'despesa', 'transacao', 'transacoes',
+        'compra', 'pagamento', 'paguei', 'categoria', 'saida', 'entrada',
+        'receita', 'salario', 'extrato', 'orcamento', 'economizar', 'conta',
+        'mes', 'mensal', 'dinheiro',
+    ],
+    'historico': [
+        'atendimento', 'atendimentos', 'contato', 'chamado', 'suporte',
+        'reclamacao', 'historico', 'conversa', 'anterior', 'perguntei',
+    ],
+    'produtos': [
+        'investimento', 'investir', 'invisto', 'produto', 'aplicar',
+        'aplicacao', 'rendimento', 'rentabilidade', 'render', 'rende',
+        'cdb', 'tesouro', 'selic', 'fundo', 'lci', 'lca', 'fii', 'risco',
+        'renda', 'recomenda', 'indica', 'sugere', 'perfil', 'reserva', 'meta',
+    ],
+}
+
+# Peso extra para linhas de uma seção "acionada" pela pergunta.
+# É menor que 1 para que um termo casado na própria linha valha mais.
+PESO_SECAO = 0.5
+
+
+def normalizar_termos(texto: str) -> set:
+    """Converte um texto no conjunto de termos usados pelo índice.
+
+    Remove acentos, passa para minúsculas, descarta stopwords e
+    palavras curtas, e corta cada palavra em TAMANHO_RADICAL letras.
+
+    Parâmetros:
+        texto (str): texto livre (pergunta ou linha de dados)
+
+    Retorna:
+        set: termos normalizados
+    """
+    sem_acento = unicodedata.normalize('NFKD', str(texto))
+    sem_acento = sem_acento.encode('ascii', 'ignore').decode('ascii').lower()
+
+    termos = set()
+    for palavra in re.findall(r'[a-z0-9]+', sem_acento):
+        if len(palavra) < 3 or palavra in STOPWORDS:
+            continue
+        termos.add(palavra[:TAMANHO_RADICAL])
+    return termos
+
+
+def montar_cabecalho(perfil: dict) -> str:
+    """Bloco fixo com os dados principais do cliente (sempre enviado)."""
+    return (
+        f"CLIENTE: {perfil['nome']}, {perfil['idade']} anos, perfil {perfil['perfil_investidor']}\n"
+        f"OBJETIVO: {perfil['objetivo_principal']}\n"
+        f"PATRIMÔNIO R$: {perfil['patrimonio_total']} | RESERVA: R$ {perfil['reserva_emergencia_atual']}\n"
+    )
+
+
+def montar_contexto_completo(perfil: dict, transacoes: pd.DataFrame,
+                             historico: pd.DataFrame, produtos: list) -> str:
+    """Contexto completo — todos os dados do cliente, sem seleção.
+
+    É o formato original do app.py e serve de referência para
+    calcular quantos tokens a seleção economizou.
+    """
+    return f"""
+{montar_cabecalho(perfil)}
+TRANSAÇÕES RECENTES:
+{transacoes.to_string(index=False)}
+
+ATENDIMENTOS ANTERIORES:
+{historico.to_string(index=False)}
+
+PRODUTOS DISPONÍVEIS:
+{json.dumps(produtos, indent=2, ensure_ascii=False)}
+"""
+
+
+class IndiceContexto:
+    """Índice invertido sobre transações, atendimentos e produtos.
+
+    Construído uma vez por versão dos dados. A cada pergunta,
+    `montar()` pontua as linhas pelos termos em comum com a pergunta
+    e monta um contexto que cabe no orçamento de tokens.
+
+    Com resumo_fluxo=True as transações vão para o prompt como resumo
+    de fluxo de caixa (utils/agregados.py) em vez de linhas: uma linha
+    só entra se a pergunta citar algo dela (ex: "uber"), nunca por
+    gatilho de seção, e só as `max_linhas` mais recentes são indexadas.
+
+    `projecao` é o bloco de metas já calculado (utils/projecao.py); vai
+    no cabeçalho, para o modelo ler as probabilidades em vez de fazer conta.
+
+    `elegiveis` são os índices do catálogo que o cliente pode receber
+    (utils/elegibilidade.py): só eles são indexados e enviados. O
+    contexto completo de referência é o formato original — catálogo
+    inteiro, todas as transações, sem estimativas — para a economia
+    medida incluir o corte de linhas e o filtro de elegibilidade.
+
+    `rentabilidade` (um texto por produto do catálogo, utils/rentabilidade.py)
+    vira o campo 'rentabilidade_estimada' de cada produto: a estimativa
+    disputa o orçamento junto com o produto, em vez de ocupar o cabeçalho.
+    """
+
+    def __init__(self, perfil: dict, transacoes: pd.DataFrame,
+                 historico: pd.DataFrame, produtos: list,
+                 agregados: AgregadosTransacoes = None,
+                 resumo_fluxo: bool = False, max_linhas: int = None,
+                 projecao: str = '', elegiveis: tuple = None, rentabilidade: list = None):
+        self.perfil       = perfil
+        self.resumo_fluxo = resumo_fluxo
+        # Referência da economia: os dados como vieram, antes de qualquer corte
+        self.contexto_completo = montar_contexto_completo(perfil, transacoes, historico, produtos)
+        self.tokens_completo   = contar_tokens(self.contexto_completo)
+        # Agregados sempre sobre o histórico inteiro; as linhas, só as recentes
+        self.agregados = agregados if agregados is not None else AgregadosTransacoes(transacoes)
+        if max_linhas is not None:
+            transacoes = transacoes.tail(max_linhas)
+        self.transacoes = transacoes.reset_index(drop=True)
+        self.historico  = historico.reset_index(drop=True)
+        if rentabilidade is not None:
+            produtos = [{**p, 'rentabilidade_estimada': r} for p, r in zip(produtos, rentabilidade)]
+        self.produtos   = produtos if elegiveis is None else [produtos[i] for i in elegiveis]
+
+        # Totais (ou o fluxo de caixa) entram junto com o cabeçalho: o
+        # modelo sabe os números mesmo quando as linhas ficam de fora
+        resumo = self.agregados.texto_fluxo() if resumo_fluxo else self.agregados.texto()
+        self.cabecalho = montar_cabecalho(perfil) + resumo + projecao
+        self.tokens_cabecalho = contar_tokens(self.cabecalho)
+
+        # Layout por prefixo: catálogo e perfil vão inteiros, em mensagens
+        # próprias, antes do que muda a cada pergunta (ver blocos_estaveis)
+        self.catalogo = f'PRODUTOS DISPONÍVEIS:\n{json.dumps(self.produtos, indent=2, ensure_ascii=False)}\n'
+        self.tokens_estaveis = contar_tokens(self.catalogo) + self.tokens_cabecalho
+        # Sem seleção (orçamento <= 0): tudo o que o índice tem, com o
+        # cabeçalho. Renderizado uma vez por versão dos dados
+        # (to_string/json.dumps são caros)
+        todos = {'transacoes': range(len(self.transacoes)), 'historico': range(len(self.historico)),
+                 'produtos': range(len(self.produtos))}
+        self.contexto_todo    = self._renderizar(todos)
+        self.volatil_completo = self._renderizar({**todos, 'produtos': []}, cabecalho=False)
+
+        # blocos[i] = (secao, posicao_na_secao, tokens_estimados)
+        self.blocos = []
+        # indice[termo] = lista de ids de blocos que contêm o termo
+        self.indice = {}
+        # por_secao[secao] = ids dos blocos da seção (para os gatilhos)
+        self.por_secao = {'transacoes': [], 'historico': [], 'produtos': []}
+
+        self._indexar_tabela('transacoes', self.transacoes)
+        self._indexar_tabela('historico',  self.historico)
+        for pos, produto in enumerate(self.produtos):
+            texto = json.dumps(produto, indent=2, ensure_ascii=False)
+            self._adicionar_bloco('produtos', pos, texto, ' '.join(map(str, produto.values())))
+
+        self.gatilhos = {
+            secao: set().union(*(normalizar_termos(p) for p in palavras))
+            for secao, palavras in GATILHOS_SECAO.items()
+        }
+
+    def _indexar_tabela(self, secao: str, df: pd.DataFrame):
+        # Cada linha vira um bloco; o texto indexado junta todas as colunas
+        linhas = df.astype(str).agg(' '.join, axis=1)
+        for pos, texto in enumerate(linhas):
+            self._adicionar_bloco(secao, pos, texto, texto)
+
+    def _adicionar_bloco(self, secao: str, pos: int, texto_render: str, texto_indice: str):
+        bloco_id = len(self.blocos)
+        self.blocos.append((secao, pos, contar_tokens(texto_render) + 1))
+        self.por_secao[secao].append(bloco_id)
+        for termo in normalizar_termos(texto_indice):
+            self.indice.setdefault(termo, []).append(bloco_id)
+
+    def blocos_estaveis(self) -> list:
+        """[catálogo, perfil] — a parte do contexto que não depende da pergunta.
+
+        Usado no layout por prefixo: enviados logo depois do system
+        prompt, formam um prefixo idêntico entre perguntas (e, o
+        catálogo, entre clientes com os mesmos produtos elegíveis), que
+        o provedor pode reaproveitar do cache de prompt.
+        """
+        return [self.catalogo, self.cabecalho]
+
+    def montar(self, pergunta: str, orcamento_tokens: int, prefixo: bool = False) -> tuple:
+        """Monta o contexto relevante para a pergunta.
+
+        Parâmetros:
+            pergunta (str): pergunta atual do usuário
+            orcamento_tokens (int): máximo de tokens dos trechos
+                selecionados. O cabeçalho (perfil, fluxo, metas — tamanho
+                fixo) vai sempre e não conta: senão ele crescia e tirava
+                os produtos do contexto. Valor <= 0 desliga a seleção e
+                envia o cabeçalho com todas as linhas indexadas e todos
+                os produtos elegíveis.
+            prefixo (bool): layout por prefixo — devolve só a parte
+                variável (transações e atendimentos); catálogo e perfil
+                vêm de blocos_estaveis() e não contam no orçamento
+
+        Retorna:
+            tuple: (contexto, relatorio) — relatorio é um dict com
+                'tokens_contexto', 'tokens_contexto_completo',
+                'tokens_economizados' e 'blocos_selecionados'
+        """
+        if orcamento_tokens <= 0:
+            if prefixo:
+                contexto = self.volatil_completo
+                return contexto, self._relatorio(contexto, len(self.blocos), self.tokens_estaveis)
+            contexto = self.contexto_todo
+            return contexto, self._relatorio(contexto, len(self.blocos))
+
+        termos = normalizar_termos(pergunta)
+        secoes = ('transacoes', 'historico') if prefixo else tuple(self.por_secao)
+
+        # Pontuação: +1 por termo da pergunta presente na linha
+        pontos = {}
+        for termo in termos:
+            for bloco_id in self.indice.get(termo, []):
+                pontos[bloco_id] = pontos.get(bloco_id, 0) + 1
+
+        # Seções acionadas: todas as linhas viram candidatas
+        for secao, gatilhos in self.gatilhos.items():
+            if secao == 'transacoes' and self.resumo_fluxo:
+                continue  # o resumo de fluxo já responde perguntas gerais de gastos
+            if secao in secoes and termos & gatilhos:
+                for bloco_id in self.por_secao[secao]:
+                    pontos[bloco_id] = pontos.get(bloco_id, 0) + PESO_SECAO
+
+        # Maior pontuação primeiro; no empate, as linhas mais recentes
+        candidatos = sorted(pontos, key=lambda b: (-pontos[b], -self.blocos[b][1]))
+
+        usados = 0
+        selecionados = {'transacoes': [], 'historico': [], 'produtos': []}
+        for bloco_id in candidatos:
+            secao, pos, tokens = self.blocos[bloco_id]
+            if secao not in secoes or usados + tokens > orcamento_tokens:
+                continue
+            usados += tokens
+            selecionados[secao].append(pos)
+
+        contexto = self._renderizar(selecionados, cabecalho=not prefixo)
+        total = sum(len(v) for v in selecionados.values())
+        if prefixo:
+            # O catálogo inteiro vai nos blocos estáveis
+            total += len(self.produtos)
+            return contexto, self._relatorio(contexto, total, self.tokens_estaveis)
+        return contexto, self._relatorio(contexto, total)
+
+    def _renderizar(self, selecionados: dict, cabecalho: bool = True) -> str:
+        # Mantém a ordem original das linhas dentro de cada seção
+        partes = ['', self.cabecalho] if cabecalho else ['']
+        if selecionados['transacoes']:
+            linhas = self.transacoes.iloc[sorted(selecionados['transacoes'])]
+            partes.append(f'TRANSAÇÕES RECENTES:\n{linhas.to_string(index=False)}\n')
+        if selecionados['historico']:
+            linhas = self.historico.iloc[sorted(selecionados['historico'])]
+            partes.append(f'ATENDIMENTOS ANTERIORES:\n{linhas.to_string(index=False)}\n')
+        if selecionados['produtos']:
+            itens = [self.produtos[i] for i in sorted(selecionados['produtos'])]
+            partes.append(f'PRODUTOS DISPONÍVEIS:\n{json.dumps(itens, indent=2, ensure_ascii=False)}\n')
+        return '\n'.join(partes)
+
+    def _relatorio(self, contexto: str, blocos: int, tokens_extras: int = 0) -> dict:
+        tokens = contar_tokens(contexto) + tokens_extras
+        return {
+            'tokens_contexto':          tokens,
+            'tokens_contexto_completo': self.tokens_completo,
+            'tokens_economizados':      max(self.tokens_completo - tokens, 0),
+            'blocos_selecionados':      blocos,
+        }
+
+
+def assinatura_arquivos(arquivos: list) -> tuple:
+    """Versão dos arquivos de dados: (caminho, mtime, tamanho) de cada um.
+
+    Só faz os.stat — não lê o conteúdo. Qualquer edição no arquivo
+    muda o mtime (e quase sempre o tamanho), e com isso a assinatura.
+    Arquivo ausente entra como (caminho, None, None).
+    """
+    versao = []
+    for caminho in arquivos:
+        try:
+            info = os.stat(caminho)
+            versao.append((caminho, info.st_mtime_ns, info.st_size))
+        except OSError:
+            versao.append((caminho, None, None))
+    return tuple(versao)
+
+
+class CacheContexto:
+    """Guarda o IndiceContexto de cada cliente até os dados mudarem.
+
+    A cada rerun (inclusive cliques em 👍/👎) o app pede o índice;
+    ele só é reconstruído quando a assinatura dos arquivos de dados
+    muda. Mantém no máximo `max_clientes` índices (LRU).
+
+    Parâmetros:
+        max_clientes (int): quantos clientes manter em memória
+    """
+
+    def __init__(self, max_clientes: int = 128):
+        self.max_clientes = max_clientes
+        self._itens = OrderedDict()   # cliente_id -> (assinatura, indice)
+        self._lock  = threading.Lock()
+        self.acertos = 0
+        self.falhas  = 0
+
+    def obter(self, cliente_id, assinatura: tuple, construir) -> IndiceContexto:
+        """Devolve o índice do cliente, reconstruindo se a versão mudou.
+
+        Parâmetros:
+            cliente_id: identificador do cliente
+            assinatura (tuple): versão dos dados (assinatura_arquivos)
+            construir (callable): função sem argumentos que cria o índice
+        """
+        with self._lock:
+            item = self._itens.get(cliente_id)
+            if item is not None and item[0] == assinatura:
+                self._itens.move_to_end(cliente_id)
+                self.acertos += 1
+                return item[1]
+            self.falhas += 1
+
+        # Constrói fora da trava — outras sessões não ficam esperando
+        indice = construir()
+
+        with self._lock:
+            self._itens[cliente_id] = (assinatura, indice)
+            self._itens.move_to_end(cliente_id)
+            while len(self._itens) > self.max_clientes:
+                self._itens.popitem(last=False)
+        return indice
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {'acertos': self.acertos, 'falhas': self.falhas, 'clientes': len(self._itens)}
@@ -0,0 +1,197 @@
+import io
+import json
+import os
+import threading
+
+import pandas as pd
+
+from utils.agregados import AgregadosTransacoes
+
+# ============================================================
+# utils/dados.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Carregar os arquivos de data/ e mantê-los atualizados SEM reler
+# tudo a cada mudança.
+#
+# Antes: pd.read_csv do arquivo inteiro, guardado por @st.cache_data
+# até o processo reiniciar — linhas novas em transacoes.csv não
+# apareciam, e quando recarregava, relia o arquivo todo.
+# Agora: cada CSV guarda o byte até onde já foi lido. Se o arquivo
+# cresceu, só os bytes novos são parseados e concatenados ao
+# DataFrame em memória. Se foi truncado, substituído (outro inode)
+# ou reescrito (o trecho já lido mudou), relê o arquivo inteiro.
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não escreve nos arquivos
+# ============================================================
+
+# Bytes do fim do trecho já lido usados para detectar reescrita
+TAMANHO_ASSINATURA = 256
+
+
+class LeitorCSVIncremental:
+    """Lê um CSV que só recebe linhas no final (append-only).
+
+    Parâmetros:
+        caminho (str): arquivo CSV com cabeçalho na primeira linha
+    """
+
+    def __init__(self, caminho: str, encoding: str = 'utf-8'):
+        self.caminho  = caminho
+        self.encoding = encoding
+        self._lock    = threading.Lock()
+
+        self.df          = None
+        self._offset     = 0       # bytes já consumidos (sempre num fim de linha)
+        self._inode      = None
+        self._mtime_ns   = None
+        self._cabecalho  = b''     # primeira linha, para conferir reescrita
+        self._cauda      = b''     # últimos bytes antes de _offset
+
+        self.recargas_completas = 0
+        self.leituras_parciais  = 0
+        self.bytes_lidos        = 0
+
+    def ler(self) -> pd.DataFrame:
+        """Devolve o DataFrame atualizado com o que houver de novo no arquivo."""
+        with self._lock:
+            info = os.stat(self.caminho)
+            if self.df is None or not self._continua_valido(info):
+                self._recarregar(info)
+            elif info.st_size > self._offset:
+                self._ler_novos(info)
+            elif info.st_mtime_ns != self._mtime_ns:
+                # Mesmo tamanho, mas modificado: o conteúdo mudou no meio
+                self._recarregar(info)
+            return self.df
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                'linhas':             0 if self.df is None else len(self.df),
+                'recargas_completas': self.recargas_completas,
+                'leituras_parciais':  self.leituras_parciais,
+                'bytes_lidos':        self.bytes_lidos,
+            }
+
+    def _continua_valido(self, info) -> bool:
+        """False se o arquivo foi truncado, trocado ou reescrito."""
+        if info.st_ino != self._inode or info.st_size < self._offset:
+            return False
+        if info.st_mtime_ns == self._mtime_ns:
+            return True
+        # Confere o cabeçalho e o fim do trecho já lido: se mudaram,
+        # o arquivo não foi só acrescido
+        with open(self.caminho, 'rb') as f:
+            cabecalho = f.read(len(self._cabecalho))
+            f.seek(self._offset - len(self._cauda))
+            cauda = f.read(len(self._cauda))
+        return cabecalho == self._cabecalho and cauda == self._cauda
+
+    def _recarregar(self, info):
+        with open(self.caminho, 'rb') as f:
+            dados = f.read()
+        # Na leitura completa a última linha entra mesmo sem '\n' final
+        # (CSV válido); um acréscimo posterior começa com a quebra de
+        # linha e a linha em branco é ignorada pelo read_csv
+        self.df = pd.read_csv(io.BytesIO(dados), encoding=self.encoding)
+
+        fim_cabecalho   = dados.find(b'\n') + 1
+        self._cabecalho = dados[:fim_cabecalho] if fim_cabecalho else dados
+        self._offset    = len(dados)
+        self._cauda     = dados[-TAMANHO_ASSINATURA:]
+        self._inode     = info.st_ino
+        self._mtime_ns  = info.st_mtime_ns
+        self.recargas_completas += 1
+        self.bytes_lidos        += len(dados)
+
+    def _ler_novos(self, info):
+        with open(self.caminho, 'rb') as f:
+            f.seek(self._offset)
+            dados = f.read(info.st_size - self._offset)
+        self.bytes_lidos += len(dados)
+
+        # Uma linha ainda sendo escrita (sem '\n') fica para a próxima leitura
+        consumidos = dados[:dados.rfind(b'\n') + 1]
+        if consumidos:
+            novos = pd.read_csv(
+                io.BytesIO(consumidos),
+                header   = None,
+                names    = list(self.df.columns),
+                encoding = self.encoding,
+            )
+            if len(novos):
+                self.df = pd.concat([self.df, novos], ignore_index=True)
+            self.leituras_parciais += 1
+
+        self._offset += len(consumidos)
+        self._cauda   = (self._cauda + consumidos)[-TAMANHO_ASSINATURA:]
+        # Com linha incompleta no fim, o mtime não é guardado: na próxima
+        # leitura a cauda é reconferida em vez de confiar no mtime
+        self._mtime_ns = info.st_mtime_ns if self._offset == info.st_size else None
+
+
+class CarregadorDados:
+    """Os quatro arquivos de data/, atualizados a cada chamada de carregar().
+
+    CSVs são lidos incrementalmente; os JSONs (pequenos) são relidos
+    só quando o mtime ou o tamanho mudam.
+
+    Parâmetros:
+        arquivo_historico, arquivo_transacoes, arquivo_perfil, arquivo_produtos (str)
+    """
+
+    def __init__(self, arquivo_historico: str, arquivo_transacoes: str,
+                 arquivo_perfil: str, arquivo_produtos: str):
+        self.historico  = LeitorCSVIncremental(arquivo_historico)
+        self.transacoes = LeitorCSVIncremental(arquivo_transacoes)
+        self._jsons     = {arquivo_perfil: None, arquivo_produtos: None}   # caminho -> (versão, dados)
+        self.arquivo_perfil   = arquivo_perfil
+        self.arquivo_produtos = arquivo_produtos
+        self._lock = threading.Lock()
+        self._agregados = (None, None)   # (DataFrame de origem, agregados)
+
+    def carregar(self) -> tuple:
+        """Retorna (historico, transacoes, perfil, produtos).
+
+        Os DataFrames são compartilhados entre sessões — não modifique.
+        """
+        historico  = self.historico.ler()
+        transacoes = self.transacoes.ler()
+        perfil     = self._ler_json(self.arquivo_perfil)
+        produtos   = self._ler_json(self.arquivo_produtos)
+        return historico, transacoes, perfil, produtos
+
+    def agregados(self) -> AgregadosTransacoes:
+        """Agregados das transações, recalculados só quando o DataFrame muda.
+
+        O leitor devolve o MESMO objeto enquanto o arquivo não muda e um
+        novo a cada acréscimo ou releitura — a identidade é a versão.
+        """
+        transacoes = self.transacoes.ler()
+        with self._lock:
+            origem, agregados = self._agregados
+            if origem is not transacoes:
+                agregados = AgregadosTransacoes(transacoes)
+                self._agregados = (transacoes, agregados)
+            return agregados
+
+    def estatisticas(self) -> dict:
+        return {
+            'historico':  self.historico.estatisticas(),
+            'transacoes': self.transacoes.estatisticas(),
+        }
+
+    def _ler_json(self, caminho: str):
+        info   = os.stat(caminho)
+        versao = (info.st_mtime_ns, info.st_size)
+        with self._lock:
+            item = self._jsons.get(caminho)
+            if item is None or item[0] != versao:
+                with open(caminho, 'r', encoding='utf-8') as f:
+                    item = (versao, json.load(f))
+                self._jsons[caminho] = item
+            return item[1]
+
@@ -0,0 +1,171 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# ============================================================
+# utils/elegibilidade.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Dizer quais produtos do catálogo o cliente pode receber no contexto.
+#
+# Antes: o catálogo inteiro ia para o modelo em toda pergunta —
+# inclusive produtos que o cliente não pode contratar, como o "Fundo
+# de Ações" (risco alto) para quem tem aceita_risco = false, ou um
+# produto com aporte mínimo acima do que o cliente tem. Além de
+# gastar tokens, isso convida o modelo a recomendar o que não deve.
+#
+# O catálogo é "compilado" uma vez por versão:
+# - risco vira nível inteiro (baixo < medio < alto)
+# - para cada teto de risco, os produtos permitidos ficam ordenados
+#   por aporte mínimo — o corte por capital é uma busca binária
+# - cada categoria vira uma máscara booleana
+# Uma consulta (perfil, aceita_risco, capital, categorias) custa
+# O(log n) + a cópia dos índices, e o resultado fica num LRU
+# indexado pela FAIXA de capital (não pelo valor exato): clientes
+# com o mesmo perfil e capitais entre os mesmos aportes mínimos
+# reaproveitam a mesma resposta. Benchmark:
+#     python -m utils.elegibilidade [produtos]
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não lê arquivos do disco
+# - Não ordena por "melhor produto" — só filtra
+# ============================================================
+
+NIVEIS_RISCO = {'baixo': 0, 'medio': 1, 'alto': 2}
+
+# Maior risco aceito por perfil de investidor
+TETO_RISCO_PERFIL = {
+    'conservador': NIVEIS_RISCO['baixo'],
+    'moderado':    NIVEIS_RISCO['medio'],
+    'arrojado':    NIVEIS_RISCO['alto'],
+}
+
+# Teto quando o cliente declara aceita_risco = false
+TETO_SEM_RISCO = NIVEIS_RISCO['medio']
+
+
+def teto_risco(perfil: dict) -> int:
+    """Nível de risco máximo do cliente (perfil e aceita_risco)."""
+    teto = TETO_RISCO_PERFIL.get(perfil.get('perfil_investidor'), NIVEIS_RISCO['medio'])
+    if not perfil.get('aceita_risco', True):
+        teto = min(teto, TETO_SEM_RISCO)
+    return teto
+
+
+def capital_disponivel(perfil: dict, aporte_mensal: float = 0.0) -> float:
+    """Quanto o cliente pode aplicar: patrimônio + aporte mensal possível."""
+    return float(perfil.get('patrimonio_total') or 0) + max(float(aporte_mensal or 0), 0.0)
+
+
+class IndiceElegibilidade:
+    """Catálogo de produtos compilado para filtrar por perfil e capital.
+
+    Parâmetros:
+        produtos (list): catálogo (dicts com risco, aporte_minimo, categoria)
+        max_consultas (int): respostas guardadas no LRU
+    """
+
+    def __init__(self, produtos: list, max_consultas: int = 1024):
+        self.produtos = produtos
+        n = len(produtos)
+        # Risco desconhecido conta como o mais alto: só entra para quem aceita tudo
+        self.niveis  = np.fromiter((NIVEIS_RISCO.get(p.get('risco'), max(NIVEIS_RISCO.values()))
+                                    for p in produtos), dtype=np.int8, count=n)
+        self.aportes = np.fromiter((float(p.get('aporte_minimo') or 0) for p in produtos),
+                                   dtype=np.float64, count=n)
+
+        # Por teto: índices permitidos, ordenados por aporte mínimo
+        self._por_teto = {}
+        for teto in sorted(set(NIVEIS_RISCO.values())):
+            idx = np.flatnonzero(self.niveis <= teto)
+            ordem = idx[np.argsort(self.aportes[idx], kind='stable')]
+            self._por_teto[teto] = (ordem, self.aportes[ordem])
+
+        self.categorias = {}
+        for i, p in enumerate(produtos):
+            self.categorias.setdefault(p.get('categoria'), np.zeros(n, dtype=bool))[i] = True
+
+        self.max_consultas = max_consultas
+        self._consultas = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas  = 0
+
+    def elegiveis(self, perfil: dict, capital: float = None, categorias=None) -> tuple:
+        """Índices (na ordem do catálogo) dos produtos elegíveis.
+
+        Parâmetros:
+            perfil (dict): perfil do investidor (perfil_investidor, aceita_risco)
+            capital (float): capital disponível; None ignora o aporte mínimo
+            categorias (iterable): restringe a essas categorias; None = todas
+
+        Retorna:
+            tuple: índices em `produtos`
+        """
+        teto = teto_risco(perfil)
+        ordem, aportes = self._por_teto[teto]
+        # Faixa de capital = quantos aportes mínimos cabem nele
+        faixa = len(ordem) if capital is None else int(np.searchsorted(aportes, capital, side='right'))
+        chave = (teto, faixa, None if categorias is None else frozenset(categorias))
+
+        with self._lock:
+            if chave in self._consultas:
+                self._consultas.move_to_end(chave)
+                self.acertos += 1
+                return self._consultas[chave]
+            self.falhas += 1
+
+        idx = ordem[:faixa]
+        if categorias is not None:
+            mascara = np.zeros(len(self.produtos), dtype=bool)
+            for c in chave[2]:
+                if c in self.categorias:
+                    mascara |= self.categorias[c]
+            idx = idx[mascara[idx]]
+        resultado = tuple(int(i) for i in np.sort(idx))
+
+        with self._lock:
+            self._consultas[chave] = resultado
+            while len(self._consultas) > self.max_consultas:
+                self._consultas.popitem(last=False)
+        return resultado
+
+    def filtrar(self, perfil: dict, capital: float = None, categorias=None) -> list:
+        """Os produtos elegíveis (dicts), na ordem do catálogo."""
+        return [self.produtos[i] for i in self.elegiveis(perfil, capital, categorias)]
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {'produtos': len(self.produtos), 'consultas_em_cache': len(self._consultas),
+                    'acertos': self.acertos, 'falhas': self.falhas}
+
+
+if __name__ == '__main__':
+    # Compila um catálogo sintético e mede compilação e consultas
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = np.random.default_rng(0)
+    riscos = np.array(list(NIVEIS_RISCO))
+    catalogo = [{
+        'nome': f'Produto {i}',
+        'categoria': ('renda_fixa', 'fundo', 'acoes')[i % 3],
+        'risco': str(riscos[rng.integers(0, 3)]),
+        'aporte_minimo': float(rng.choice([30, 100, 500, 1000, 5000, 25000])),
+    } for i in range(n)]
+
+    inicio = time.perf_counter()
+    indice = IndiceElegibilidade(catalogo)
+    compilado = time.perf_counter() - inicio
+
+    perfis = [{'perfil_investidor': p, 'aceita_risco': bool(a)}
+              for p in TETO_RISCO_PERFIL for a in (0, 1)]
+    consultas = 10_000
+    inicio = time.perf_counter()
+    for c in range(consultas):
+        indice.elegiveis(perfis[c % len(perfis)], capital=float(rng.uniform(0, 50_000)))
+    decorrido = time.perf_counter() - inicio
+    print(f'{n:,} produtos compilados em {compilado * 1000:.1f} ms; '
+          f'{consultas:,} consultas em {decorrido * 1000:.1f} ms ({indice.estatisticas()})')
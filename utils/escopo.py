@@ -0,0 +1,111 @@
+from collections import deque
+
+# ============================================================
+# utils/escopo.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Detectar frases de recusa ("fora do escopo") na resposta do modelo.
+#
+# Antes: any(frase in resposta for frase in FRASES) depois do fim do
+# stream — uma busca por frase, sobre a resposta inteira.
+# Agora: um autômato Aho-Corasick compilado UMA vez com todas as
+# frases. Ele lê cada chunk assim que chega, guardando o estado entre
+# chunks — uma frase partida entre dois chunks ("só po" + "sso")
+# também é encontrada. A recusa é detectada no exato chunk em que
+# aparece, e o chat pode interromper o stream ali mesmo.
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não decide o que fazer quando encontra uma recusa
+# ============================================================
+
+
+class AutomatoFrases:
+    """Autômato Aho-Corasick (imutável) para um conjunto de frases.
+
+    As frases são comparadas em minúsculas. Duplicadas são ignoradas.
+
+    Parâmetros:
+        frases (list): frases a procurar
+    """
+
+    def __init__(self, frases: list):
+        self.frases = sorted({f.lower() for f in frases if f})
+
+        # transicoes[estado] = {caractere: próximo estado}
+        self.transicoes = [{}]
+        # falha[estado] = maior sufixo próprio que também é prefixo de alguma frase
+        self.falha = [0]
+        # final[estado] = True se alguma frase termina neste estado
+        self.final = [False]
+
+        for frase in self.frases:
+            estado = 0
+            for c in frase:
+                proximo = self.transicoes[estado].get(c)
+                if proximo is None:
+                    proximo = len(self.transicoes)
+                    self.transicoes.append({})
+                    self.falha.append(0)
+                    self.final.append(False)
+                    self.transicoes[estado][c] = proximo
+                estado = proximo
+            self.final[estado] = True
+
+        # Links de falha em largura (BFS): filhos da raiz falham para a raiz
+        fila = deque(self.transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for c, proximo in self.transicoes[estado].items():
+                fila.append(proximo)
+                f = self.falha[estado]
+                while f and c not in self.transicoes[f]:
+                    f = self.falha[f]
+                destino = self.transicoes[f].get(c, 0)
+                self.falha[proximo] = destino if destino != proximo else 0
+                # Se o sufixo é o fim de uma frase, este estado também é
+                self.final[proximo] = self.final[proximo] or self.final[self.falha[proximo]]
+
+    def avancar(self, estado: int, texto: str) -> tuple:
+        """Lê um trecho de texto a partir de um estado.
+
+        Retorna:
+            tuple: (novo_estado, encontrou) — encontrou é True se
+                alguma frase terminou dentro do trecho
+        """
+        transicoes, falha, final = self.transicoes, self.falha, self.final
+        encontrou = False
+        for c in texto.lower():
+            while estado and c not in transicoes[estado]:
+                estado = falha[estado]
+            estado = transicoes[estado].get(c, 0)
+            if final[estado]:
+                encontrou = True
+        return estado, encontrou
+
+    def contem(self, texto: str) -> bool:
+        """True se o texto contém alguma das frases."""
+        return self.avancar(0, texto)[1]
+
+    def nova_varredura(self) -> 'VarreduraStream':
+        """Cria um leitor incremental para um novo stream."""
+        return VarreduraStream(self)
+
+
+class VarreduraStream:
+    """Estado da leitura de UM stream — um por resposta.
+
+    O autômato é compartilhado; só o estado atual fica aqui.
+    """
+
+    def __init__(self, automato: AutomatoFrases):
+        self.automato   = automato
+        self.estado     = 0
+        self.encontrou  = False
+
+    def alimentar(self, chunk: str) -> bool:
+        """Lê o próximo chunk. Retorna True se já houve recusa."""
+        if not self.encontrou and chunk:
+            self.estado, achou = self.automato.avancar(self.estado, chunk)
+            self.encontrou = achou
+        return self.encontrou
@@ -0,0 +1,274 @@
+import queue
+import threading
+import time
+
+from utils.tokens import contar_tokens
+
+# ============================================================
+# utils/geracao.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Consumir o stream da resposta em segundo plano e poder cancelá-lo.
+#
+# Antes: o script do Streamlit lia `for chunk in stream` na própria
+# thread. Se o usuário mandava outra pergunta, limpava a conversa ou
+# a página rodava de novo, o script era interrompido — mas o stream
+# continuava aberto (a corrida do hedge seguia lendo em suas threads)
+# e a geração anterior gastava tokens até o fim. Agora:
+# - GeracaoStream lê o stream numa thread de fundo e entrega os
+#   chunks por uma fila; o script só consome
+# - cancelar(motivo) pode vir de QUALQUER thread: fecha o stream na
+#   hora (a conexão cai e o provedor para de gerar) e encerra a
+#   iteração de quem está consumindo
+# - RegistroGeracoes guarda a geração em andamento de cada sessão: a
+#   próxima execução do script cancela a anterior antes de começar, e
+#   estima os tokens economizados — a média das respostas completas
+#   (partindo do histórico de métricas) menos o que já tinha sido gerado
+#
+# O Streamlit só interrompe o script numa chamada st.*. Enquanto espera
+# o 1º token (ou um chunk atrasado), quem consome chama `ao_esperar` a
+# cada INTERVALO_CANCELAMENTO_S — o app toca a tela ali, e o script
+# continua interrompível. A execução interrompida NÃO cancela na hora:
+# deixa para a próxima, que sabe o motivo (nova pergunta, limpar,
+# rerun); se ela não vier em ESPERA_NOVA_EXECUCAO_S (ex: o usuário
+# mudou de página), cancela como 'interrompida'.
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não abre streams — recebe um já aberto (ou a corrida do hedge)
+# ============================================================
+
+# Fim do stream (na fila)
+_FIM = object()
+
+# De quanto em quanto tempo quem consome confere se foi cancelado
+INTERVALO_CANCELAMENTO_S = 0.1
+
+# Quanto a execução interrompida espera a próxima cancelar com o motivo
+ESPERA_NOVA_EXECUCAO_S = 1.0
+
+# Respostas completas do histórico usadas para a média inicial
+AMOSTRAS_HISTORICO = 200
+
+
+class GeracaoStream:
+    """Uma resposta sendo gerada, lida numa thread de fundo.
+
+    Use como iterável de chunks (igual ao stream do SDK). A thread de
+    leitura começa na primeira iteração. `instante` é quando o chunk
+    entregue por último chegou (perf_counter), medido na leitura — fila
+    e tempo de tela de quem consome não entram no TTFT/ITL. Se o stream
+    já informa a chegada (CorridaStreams.instante), ela é usada.
+
+    Parâmetros:
+        stream: iterável de chunks com close() (SDK ou CorridaStreams)
+        ao_cancelar (callable): (geracao) -> None, chamado uma única vez
+            por quem cancelar — fora da thread de leitura
+        ao_esperar (callable): () -> None, chamado por quem consome a cada
+            INTERVALO_CANCELAMENTO_S sem chunk novo
+    """
+
+    def __init__(self, stream, ao_cancelar=None, ao_esperar=None):
+        self._stream     = stream
+        self.ao_cancelar = ao_cancelar
+        self.ao_esperar  = ao_esperar
+        self._fila       = queue.Queue()
+        self._parar      = threading.Event()
+        self._lock       = threading.Lock()
+        self._thread     = None
+        self._erro       = None
+        self._partes     = []      # texto recebido do provedor
+        self.motivo      = None    # preenchido só por cancelar()
+        self.instante    = None    # chegada do último chunk entregue
+        self.concluida   = False
+
+    @property
+    def cancelada(self) -> bool:
+        return self.motivo is not None
+
+    def _ler(self):
+        try:
+            for chunk in self._stream:
+                if self._parar.is_set():
+                    break
+                instante = getattr(self._stream, 'instante', None) or time.perf_counter()
+                self._partes.append(_texto(chunk))
+                self._fila.put((chunk, instante))
+        except Exception as erro:
+            if not self._parar.is_set():
+                self._erro = erro
+        finally:
+            self._fila.put(_FIM)
+
+    def __iter__(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._ler, daemon=True)
+                self._thread.start()
+        while True:
+            try:
+                chunk = self._fila.get(timeout=INTERVALO_CANCELAMENTO_S)
+            except queue.Empty:
+                if self._parar.is_set():
+                    return
+                if self.ao_esperar is not None:
+                    self.ao_esperar()
+                continue
+            if self._parar.is_set():
+                return
+            if chunk is _FIM:
+                if self._erro is not None:
+                    raise self._erro
+                self.concluida = True
+                return
+            chunk, self.instante = chunk
+            yield chunk
+
+    def texto(self) -> str:
+        """Tudo o que o provedor já mandou (inclusive o que ainda não foi exibido)."""
+        return ''.join(list(self._partes))
+
+    def cancelar(self, motivo: str) -> bool:
+        """Interrompe a geração e fecha o stream. False se já tinha acabado."""
+        with self._lock:
+            if self._parar.is_set() or self.concluida:
+                return False
+            self.motivo = motivo
+            self._parar.set()
+        self._fechar_stream()
+        if self.ao_cancelar is not None:
+            try:
+                self.ao_cancelar(self)
+            except Exception:
+                pass  # contabilizar o cancelamento nunca derruba quem cancelou
+        return True
+
+    def fechar(self):
+        """Para de ler sem contar como cancelamento (ex: recusa detectada)."""
+        with self._lock:
+            self._parar.set()
+        self._fechar_stream()
+
+    def _fechar_stream(self):
+        try:
+            self._stream.close()
+        except Exception:
+            pass
+
+
+class RegistroGeracoes:
+    """A geração em andamento de cada sessão, mais os totais de cancelamento.
+
+    Parâmetros:
+        alpha (float): peso da resposta nova na média de tokens por resposta
+        media_inicial (float): média antes da 1ª resposta completa; None =
+            desconhecida (ver carregar_historico) — sem média, os tokens
+            economizados ficam sem estimativa
+    """
+
+    def __init__(self, alpha: float = 0.2, media_inicial: float = None):
+        self.alpha = alpha
+        self.media_tokens_resposta = media_inicial
+        self._ativas = {}     # sessao_id -> GeracaoStream
+        self._lock   = threading.Lock()
+        self.canceladas          = 0
+        self.tokens_economizados = 0
+
+    def iniciar(self, sessao_id: str, geracao: GeracaoStream):
+        """Registra a geração da sessão, cancelando a anterior se ainda rodar."""
+        with self._lock:
+            anterior = self._ativas.get(sessao_id)
+            self._ativas[sessao_id] = geracao
+        if anterior is not None and anterior is not geracao:
+            anterior.cancelar('nova_pergunta')
+
+    def cancelar(self, sessao_id: str, motivo: str, geracao: GeracaoStream = None) -> bool:
+        """Cancela a geração em andamento da sessão, se houver.
+
+        Com `geracao`, só cancela se a em andamento for ela.
+        """
+        with self._lock:
+            ativa = self._ativas.get(sessao_id)
+            if ativa is None or (geracao is not None and ativa is not geracao):
+                return False
+            del self._ativas[sessao_id]
+        return ativa.cancelar(motivo)
+
+    def cancelar_depois(self, sessao_id: str, geracao: GeracaoStream, motivo: str,
+                        espera_s: float = ESPERA_NOVA_EXECUCAO_S):
+        """Cancela `geracao` em espera_s, se ninguém tiver cancelado antes."""
+        prazo = threading.Timer(espera_s, self.cancelar, args=(sessao_id, motivo, geracao))
+        prazo.daemon = True
+        prazo.start()
+
+    def concluir(self, sessao_id: str, geracao: GeracaoStream, tokens_resposta: int = None):
+        """Tira a geração do registro; resposta completa alimenta a média."""
+        with self._lock:
+            if self._ativas.get(sessao_id) is geracao:
+                del self._ativas[sessao_id]
+            if tokens_resposta:
+                self._atualizar_media(tokens_resposta)
+
+    def _atualizar_media(self, tokens_resposta: float):
+        if self.media_tokens_resposta is None:
+            self.media_tokens_resposta = float(tokens_resposta)
+        else:
+            self.media_tokens_resposta = (self.alpha * tokens_resposta
+                                          + (1 - self.alpha) * self.media_tokens_resposta)
+
+    def carregar_historico(self, df):
+        """Parte a média das respostas completas já registradas nas métricas.
+
+        Parâmetros:
+            df (pd.DataFrame): linhas da tabela de métricas do chat, em ordem
+                (tokens_resposta, cache_hit, geracao_cancelada)
+        """
+        if df is None or df.empty or 'tokens_resposta' not in df.columns:
+            return
+        completas = df
+        for coluna in ('cache_hit', 'geracao_cancelada'):
+            if coluna in completas.columns:
+                completas = completas[completas[coluna] != True]
+        tokens = completas['tokens_resposta'].tail(AMOSTRAS_HISTORICO)
+        with self._lock:
+            for valor in tokens:
+                try:
+                    valor = float(valor)
+                except (TypeError, ValueError):
+                    continue
+                if valor > 0:
+                    self._atualizar_media(valor)
+
+    def contabilizar(self, geracao: GeracaoStream) -> tuple:
+        """Soma um cancelamento aos totais.
+
+        Retorna:
+            tuple: (tokens_gerados, tokens_economizados) — economizados é
+                a média de tokens por resposta menos o já gerado (>= 0),
+                ou None enquanto não houver média
+        """
+        gerados = contar_tokens(geracao.texto())
+        with self._lock:
+            economizados = None
+            if self.media_tokens_resposta is not None:
+                economizados = max(round(self.media_tokens_resposta) - gerados, 0)
+                self.tokens_economizados += economizados
+            self.canceladas += 1
+        return gerados, economizados
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                'em_andamento':          len(self._ativas),
+                'canceladas':            self.canceladas,
+                'tokens_economizados':   self.tokens_economizados,
+                'media_tokens_resposta': None if self.media_tokens_resposta is None
+                                         else round(self.media_tokens_resposta),
+            }
+
+
+def _texto(chunk) -> str:
+    try:
+        return chunk.choices[0].delta.content or ''
+    except (AttributeError, IndexError):
+        return ''
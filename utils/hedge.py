@@ -0,0 +1,312 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# ============================================================
+# utils/hedge.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Cortar a cauda da latência com requisições "hedged".
+#
+# A maioria das perguntas recebe o 1º token rápido; algumas ficam
+# presas (fila do provedor, conexão lenta) e dominam o p99. Aqui:
+# - a pergunta vai para o modelo principal
+# - se o 1º token não chegar até o limiar (p95 dos TTFTs recentes do
+#   principal), a MESMA requisição vai para um segundo modelo
+# - o primeiro stream a produzir texto vence; o outro é fechado — se o
+#   principal perdeu, só depois do 1º texto dele (ou de medir_max_s):
+#   o limiar é o p95 de TTFTs REAIS; registrar o tempo em que ele
+#   perdeu (um limite inferior) puxaria o limiar para baixo a cada
+#   hedge, disparando cada vez mais
+# - um orçamento limita a fração de perguntas que podem disparar a
+#   segunda chamada (cada hedge custa tokens de prompt)
+# - os relógios (prazo do hedge e TTFTs) começam no envio de fato:
+#   quem abre o stream avisa (ao_enviar) depois da fila do limitador,
+#   então a espera por taxa não conta como lentidão do provedor
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não monta requisições — recebe funções que abrem os streams
+# ============================================================
+
+# Fim do stream de um participante (na fila da corrida)
+_FIM = object()
+# Requisição de um participante enviada (depois da fila do limitador)
+_ENVIO = object()
+
+
+class LimiarHedge:
+    """Limiar de disparo: percentil dos TTFTs recentes do modelo principal.
+
+    Parâmetros:
+        percentil (float): percentil usado (95 = dispara em ~5% das perguntas)
+        janela (int): quantos TTFTs recentes considerar
+        minimo_amostras (int): abaixo disso, usa padrao_s
+        padrao_s (float): limiar enquanto não há amostras suficientes
+        piso_s (float): limiar mínimo (evita hedge em todo soluço de rede)
+    """
+
+    def __init__(self, percentil: float = 95, janela: int = 200, minimo_amostras: int = 20,
+                 padrao_s: float = 2.0, piso_s: float = 0.3):
+        self.percentil       = percentil
+        self.minimo_amostras = minimo_amostras
+        self.padrao_s        = padrao_s
+        self.piso_s          = piso_s
+        self._ttfts = deque(maxlen=janela)
+        self._lock  = threading.Lock()
+
+    def registrar(self, ttft_s: float):
+        if ttft_s is not None:
+            with self._lock:
+                self._ttfts.append(ttft_s)
+
+    def limiar(self) -> float:
+        with self._lock:
+            if len(self._ttfts) < self.minimo_amostras:
+                return self.padrao_s
+            return max(float(np.percentile(self._ttfts, self.percentil)), self.piso_s)
+
+
+class OrcamentoHedge:
+    """Limita os hedges a uma fração das requisições.
+
+    Parâmetros:
+        fracao (float): máximo de hedges / requisições (ex: 0.1 = 10%)
+    """
+
+    def __init__(self, fracao: float = 0.1):
+        self.fracao      = fracao
+        self.requisicoes = 0
+        self.hedges      = 0
+        self._lock = threading.Lock()
+
+    def contar_requisicao(self):
+        with self._lock:
+            self.requisicoes += 1
+
+    def permitir(self) -> bool:
+        """Reserva um hedge se ainda couber no orçamento."""
+        with self._lock:
+            if self.hedges + 1 > self.fracao * max(self.requisicoes, 1):
+                return False
+            self.hedges += 1
+            return True
+
+
+class CorridaStreams:
+    """Corre o modelo principal contra um reserva; entrega os chunks do vencedor.
+
+    Cada participante roda numa thread que abre o stream e coloca os
+    chunks numa fila comum, com o instante (perf_counter) em que cada
+    um chegou. Use como iterável de chunks (igual ao stream do SDK) e
+    chame close() para encerrar tudo; `instante` é a chegada do último
+    chunk entregue.
+
+    As funções de abertura recebem `ao_enviar`: chamado logo antes de
+    cada tentativa de envio, devolve o instante marcado. O prazo do
+    hedge e os TTFTs contam a partir daí, não da criação da corrida.
+
+    Parâmetros:
+        abrir_principal (callable): (ao_enviar) -> stream do modelo principal
+        abrir_reserva (callable): (ao_enviar) -> stream do modelo reserva, ou None
+        limiar_s (float): quanto esperar o 1º texto do principal, a partir
+            do envio dele
+        orcamento (OrcamentoHedge): autoriza (ou não) o disparo
+        modelos (tuple): nomes (principal, reserva), para o resultado
+        registrar_ttft (callable): (ttft_s) -> None, chamado com o TTFT
+            observado do principal (ex: LimiarHedge.registrar)
+        registrar_falha (callable): (modelo) -> None, chamado quando um
+            stream já aberto falha no meio. Fechar a corrida (cancelamento
+            pelo usuário, recusa, perdedor) não conta como falha; erros
+            ao abrir ficam com quem abre
+        medir_max_s (float): quanto o principal derrotado continua aberto
+            esperando o 1º texto, só para medir o TTFT
+    """
+
+    def __init__(self, abrir_principal, abrir_reserva, limiar_s: float,
+                 orcamento: OrcamentoHedge, modelos: tuple,
+                 registrar_ttft=None, registrar_falha=None, medir_max_s: float = 30):
+        self.limiar_s   = limiar_s
+        self.registrar_ttft  = registrar_ttft
+        self.registrar_falha = registrar_falha
+        self.medir_max_s    = medir_max_s
+        self.orcamento  = orcamento
+        self.modelos    = modelos
+        self._abrir     = [abrir_principal, abrir_reserva]
+        self._streams   = [None, None]
+        self._cancelado = [threading.Event(), threading.Event()]
+        self._fila      = queue.Queue()
+        self._erros     = [None, None]
+        self._envio     = [None, None]   # instante do último envio de cada participante
+
+        self.vencedor        = None     # 0 = principal, 1 = reserva
+        self.hedge_disparado = False    # o reserva foi de fato chamado
+        self._limiar_passou  = False
+        self.ttft_principal_s = None   # chegada do 1º texto do principal (None se não chegou)
+        self.ttft_reserva_s   = None   # idem para o reserva
+        self._fim_medicao     = None   # principal derrotado fechado sem medir
+        self._pendentes = []           # (chunk, instante) do vencedor recebidos antes da decisão
+        self.instante   = None         # chegada do último chunk entregue
+
+        orcamento.contar_requisicao()
+        self._iniciar(0)
+
+    def _iniciar(self, i: int):
+        threading.Thread(target=self._correr, args=(i,), daemon=True).start()
+
+    def _correr(self, i: int):
+        try:
+            stream = self._abrir[i](lambda: self._enviado(i))
+            self._streams[i] = stream
+            if self._cancelado[i].is_set():
+                stream.close()
+                return
+            for chunk in stream:
+                if self._cancelado[i].is_set():
+                    break
+                instante = time.perf_counter()
+                if i == 0 and self.ttft_principal_s is None and _texto(chunk):
+                    self._medir_principal(instante)
+                    if self.vencedor == 1:
+                        self._cancelar(0)  # perdeu a corrida: só faltava medir
+                        break
+                if i == 1 and self.ttft_reserva_s is None and _texto(chunk):
+                    self.ttft_reserva_s = instante - self._envio[1]
+                self._fila.put((i, chunk, instante))
+        except Exception as erro:
+            # Stream fechado de propósito também levanta erro: não é falha
+            if not self._cancelado[i].is_set():
+                self._erros[i] = erro
+                if self._streams[i] is not None and self.registrar_falha is not None:
+                    self.registrar_falha(self.modelos[i])
+        finally:
+            self._fila.put((i, _FIM, time.perf_counter()))
+
+    def _enviado(self, i: int) -> float:
+        """Marca o envio de i (a cada tentativa: backoff não conta)."""
+        instante = time.perf_counter()
+        self._envio[i] = instante
+        self._fila.put((i, _ENVIO, instante))
+        return instante
+
+    def _decidir(self):
+        """Espera o primeiro texto de qualquer participante."""
+        ativos = {0}
+        prazo  = None   # só corre depois que o principal sai da fila do limitador
+        chunks = {0: [], 1: []}
+
+        while True:
+            espera = None
+            if prazo is not None and not self._limiar_passou and self._abrir[1] is not None:
+                espera = max(prazo - time.perf_counter(), 0)
+            try:
+                i, chunk, instante = self._fila.get(timeout=espera)
+            except queue.Empty:
+                self._disparar(ativos)
+                continue
+
+            if chunk is _ENVIO:
+                if i == 0:
+                    prazo = instante + self.limiar_s
+                continue
+
+            if chunk is _FIM:
+                ativos.discard(i)
+                # Principal falhou antes de responder: o reserva assume na hora
+                if i == 0 and not self._limiar_passou and self._abrir[1] is not None:
+                    self._disparar(ativos)
+                if not ativos:
+                    raise self._erros[0] or self._erros[1] or RuntimeError('stream vazio')
+                continue
+
+            chunks[i].append((chunk, instante))
+            if _texto(chunk):
+                self.vencedor   = i
+                self._pendentes = chunks[i]
+                if i == 0 or self.ttft_principal_s is not None:
+                    self._cancelar(1 - i)
+                else:
+                    # O principal segue aberto até o 1º texto (a thread dele
+                    # fecha o stream ao medir), com prazo de medir_max_s
+                    prazo = threading.Timer(self.medir_max_s, self._cancelar, args=(0,))
+                    prazo.daemon = True
+                    prazo.start()
+                return
+
+    def _medir_principal(self, instante: float):
+        self.ttft_principal_s = instante - self._envio[0]
+        if self.registrar_ttft is not None:
+            self.registrar_ttft(self.ttft_principal_s)
+
+    def _disparar(self, ativos: set):
+        self._limiar_passou = True
+        if self.orcamento.permitir():
+            self.hedge_disparado = True
+            ativos.add(1)
+            self._iniciar(1)
+
+    def _cancelar(self, i: int):
+        if i == 0 and self.ttft_principal_s is None and self._fim_medicao is None:
+            self._fim_medicao = time.perf_counter()
+        self._cancelado[i].set()
+        stream = self._streams[i]
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def aguardar(self):
+        """Bloqueia até haver um vencedor (ou propaga o erro se ambos falharem)."""
+        if self.vencedor is None:
+            self._decidir()
+
+    def __iter__(self):
+        self.aguardar()
+        pendentes, self._pendentes = self._pendentes, []
+        for chunk, self.instante in pendentes:
+            yield chunk
+        while True:
+            i, chunk, instante = self._fila.get()
+            if i != self.vencedor or chunk is _ENVIO:
+                continue
+            if chunk is _FIM:
+                if self._erros[i] is not None:
+                    raise self._erros[i]
+                return
+            self.instante = instante
+            yield chunk
+
+    def close(self):
+        for i in (0, 1):
+            self._cancelar(i)
+
+    def resultado(self) -> dict:
+        """Campos para as métricas.
+
+        Se o principal perdeu e ainda não foi medido, ttft_principal_s
+        fica None e ttft_principal_min_s traz um limite inferior (até
+        quando ele foi observado sem texto) — justamente as piores
+        esperas, que não podem sumir da comparação do p99.
+        """
+        minimo = None
+        if self.vencedor == 1 and self.ttft_principal_s is None and self._erros[0] is None:
+            fim    = self._fim_medicao if self._fim_medicao is not None else time.perf_counter()
+            minimo = round(fim - self._envio[0], 3)
+        return {
+            'modelo_vencedor':  None if self.vencedor is None else self.modelos[self.vencedor],
+            'hedge_disparado':  self.hedge_disparado,
+            'ttft_principal_s': None if self.ttft_principal_s is None else round(self.ttft_principal_s, 3),
+            'ttft_principal_min_s': minimo,
+            'limiar_hedge_s':   round(self.limiar_s, 3),
+        }
+
+
+def _texto(chunk) -> str:
+    try:
+        return chunk.choices[0].delta.content or ''
+    except (AttributeError, IndexError):
+        return ''
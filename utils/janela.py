@@ -0,0 +1,158 @@
+import threading
+
+from utils.tokens import contar_tokens
+
+# ============================================================
+# utils/janela.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Limitar o histórico da conversa enviado ao modelo.
+#
+# Só as mensagens mais recentes que cabem no orçamento de tokens
+# são enviadas. As mais antigas são compactadas num resumo, gerado
+# em uma thread de fundo — fora do caminho da requisição —, para
+# que o tamanho do prompt e a latência fiquem estáveis por mais
+# longa que seja a conversa.
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não decide COMO resumir (a função de resumo é injetada)
+# ============================================================
+
+# Tamanho máximo do resumo, em tokens estimados
+MAX_TOKENS_RESUMO = 250
+
+
+def resumo_extrativo(resumo_atual: str, mensagens: list) -> str:
+    """Resumo simples, sem chamar o modelo.
+
+    Guarda o início de cada pergunta do usuário. Usado como
+    alternativa quando o resumo via LLM falha ou não está configurado.
+
+    Parâmetros:
+        resumo_atual (str): resumo das mensagens anteriores (pode ser '')
+        mensagens (list): mensagens {'role', 'content'} a incorporar
+
+    Retorna:
+        str: novo resumo
+    """
+    linhas = [resumo_atual] if resumo_atual else []
+    for msg in mensagens:
+        if msg['role'] == 'user':
+            linhas.append(f"- Cliente perguntou: {msg['content'][:120]}")
+    return '\n'.join(linhas)
+
+
+def cortar_resumo(resumo: str, max_tokens: int = MAX_TOKENS_RESUMO) -> str:
+    # Mantém o final do resumo (o mais recente) se ele passar do limite
+    max_chars = max_tokens * 4
+    return resumo if len(resumo) <= max_chars else resumo[-max_chars:]
+
+
+class JanelaConversa:
+    """Janela deslizante do histórico com resumo em segundo plano.
+
+    Parâmetros:
+        orcamento_tokens (int): limite rígido de tokens para
+            resumo + mensagens recentes
+        resumir (callable): função (resumo_atual, mensagens) -> str.
+            Roda fora do caminho da requisição.
+    """
+
+    def __init__(self, orcamento_tokens: int, resumir=resumo_extrativo):
+        self.orcamento_tokens = orcamento_tokens
+        self.resumir          = resumir
+
+        self.resumo          = ''
+        self.resumidos_ate   = 0     # mensagens [0:resumidos_ate] estão no resumo
+        self._geracao        = 0     # muda a cada limpar(); descarta resumos antigos
+        self._lock           = threading.Lock()
+        self._thread         = None
+
+    def mensagens(self, historico: list) -> list:
+        """Devolve as mensagens a enviar: [resumo] + turnos recentes.
+
+        Parâmetros:
+            historico (list): histórico completo da sessão
+
+        Retorna:
+            list: mensagens dentro do orçamento de tokens
+        """
+        with self._lock:
+            resumo = self.resumo
+
+        usados = contar_tokens(resumo) if resumo else 0
+
+        # Percorre do mais recente para o mais antigo até estourar o orçamento.
+        # A última mensagem (a pergunta atual) sempre entra. reversed() e
+        # não historico[i]: numa SessaoChat, cada índice fora da memória
+        # releria o log
+        total  = len(historico)
+        inicio = total
+        for msg in reversed(historico):
+            tokens = contar_tokens(msg['content'])
+            if usados + tokens > self.orcamento_tokens and inicio < total:
+                break
+            usados += tokens
+            inicio -= 1
+
+        # Tudo antes de `inicio` está fora da janela: agenda o resumo
+        self.agendar_resumo(historico, inicio)
+
+        recentes = historico[inicio:]
+        if not resumo:
+            return list(recentes)
+        return [{'role': 'system', 'content': f'RESUMO DA CONVERSA ANTERIOR:\n{resumo}'}] + list(recentes)
+
+    def agendar_resumo(self, historico: list, corte: int):
+        """Resume em segundo plano as mensagens [resumidos_ate:corte].
+
+        Não bloqueia: se já houver um resumo em andamento, não faz nada
+        — a próxima chamada pega o que ficou pendente.
+        """
+        with self._lock:
+            if corte <= self.resumidos_ate:
+                return
+            if self._thread is not None and self._thread.is_alive():
+                return
+            pendentes = [dict(m) for m in historico[self.resumidos_ate:corte]]
+            resumo_atual = self.resumo
+
+            self._thread = threading.Thread(
+                target = self._resumir_em_fundo,
+                args   = (resumo_atual, pendentes, corte, self._geracao),
+                daemon = True,
+            )
+            self._thread.start()
+
+    def _resumir_em_fundo(self, resumo_atual: str, pendentes: list, corte: int, geracao: int):
+        try:
+            novo = self.resumir(resumo_atual, pendentes)
+        except Exception:
+            # Se o resumo via modelo falhar, não perde as mensagens
+            novo = resumo_extrativo(resumo_atual, pendentes)
+
+        with self._lock:
+            if geracao != self._geracao:
+                return  # a conversa foi limpa enquanto resumíamos
+            self.resumo        = cortar_resumo(novo or '')
+            self.resumidos_ate = corte
+
+    def estado(self) -> tuple:
+        """(resumo, resumidos_ate) — para salvar a conversa em disco."""
+        with self._lock:
+            return self.resumo, self.resumidos_ate
+
+    def restaurar(self, resumo: str, resumidos_ate: int):
+        """Retoma o resumo de uma conversa salva (utils/sessoes.py)."""
+        with self._lock:
+            self.resumo        = resumo or ''
+            self.resumidos_ate = resumidos_ate
+            self._geracao     += 1
+
+    def limpar(self):
+        """Zera o resumo (ex: botão 'Limpar conversa')."""
+        with self._lock:
+            self.resumo        = ''
+            self.resumidos_ate = 0
+            self._geracao     += 1
@@ -0,0 +1,217 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# ============================================================
+# utils/limites.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Respeitar os limites de requisição da API do lado do cliente.
+#
+# Antes: um 429 (rate limit) derrubava a resposta do chat e virava
+# uma falha comum no comparador. Agora:
+# - cada chave de API e cada modelo têm um balde de tokens (token
+#   bucket): rajadas curtas passam, e acima da taxa as requisições
+#   esperam na fila, em ordem de chegada, em vez de falhar
+# - 429 e erros 5xx são repetidos com backoff exponencial com jitter;
+#   se a API mandar Retry-After, ele é respeitado — e o balde inteiro
+#   pausa até lá, para as outras requisições da fila não insistirem
+# - o tempo de fila/backoff é devolvido separado, para as métricas
+#   não misturarem espera com a latência do modelo
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não sabe montar requisições — recebe uma função que faz a chamada
+# ============================================================
+
+
+class LimiteExcedido(Exception):
+    """As tentativas acabaram e a API continuou recusando."""
+
+    def __init__(self, tentativas: int, erro: Exception):
+        super().__init__(f'limite de requisições após {tentativas} tentativa(s): {erro}')
+        self.tentativas = tentativas
+        self.erro       = erro
+
+
+class BaldeTokens:
+    """Token bucket com fila FIFO implícita.
+
+    Cada requisição consome 1 token; os tokens voltam a `taxa_s` por
+    segundo até `capacidade`. Sem token disponível, o saldo fica
+    negativo — cada requisição na fila "reserva" o próximo token, e
+    a espera devolvida respeita a ordem de chegada.
+
+    Parâmetros:
+        taxa_s (float): requisições por segundo em regime
+        capacidade (float): tamanho máximo da rajada
+    """
+
+    def __init__(self, taxa_s: float, capacidade: float):
+        self.taxa_s     = taxa_s
+        self.capacidade = capacidade
+        self._saldo     = capacidade
+        self._ultimo    = time.monotonic()
+        self._pausa_ate = 0.0
+        self._lock      = threading.Lock()
+
+    def reservar(self) -> float:
+        """Reserva uma vaga; retorna quantos segundos esperar por ela."""
+        with self._lock:
+            agora = time.monotonic()
+            self._saldo = min(self.capacidade, self._saldo + (agora - self._ultimo) * self.taxa_s)
+            self._ultimo = agora
+            self._saldo -= 1
+            espera = -self._saldo / self.taxa_s if self._saldo < 0 else 0.0
+            return max(espera, self._pausa_ate - agora)
+
+    def pausar(self, segundos: float):
+        """Ninguém passa pelo balde nos próximos `segundos` (Retry-After)."""
+        with self._lock:
+            self._pausa_ate = max(self._pausa_ate, time.monotonic() + segundos)
+
+
+class LimitadorRequisicoes:
+    """Baldes por chave de API e por (chave, modelo) + retry com backoff.
+
+    Parâmetros:
+        rpm_chave (float): requisições/min por chave; 0 desliga
+        rpm_modelo (float): requisições/min por modelo; 0 desliga
+        rajada (float): requisições que passam de uma vez antes da fila
+        tentativas (int): total de tentativas por chamada
+        backoff_base_s (float): espera da 1ª repetição (dobra a cada vez)
+        backoff_max_s (float): teto de cada espera
+    """
+
+    def __init__(self, rpm_chave: float = 0, rpm_modelo: float = 30, rajada: float = 5,
+                 tentativas: int = 4, backoff_base_s: float = 0.5, backoff_max_s: float = 20):
+        self.rpm_chave      = rpm_chave
+        self.rpm_modelo     = rpm_modelo
+        self.rajada         = rajada
+        self.tentativas     = tentativas
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s  = backoff_max_s
+        self._baldes = {}
+        self._lock   = threading.Lock()
+        self._sorteio = random.Random()
+
+    def _balde(self, chave: tuple, rpm: float) -> BaldeTokens:
+        with self._lock:
+            balde = self._baldes.get(chave)
+            if balde is None:
+                balde = self._baldes[chave] = BaldeTokens(rpm / 60, self.rajada)
+            return balde
+
+    def _baldes_de(self, chave_api: str, modelo: str) -> list:
+        # A chave de API nunca é guardada em claro
+        ident = hashlib.sha256((chave_api or '').encode('utf-8')).hexdigest()[:16]
+        baldes = []
+        if self.rpm_chave > 0:
+            baldes.append(self._balde(('chave', ident), self.rpm_chave))
+        if self.rpm_modelo > 0:
+            baldes.append(self._balde(('modelo', ident, modelo), self.rpm_modelo))
+        return baldes
+
+    def chamar(self, funcao, chave_api: str, modelo: str) -> tuple:
+        """Executa funcao() respeitando os limites.
+
+        Parâmetros:
+            funcao (callable): faz a requisição (sem argumentos)
+            chave_api (str): chave usada na requisição
+            modelo (str): modelo pedido
+
+        Retorna:
+            tuple: (resultado, info) — info tem 'espera_fila_s' (fila +
+                backoff, em segundos) e 'tentativas'
+
+        Raises:
+            LimiteExcedido: se todas as tentativas receberem 429/5xx
+            Exception: qualquer outro erro da função, na hora
+        """
+        baldes = self._baldes_de(chave_api, modelo)
+        espera_total = 0.0
+
+        for tentativa in range(1, self.tentativas + 1):
+            espera = max((b.reservar() for b in baldes), default=0.0)
+            if espera > 0:
+                time.sleep(espera)
+                espera_total += espera
+
+            try:
+                resultado = funcao()
+                return resultado, {'espera_fila_s': round(espera_total, 3), 'tentativas': tentativa}
+            except Exception as erro:
+                status = status_http(erro)
+                if status != 429 and (status is None or status < 500):
+                    raise
+                if tentativa == self.tentativas:
+                    raise LimiteExcedido(tentativa, erro) from erro
+
+                # Full jitter: sorteia entre 0 e o teto exponencial
+                teto   = min(self.backoff_max_s, self.backoff_base_s * 2 ** (tentativa - 1))
+                espera = self._sorteio.uniform(0, teto)
+                retry_after = ler_retry_after(erro)
+                if retry_after is not None:
+                    # Respeita o servidor; o jitter só espalha quem volta junto
+                    espera = retry_after + self._sorteio.uniform(0, self.backoff_base_s)
+                if status == 429:
+                    for b in baldes:
+                        b.pausar(espera)
+                time.sleep(espera)
+                espera_total += espera
+
+
+def status_http(erro: Exception) -> int:
+    """Status HTTP de um erro do SDK (groq/openai/httpx), ou None."""
+    status = getattr(erro, 'status_code', None)
+    if status is None:
+        resposta = getattr(erro, 'response', None)
+        status = getattr(resposta, 'status_code', None)
+    return status
+
+
+def ler_retry_after(erro: Exception) -> float:
+    """Segundos do header Retry-After (número ou data HTTP), ou None."""
+    resposta = getattr(erro, 'response', None)
+    headers  = getattr(resposta, 'headers', None)
+    if not headers:
+        return None
+    valor = headers.get('retry-after')
+    if valor is None:
+        return None
+    try:
+        return max(float(valor), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(valor).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+_limitador = None
+_limitador_lock = threading.Lock()
+
+
+def obter_limitador() -> LimitadorRequisicoes:
+    """Devolve o limitador do processo (compartilhado entre sessões e páginas).
+
+    Configuração (lida na primeira chamada):
+        GROQ_RPM_CHAVE   requisições/min por chave de API (padrão 0 = sem limite)
+        GROQ_RPM_MODELO  requisições/min por modelo (padrão 30)
+        GROQ_RAJADA      requisições liberadas de uma vez (padrão 5)
+        GROQ_TENTATIVAS  tentativas em 429/5xx (padrão 4)
+    """
+    global _limitador
+    with _limitador_lock:
+        if _limitador is None:
+            _limitador = LimitadorRequisicoes(
+                rpm_chave  = float(os.environ.get('GROQ_RPM_CHAVE', 0)),
+                rpm_modelo = float(os.environ.get('GROQ_RPM_MODELO', 30)),
+                rajada     = float(os.environ.get('GROQ_RAJADA', 5)),
+                tentativas = int(os.environ.get('GROQ_TENTATIVAS', 4)),
+            )
+        return _limitador
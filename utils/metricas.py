@@ -0,0 +1,224 @@
+import atexit
+import csv
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from utils import banco_metricas
+
+try:
+    import fcntl      # Linux / macOS
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt     # Windows
+except ImportError:
+    msvcrt = None
+
+# ============================================================
+# utils/metricas.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Gravar as métricas em CSV SEM travar a interação do usuário.
+#
+# Antes, cada evento abria o CSV, criava um DictWriter e escrevia
+# uma linha na própria thread do Streamlit. Agora:
+# - registrar() só coloca o registro numa fila em memória
+# - uma thread de fundo grava em lotes, quando a fila atinge
+#   max_lote registros ou a cada intervalo_s segundos
+# - a gravação usa um arquivo de trava (.lock), então várias sessões
+#   e vários processos podem anexar ao mesmo CSV com segurança
+# - ao encerrar o processo, o que estiver na fila é gravado (atexit)
+# - se uma tabela for informada, o lote vai primeiro para o banco
+#   SQLite (utils/banco_metricas.py), que é de onde o dashboard lê;
+#   o CSV continua sendo gravado como registro legível/exportável
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não decide QUAIS colunas existem (cada página passa as suas)
+# ============================================================
+
+_log = logging.getLogger(__name__)
+
+
+class _TravaArquivo:
+    """Trava exclusiva entre processos, usando um arquivo .lock ao lado do CSV."""
+
+    def __init__(self, arquivo: str):
+        self.caminho = f'{arquivo}.lock'
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self.caminho, 'a+')
+        if fcntl:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt:
+            self._f.seek(0)
+            msvcrt.locking(self._f.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+        elif msvcrt:
+            self._f.seek(0)
+            msvcrt.locking(self._f.fileno(), msvcrt.LK_UNLCK, 1)
+        self._f.close()
+
+
+def garantir_cabecalho(arquivo: str, campos: list):
+    """Migra um CSV criado por uma versão anterior (menos colunas).
+
+    Reescreve uma vez com o cabeçalho novo — linhas antigas ficam
+    vazias nas colunas novas em vez de desalinhar o arquivo.
+    """
+    if not os.path.exists(arquivo) or os.path.getsize(arquivo) == 0:
+        return
+    with open(arquivo, 'r', encoding='utf-8') as f:
+        cabecalho = next(csv.reader(f), [])
+    if cabecalho != campos:
+        df = pd.read_csv(arquivo)
+        df.reindex(columns=campos).to_csv(arquivo, index=False)
+
+
+class ColetorMetricas:
+    """Fila em memória + gravação em lote numa thread de fundo.
+
+    Parâmetros:
+        arquivo (str): caminho do CSV
+        campos (list): colunas do CSV, na ordem
+        max_lote (int): grava assim que a fila tiver esse tamanho
+        intervalo_s (float): grava pelo menos a cada intervalo_s segundos
+        tabela (str | None): tabela do banco de métricas; None grava só o CSV
+    """
+
+    def __init__(self, arquivo: str, campos: list, max_lote: int = 20, intervalo_s: float = 2.0,
+                 tabela: str = None):
+        self.arquivo     = arquivo
+        self.campos      = list(campos)
+        self.tabela      = tabela
+        self.max_lote    = max_lote
+        self.intervalo_s = intervalo_s
+
+        self._fila       = []
+        self._lock       = threading.Lock()       # protege a fila
+        self._gravando   = threading.Lock()       # um lote por vez neste processo
+        self._acordar    = threading.Event()
+        self._encerrado  = False
+
+        with _TravaArquivo(arquivo):
+            garantir_cabecalho(arquivo, self.campos)
+        if tabela:
+            # Importa o CSV antigo ANTES de anexar qualquer linha nova,
+            # senão as linhas novas entrariam duas vezes no banco
+            banco_metricas.preparar(tabela, self.campos)
+
+        self._thread = threading.Thread(target=self._laco, daemon=True)
+        self._thread.start()
+
+    def registrar(self, registro: dict):
+        """Enfileira um registro — não faz I/O na thread de quem chama.
+
+        Chaves fora de `campos` são descartadas (com aviso no log): o
+        banco e o CSV recebem sempre as mesmas colunas.
+        """
+        extras = registro.keys() - set(self.campos)
+        if extras:
+            _log.warning('Métricas: colunas fora de campos ignoradas em %s: %s',
+                         self.arquivo, ', '.join(sorted(extras)))
+            registro = {c: v for c, v in registro.items() if c not in extras}
+        with self._lock:
+            self._fila.append(registro)
+            cheia = len(self._fila) >= self.max_lote
+        if cheia:
+            self._acordar.set()
+
+    def descarregar(self):
+        """Grava agora tudo o que estiver na fila."""
+        with self._gravando:
+            with self._lock:
+                lote, self._fila = self._fila, []
+            if not lote:
+                return
+
+            if self.tabela:
+                try:
+                    banco_metricas.inserir(self.tabela, self.campos, lote)
+                except Exception:
+                    # Devolve o lote para o início da fila — nada se perde
+                    with self._lock:
+                        self._fila = lote + self._fila
+                    raise
+
+            try:
+                with _TravaArquivo(self.arquivo):
+                    arquivo_novo = not os.path.exists(self.arquivo) or os.path.getsize(self.arquivo) == 0
+                    with open(self.arquivo, 'a', newline='', encoding='utf-8') as f:
+                        writer = csv.DictWriter(f, fieldnames=self.campos, extrasaction='ignore')
+                        # Escreve o cabeçalho somente se o arquivo acabou de ser criado
+                        if arquivo_novo:
+                            writer.writeheader()
+                        writer.writerows(lote)
+            except OSError:
+                if self.tabela:
+                    return  # o banco já tem o lote; o CSV é só uma cópia
+                with self._lock:
+                    self._fila = lote + self._fila
+                raise
+
+    def encerrar(self):
+        """Para a thread de fundo e grava o que sobrou."""
+        self._encerrado = True
+        self._acordar.set()
+        self._thread.join(timeout=self.intervalo_s + 1)
+        self.descarregar()
+
+    def _laco(self):
+        while not self._encerrado:
+            self._acordar.wait(self.intervalo_s)
+            self._acordar.clear()
+            try:
+                self.descarregar()
+            except Exception:
+                # Disco/banco indisponível: tentamos de novo no próximo ciclo
+                _log.warning('Métricas: falha ao gravar %s; nova tentativa no próximo ciclo',
+                             self.arquivo, exc_info=True)
+
+
+# Um coletor por arquivo, compartilhado por todas as sessões do processo.
+# O módulo é importado uma vez só, então o registro sobrevive aos reruns.
+_COLETORES = {}
+_COLETORES_LOCK = threading.Lock()
+
+
+def obter_coletor(arquivo: str, campos: list, tabela: str = None) -> ColetorMetricas:
+    """Devolve o coletor do arquivo, criando-o na primeira chamada."""
+    with _COLETORES_LOCK:
+        coletor = _COLETORES.get(arquivo)
+        if coletor is not None and coletor.campos != list(campos):
+            # As colunas mudaram (ex: código recarregado): grava o que
+            # havia com as colunas antigas e recria o coletor
+            coletor.encerrar()
+            coletor = None
+        if coletor is None:
+            coletor = ColetorMetricas(arquivo, campos, tabela=tabela)
+            _COLETORES[arquivo] = coletor
+        return coletor
+
+
+def descarregar_todos():
+    """Grava as filas de todos os coletores (ex: antes de ler o CSV)."""
+    with _COLETORES_LOCK:
+        coletores = list(_COLETORES.values())
+    for coletor in coletores:
+        coletor.descarregar()
+
+
+@atexit.register
+def _encerrar_todos():
+    with _COLETORES_LOCK:
+        coletores = list(_COLETORES.values())
+    for coletor in coletores:
+        coletor.encerrar()
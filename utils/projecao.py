@@ -0,0 +1,270 @@
+import sys
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from utils.elegibilidade import IndiceElegibilidade, capital_disponivel
+from utils.rentabilidade import ModeloTaxas
+
+# ============================================================
+# utils/projecao.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Estimar a chance de cada meta do cliente ser atingida no prazo.
+#
+# Antes: o perfil tem `metas` com valor e prazo, e o modelo só
+# conseguia "achar" em prosa se a meta era viável — fazendo conta de
+# cabeça, e errando. Agora uma simulação de Monte Carlo (10 mil
+# caminhos por padrão) projeta aportes mensais em cada produto
+# candidato e devolve a probabilidade de chegar ao valor até o prazo.
+# O resultado vai pronto para o contexto; o modelo só interpreta.
+#
+# Como é rápido para muitos clientes de uma vez:
+# - os caminhos de retorno são sorteados UMA vez por produto, todos com
+#   a mesma semente: os mesmos choques normais, escalados pelo retorno
+#   e pela volatilidade de cada produto (números aleatórios comuns a
+#   clientes e produtos — comparações entre produtos ficam com menos
+#   ruído)
+# - cada produto vira duas matrizes (meses x caminhos):
+#     G[t] = crescimento acumulado até o mês t
+#     C[t] = soma de 1/G até o mês t
+#   e o patrimônio no prazo T, com aportes do mês s+1 ao T, sai em
+#   forma fechada, sem laço por mês:
+#     W = G[T] * (inicial + aporte * (C[T] - C[s]))
+# - cada cenário (cliente, meta, produto) custa duas linhas contíguas
+#   dessas matrizes; os cenários são processados em blocos
+# Benchmark: python -m utils.projecao [clientes]
+#
+# Premissas (simplificações declaradas):
+# - retorno mensal log-normal: média pela rentabilidade do produto
+#   (utils/rentabilidade.py), volatilidade pelo nível de risco
+# - metas em ordem de prazo: o aporte vai inteiro para a meta mais
+#   próxima até o prazo dela, depois para a seguinte
+# - a reserva de emergência atual conta para a meta de reserva; o
+#   restante do patrimônio, para as demais
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não recomenda produto — só informa probabilidades
+# ============================================================
+
+CAMINHOS   = 10_000
+MAX_MESES  = 360
+BLOCO      = 512     # cenários por bloco (limita a memória a caminhos x BLOCO)
+
+
+def meses_ate(prazo: str, hoje: date = None) -> int:
+    """Meses inteiros entre hoje e um prazo 'AAAA-MM' (0 se já passou)."""
+    hoje = hoje or date.today()
+    ano, mes = (int(p) for p in str(prazo)[:7].split('-'))
+    return max((ano - hoje.year) * 12 + (mes - hoje.month), 0)
+
+
+def aporte_estimado(agregados, meses: int = 6) -> float:
+    """Aporte mensal possível: média do saldo dos últimos meses (>= 0)."""
+    if agregados is None or agregados.por_mes.empty:
+        return 0.0
+    return max(float(agregados.por_mes['saldo'].tail(meses).mean()), 0.0)
+
+
+def fatores_crescimento(retorno_aa: float, volatilidade_aa: float, meses: int,
+                        caminhos: int = CAMINHOS, semente: int = 42) -> tuple:
+    """Matrizes G e C (meses+1 x caminhos) de um produto.
+
+    Parâmetros:
+        retorno_aa (float): retorno anual esperado (0.12 = 12%)
+        volatilidade_aa (float): volatilidade anual
+        meses (int): horizonte
+        caminhos (int): quantidade de caminhos simulados
+        semente (int): semente do sorteio
+
+    Retorna:
+        tuple: (G, C) em float32; a linha 0 é o mês atual (G=1, C=0).
+            Uma linha por mês: o prazo de um cenário é uma linha contígua.
+    """
+    rng = np.random.default_rng(semente)
+    sigma = volatilidade_aa / np.sqrt(12)
+    # Média do log ajustada para que E[1+r] bata com o retorno anual
+    mu = np.log1p(retorno_aa) / 12 - sigma ** 2 / 2
+    log_ret = (mu + sigma * rng.standard_normal((meses, caminhos), dtype=np.float32)).astype(np.float32)
+
+    L = np.zeros((meses + 1, caminhos), dtype=np.float32)
+    np.cumsum(log_ret, axis=0, out=L[1:])
+    G = np.exp(L)
+    C = np.zeros_like(G)
+    np.cumsum(1 / G[1:], axis=0, out=C[1:])
+    return G, C
+
+
+def probabilidades(premissas: list, produto: np.ndarray, inicial: np.ndarray, aporte: np.ndarray,
+                   inicio: np.ndarray, fim: np.ndarray, alvo: np.ndarray,
+                   caminhos: int = CAMINHOS, semente: int = 42) -> tuple:
+    """Probabilidade e mediana do patrimônio no prazo, para muitos cenários.
+
+    Parâmetros:
+        premissas (list): (retorno_aa, volatilidade_aa) de cada produto
+        produto (np.ndarray): índice em `premissas` de cada cenário
+        inicial (np.ndarray): patrimônio inicial de cada cenário
+        aporte (np.ndarray): aporte mensal
+        inicio (np.ndarray): mês após o qual os aportes começam
+        fim (np.ndarray): mês do prazo
+        alvo (np.ndarray): valor da meta
+        caminhos (int): caminhos por produto
+        semente (int): semente do sorteio
+
+    Retorna:
+        tuple: (probabilidade, mediana), arrays do tamanho dos cenários
+    """
+    produto = np.asarray(produto)
+    fim     = np.minimum(np.asarray(fim), MAX_MESES)
+    inicio  = np.minimum(np.asarray(inicio), fim)
+    prob    = np.zeros(len(produto))
+    mediana = np.zeros(len(produto))
+    if not len(produto):
+        return prob, mediana
+
+    inicial = np.asarray(inicial, dtype=np.float32)[:, None]
+    aporte  = np.asarray(aporte, dtype=np.float32)[:, None]
+    alvo    = np.asarray(alvo, dtype=np.float32)[:, None]
+    meio    = caminhos // 2
+
+    horizonte = int(fim.max())
+    for k in np.unique(produto):
+        # Mesma semente em todos os produtos: números aleatórios comuns
+        G, C = fatores_crescimento(*premissas[k], horizonte, caminhos, semente)
+        indices = np.flatnonzero(produto == k)
+        for b in range(0, len(indices), BLOCO):
+            idx = indices[b:b + BLOCO]
+            # W = G[T] * (inicial + aporte * (C[T] - C[s])), em cenários x caminhos
+            W = C[fim[idx]]
+            W -= C[inicio[idx]]
+            W *= aporte[idx]
+            W += inicial[idx]
+            W *= G[fim[idx]]
+            prob[idx] = (W >= alvo[idx]).mean(axis=1)
+            # Mediana por partição (não precisa ordenar os caminhos todos)
+            mediana[idx] = np.partition(W, meio, axis=1)[:, meio]
+    return prob, mediana
+
+
+def _cenarios(perfil: dict, elegibilidade: IndiceElegibilidade, aporte_mensal: float, hoje: date) -> list:
+    """Cenários (meta x produto elegível) de um cliente."""
+    candidatos = elegibilidade.elegiveis(perfil, capital_disponivel(perfil, aporte_mensal))
+
+    metas = sorted(perfil.get('metas') or [], key=lambda m: str(m.get('prazo')))
+    reserva = float(perfil.get('reserva_emergencia_atual') or 0)
+    livre   = max(float(perfil.get('patrimonio_total') or 0) - reserva, 0.0)
+
+    cenarios = []
+    inicio = 0
+    for meta in metas:
+        try:
+            fim = meses_ate(meta['prazo'], hoje)
+            alvo = float(meta['valor_necessario'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        inicial = reserva if 'reserva' in str(meta.get('meta', '')).lower() else livre
+        for i in candidatos:
+            cenarios.append({
+                'meta': meta.get('meta', ''), 'prazo': meta['prazo'], 'alvo': alvo,
+                'meses': fim, 'inicio': min(inicio, fim), 'inicial': inicial,
+                'aporte': aporte_mensal, 'produto': i,
+            })
+        inicio = max(inicio, fim)
+    return cenarios
+
+
+def projetar_clientes(clientes: list, produtos: list, hoje: date = None,
+                      caminhos: int = CAMINHOS, semente: int = 42,
+                      elegibilidade: IndiceElegibilidade = None,
+                      taxas: ModeloTaxas = None, referencias: dict = None) -> pd.DataFrame:
+    """Projeta as metas de vários clientes numa única simulação.
+
+    Parâmetros:
+        clientes (list): pares (perfil, aporte_mensal)
+        produtos (list): catálogo de produtos
+        hoje (date): data de referência (padrão: hoje)
+        elegibilidade (IndiceElegibilidade): catálogo compilado; cada
+            cliente só é projetado nos produtos elegíveis para ele
+        taxas (ModeloTaxas): rentabilidades compiladas do catálogo
+        referencias (dict): CDI/Selic/IPCA (padrão: arquivo de referências)
+
+    Retorna:
+        pd.DataFrame: uma linha por (cliente, meta, produto) com
+            probabilidade e mediana do patrimônio no prazo
+    """
+    hoje = hoje or date.today()
+    elegibilidade = elegibilidade or IndiceElegibilidade(produtos)
+    taxas = taxas or ModeloTaxas(produtos)
+    linhas = []
+    for c, (perfil, aporte) in enumerate(clientes):
+        for cenario in _cenarios(perfil, elegibilidade, aporte, hoje):
+            cenario['cliente'] = c
+            linhas.append(cenario)
+    tabela = pd.DataFrame(linhas, columns=['cliente', 'meta', 'prazo', 'alvo', 'meses', 'inicio',
+                                           'inicial', 'aporte', 'produto'])
+    if tabela.empty:
+        return tabela.assign(nome_produto=[], probabilidade=[], mediana=[])
+
+    prob, mediana = probabilidades(
+        taxas.premissas(referencias),
+        tabela['produto'].to_numpy(), tabela['inicial'].to_numpy(float), tabela['aporte'].to_numpy(float),
+        tabela['inicio'].to_numpy(), tabela['meses'].to_numpy(), tabela['alvo'].to_numpy(float),
+        caminhos, semente,
+    )
+    tabela['nome_produto']  = [produtos[i]['nome'] for i in tabela['produto']]
+    tabela['probabilidade'] = prob
+    tabela['mediana']       = mediana
+    return tabela
+
+
+def projetar_metas(perfil: dict, produtos: list, aporte_mensal: float, hoje: date = None,
+                   caminhos: int = CAMINHOS, elegibilidade: IndiceElegibilidade = None,
+                   taxas: ModeloTaxas = None, referencias: dict = None) -> pd.DataFrame:
+    """Projeção de um cliente só (ver projetar_clientes)."""
+    return projetar_clientes([(perfil, aporte_mensal)], produtos, hoje, caminhos,
+                             elegibilidade=elegibilidade, taxas=taxas, referencias=referencias)
+
+
+def texto_metas(tabela: pd.DataFrame, max_produtos: int = 3) -> str:
+    """Bloco de metas para o contexto: os melhores produtos de cada meta."""
+    if tabela is None or tabela.empty:
+        return ''
+    aporte = float(tabela['aporte'].iloc[0])
+    partes = [f'PROJEÇÃO DAS METAS (Monte Carlo, aporte de R$ {aporte:.2f}/mês na meta mais próxima):']
+    for (meta, prazo), grupo in tabela.groupby(['meta', 'prazo'], sort=False):
+        linha = grupo.iloc[0]
+        melhores = grupo.sort_values('probabilidade', ascending=False).head(max_produtos)
+        chances = ', '.join(
+            f'{r.nome_produto} {r.probabilidade * 100:.0f}% (mediana R$ {r.mediana:.0f})'
+            for r in melhores.itertuples()
+        )
+        prazo_txt = 'prazo vencido' if linha['meses'] == 0 else f'{linha["meses"]} meses'
+        partes.append(f'- {meta}: R$ {linha["alvo"]:.2f} até {prazo} ({prazo_txt}, '
+                      f'parte de R$ {linha["inicial"]:.2f}): {chances}')
+    return '\n'.join(partes) + '\n'
+
+
+if __name__ == '__main__':
+    # Projeta N clientes sintéticos (2 metas cada) e mede o tempo
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rng = np.random.default_rng(0)
+    produtos = [{'nome': 'Baixo', 'risco': 'baixo', 'rentabilidade': '100% do CDI'},
+                {'nome': 'Médio', 'risco': 'medio', 'rentabilidade': 'CDI + 2%'},
+                {'nome': 'Alto',  'risco': 'alto',  'rentabilidade': 'Variável'}]
+    clientes = [({
+        'perfil_investidor': 'arrojado',
+        'patrimonio_total': float(rng.uniform(0, 50_000)),
+        'reserva_emergencia_atual': float(rng.uniform(0, 10_000)),
+        'metas': [
+            {'meta': 'Reserva de emergência', 'valor_necessario': 15_000, 'prazo': '2027-06'},
+            {'meta': 'Entrada do apartamento', 'valor_necessario': 80_000, 'prazo': '2031-12'},
+        ],
+    }, float(rng.uniform(200, 3000))) for _ in range(n)]
+
+    inicio = time.perf_counter()
+    tabela = projetar_clientes(clientes, produtos)
+    decorrido = time.perf_counter() - inicio
+    print(f'{n:,} clientes, {len(tabela):,} cenários x {CAMINHOS:,} caminhos em {decorrido:.2f}s')
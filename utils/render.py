@@ -0,0 +1,131 @@
+import time
+
+# ============================================================
+# utils/render.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Exibir a resposta em streaming sem reenviar o texto a cada chunk.
+#
+# Antes: full_response += delta e placeholder.write(full_response)
+# em TODO chunk. Cada write manda o markdown inteiro para o navegador
+# pelo websocket — custo O(n²) no tamanho da resposta.
+# Agora: os chunks vão para uma lista e o placeholder só é atualizado
+# a cada 1/fps segundos ou quando acumular max_chars caracteres novos.
+#
+# Benchmark (relógio simulado, sem rede):
+#     python -m utils.render
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit (recebe qualquer objeto com .write())
+# ============================================================
+
+CURSOR = '▌'
+
+
+class RenderizadorStream:
+    """Agrupa os chunks e atualiza o placeholder numa taxa limitada.
+
+    Parâmetros:
+        placeholder: objeto com método write(texto) (ex: st.empty())
+        fps (float): máximo de atualizações por segundo
+        max_chars (int): atualiza antes do tempo se acumular isso de texto novo
+        relogio (callable): fonte de tempo (trocável no benchmark)
+    """
+
+    def __init__(self, placeholder, fps: float = 12, max_chars: int = 400, relogio=time.monotonic):
+        self.placeholder = placeholder
+        self.intervalo   = 1 / fps if fps > 0 else 0
+        self.max_chars   = max_chars
+        self.relogio     = relogio
+
+        self._partes          = []
+        self._pendentes       = 0      # caracteres recebidos desde a última atualização
+        self._ultima_escrita  = relogio()
+        self.escritas         = 0      # quantas vezes o placeholder foi atualizado
+        self.tempo_escrita    = 0.0    # segundos gastos dentro de placeholder.write
+
+    def adicionar(self, delta: str):
+        """Recebe um chunk; só escreve na tela se o tempo ou o tamanho pedirem."""
+        if not delta:
+            return
+        self._partes.append(delta)
+        self._pendentes += len(delta)
+
+        agora = self.relogio()
+        if self._pendentes >= self.max_chars or agora - self._ultima_escrita >= self.intervalo:
+            self._escrever(self.texto() + CURSOR, agora)
+
+    def manter_vivo(self):
+        """Reescreve a tela sem texto novo (ex: esperando o 1º token).
+
+        É numa escrita que o Streamlit interrompe o script quando chega
+        outra pergunta — sem ela, a espera não pode ser interrompida.
+        """
+        self._escrever(self.texto() + CURSOR, self.relogio())
+
+    def substituir(self, texto: str):
+        """Troca todo o conteúdo (ex: resposta padrão de recusa)."""
+        self._partes    = [texto]
+        self._pendentes = len(texto)
+
+    def texto(self) -> str:
+        # join sobre a lista: linear, e só acontece nas atualizações
+        if len(self._partes) > 1:
+            self._partes = [''.join(self._partes)]
+        return self._partes[0] if self._partes else ''
+
+    def finalizar(self) -> str:
+        """Escreve o texto final (sem cursor) e o devolve."""
+        final = self.texto()
+        self._escrever(final, self.relogio())
+        return final
+
+    def _escrever(self, texto: str, agora: float):
+        inicio = time.perf_counter()
+        self.placeholder.write(texto)
+        self.tempo_escrita   += time.perf_counter() - inicio
+        self.escritas        += 1
+        self._pendentes       = 0
+        self._ultima_escrita  = agora
+
+
+if __name__ == '__main__':
+    # Simula uma resposta de 1.200 tokens a 300 tokens/s e conta quantas
+    # mensagens chegam ao placeholder em cada estratégia.
+    class _Placeholder:
+        def __init__(self):
+            self.mensagens = 0
+            self.bytes     = 0
+
+        def write(self, texto):
+            self.mensagens += 1
+            self.bytes     += len(texto.encode('utf-8'))
+
+    class _Relogio:
+        def __init__(self):
+            self.t = 0.0
+
+        def __call__(self):
+            return self.t
+
+    chunks = ['palavra '] * 1200
+    passo  = 1 / 300
+
+    # Estratégia antiga: escreve o texto inteiro a cada chunk
+    antigo, texto = _Placeholder(), ''
+    for c in chunks:
+        texto += c
+        antigo.write(texto + CURSOR)
+    antigo.write(texto)
+
+    # Estratégia nova: renderizador com taxa limitada
+    novo, relogio = _Placeholder(), _Relogio()
+    render = RenderizadorStream(novo, relogio=relogio)
+    for c in chunks:
+        relogio.t += passo
+        render.adicionar(c)
+    render.finalizar()
+
+    print(f'{"":<22}{"mensagens":>12}{"bytes enviados":>18}')
+    print(f'{"a cada chunk":<22}{antigo.mensagens:>12}{antigo.bytes:>18,}')
+    print(f'{"RenderizadorStream":<22}{novo.mensagens:>12}{novo.bytes:>18,}')
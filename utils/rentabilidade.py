@@ -0,0 +1,221 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+
+# ============================================================
+# utils/rentabilidade.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Transformar o texto de `rentabilidade` dos produtos em números.
+#
+# Antes: "102% do CDI", "CDI + 2%" e "Variável - 6% a 12% ao ano" eram
+# só texto — comparar produtos ou projetar um valor exigia perguntar
+# ao modelo, que faz conta de cabeça. Agora:
+# - cada texto é interpretado UMA vez (lru_cache) numa taxa
+#   estruturada: tipo, indexador, multiplicador, spread e faixa
+# - o catálogo vira arrays NumPy (ModeloTaxas), compilados uma vez por
+#   versão do arquivo de produtos
+# - os índices de referência (CDI, Selic, IPCA) vêm de um arquivo
+#   local (data/indices_referencia.json), relido só quando muda
+# - taxa anual e valor projetado saem de uma conta vetorizada sobre
+#   todos os produtos de uma vez
+#
+# Formatos reconhecidos (sem diferenciar acento/maiúscula):
+#     "102% do CDI", "100% da Selic"     -> percentual do indexador
+#     "CDI + 2%", "IPCA + 5,5%"          -> indexador + spread
+#     "12% ao ano", "12% a.a."           -> prefixado
+#     "Variável - 6% a 12% ao ano"       -> faixa (usa o ponto médio)
+#     "Variável"                         -> CDI + prêmio do nível de risco
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não desconta imposto de renda nem taxas de administração
+# ============================================================
+
+ARQUIVO_REFERENCIAS = 'data/indices_referencia.json'
+
+# Usados se o arquivo de referências não existir
+REFERENCIAS_PADRAO = {'data_referencia': None, 'cdi': 0.149, 'selic': 0.15, 'ipca': 0.052}
+
+# Posição de cada indexador no vetor de referências (0 = sem indexador)
+INDEXADORES = {'cdi': 1, 'selic': 2, 'ipca': 3}
+
+# Volatilidade anual por nível de risco (usada na projeção das metas)
+VOLATILIDADE_RISCO = {'baixo': 0.01, 'medio': 0.06, 'alto': 0.22}
+
+# Prêmio anual sobre o CDI para produtos "Variável" sem números
+PREMIO_VARIAVEL = {'baixo': 0.0, 'medio': 0.02, 'alto': 0.04}
+
+_NUMERO = r'(\d+(?:[.,]\d+)?)'
+_PADROES = [
+    ('percentual', re.compile(_NUMERO + r'\s*%\s*d[oa]\s+(cdi|selic|ipca)')),
+    ('spread',     re.compile(r'(cdi|selic|ipca)\s*([+-])\s*' + _NUMERO + r'\s*%')),
+    ('faixa',      re.compile(_NUMERO + r'\s*%?\s*a\s*' + _NUMERO + r'\s*%')),
+    ('prefixado',  re.compile(_NUMERO + r'\s*%\s*(?:ao\s+ano|a\.?\s*a\.?)')),
+]
+
+
+def _numero(texto: str) -> float:
+    return float(texto.replace(',', '.')) / 100
+
+
+@lru_cache(maxsize=4096)
+def interpretar_rentabilidade(texto: str, risco: str = 'medio') -> tuple:
+    """Converte o texto de rentabilidade numa taxa estruturada.
+
+    Parâmetros:
+        texto (str): ex. "102% do CDI"
+        risco (str): nível de risco do produto (para "Variável")
+
+    Retorna:
+        tuple: (tipo, indexador, multiplicador, spread, minimo, maximo) —
+            taxa anual = multiplicador * indexador + spread; minimo e
+            maximo só existem nas faixas (senão None)
+    """
+    norm = unicodedata.normalize('NFKD', str(texto or ''))
+    norm = norm.encode('ascii', 'ignore').decode('ascii').lower()
+
+    for tipo, padrao in _PADROES:
+        m = padrao.search(norm)
+        if not m:
+            continue
+        if tipo == 'percentual':
+            return tipo, m.group(2), _numero(m.group(1)), 0.0, None, None
+        if tipo == 'spread':
+            sinal = 1 if m.group(2) == '+' else -1
+            return tipo, m.group(1), 1.0, sinal * _numero(m.group(3)), None, None
+        if tipo == 'faixa':
+            minimo, maximo = sorted((_numero(m.group(1)), _numero(m.group(2))))
+            return tipo, None, 0.0, (minimo + maximo) / 2, minimo, maximo
+        return tipo, None, 0.0, _numero(m.group(1)), None, None
+
+    return 'variavel', 'cdi', 1.0, PREMIO_VARIAVEL.get(risco, PREMIO_VARIAVEL['medio']), None, None
+
+
+_referencias = {}
+_referencias_lock = threading.Lock()
+
+
+def carregar_referencias(caminho: str = ARQUIVO_REFERENCIAS) -> dict:
+    """Índices de referência (taxas anuais), relidos só quando o arquivo muda.
+
+    Retorna:
+        dict: 'cdi', 'selic', 'ipca' (0.149 = 14,9% a.a.) e 'data_referencia'.
+            Sem o arquivo, REFERENCIAS_PADRAO.
+    """
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return dict(REFERENCIAS_PADRAO)
+    versao = (info.st_mtime_ns, info.st_size)
+    with _referencias_lock:
+        item = _referencias.get(caminho)
+        if item is None or item[0] != versao:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                item = (versao, {**REFERENCIAS_PADRAO, **json.load(f)})
+            _referencias[caminho] = item
+        return item[1]
+
+
+class ModeloTaxas:
+    """Catálogo de produtos compilado em arrays de taxa.
+
+    Parâmetros:
+        produtos (list): catálogo (dicts com rentabilidade e risco)
+    """
+
+    def __init__(self, produtos: list):
+        self.produtos = produtos
+        taxas = [interpretar_rentabilidade(p.get('rentabilidade', ''), p.get('risco', 'medio'))
+                 for p in produtos]
+        self.tipos         = [t[0] for t in taxas]
+        self.indexador     = np.array([INDEXADORES.get(t[1], 0) for t in taxas], dtype=np.int8)
+        self.multiplicador = np.array([t[2] for t in taxas], dtype=np.float64)
+        self.spread        = np.array([t[3] for t in taxas], dtype=np.float64)
+        self.minimo        = np.array([np.nan if t[4] is None else t[4] for t in taxas])
+        self.maximo        = np.array([np.nan if t[5] is None else t[5] for t in taxas])
+        self.volatilidade  = np.array([VOLATILIDADE_RISCO.get(p.get('risco'), VOLATILIDADE_RISCO['medio'])
+                                       for p in produtos], dtype=np.float64)
+
+    def taxas_anuais(self, referencias: dict = None) -> np.ndarray:
+        """Taxa anual esperada de cada produto (0.15 = 15% a.a.)."""
+        ref = referencias or carregar_referencias()
+        vetor = np.array([0.0, ref['cdi'], ref['selic'], ref['ipca']])
+        return self.multiplicador * vetor[self.indexador] + self.spread
+
+    def retorno_projetado(self, valores, meses, referencias: dict = None) -> np.ndarray:
+        """Valor futuro de cada aplicação em cada produto (juros compostos).
+
+        Parâmetros:
+            valores (float ou array): valores aplicados
+            meses (int ou array): prazos, do mesmo formato de `valores`
+            referencias (dict): índices de referência (padrão: arquivo)
+
+        Retorna:
+            np.ndarray: formato (len(valores), len(produtos)), ou
+                (len(produtos),) para um valor só
+        """
+        taxas   = self.taxas_anuais(referencias)
+        valores = np.asarray(valores, dtype=np.float64)
+        meses   = np.asarray(meses, dtype=np.float64)
+        return valores[..., None] * (1 + taxas) ** (meses[..., None] / 12)
+
+    def premissas(self, referencias: dict = None) -> list:
+        """(retorno anual, volatilidade anual) de cada produto, para utils/projecao.py."""
+        return list(zip(self.taxas_anuais(referencias).tolist(), self.volatilidade.tolist()))
+
+    def estimativas(self, valor: float = 1000, meses: int = 12, referencias: dict = None) -> list:
+        """Taxa estimada e quanto vira `valor` em `meses`, um texto por produto.
+
+        Vai para o contexto como campo de cada produto (utils/contexto.py):
+        entra e sai junto com o produto, dentro do orçamento de tokens.
+
+        Retorna:
+            list: na ordem de `produtos`, ex. "15.20% a.a. → R$ 1151.98 em 12 meses"
+        """
+        taxas  = self.taxas_anuais(referencias)
+        finais = valor * (1 + taxas) ** (meses / 12)
+        textos = []
+        for i, (taxa, final) in enumerate(zip(taxas, finais)):
+            faixa = ''
+            if self.tipos[i] == 'faixa':
+                faixa = f' (faixa {self.minimo[i] * 100:.0f}% a {self.maximo[i] * 100:.0f}%)'
+            elif self.tipos[i] == 'variavel':
+                faixa = ' (variável, estimativa)'
+            textos.append(f'{taxa * 100:.2f}% a.a.{faixa} → R$ {final:.2f} em {meses} meses')
+        return textos
+
+    def legenda(self, valor: float = 1000, referencias: dict = None) -> str:
+        """Uma linha para o cabeçalho: de onde vêm as estimativas dos produtos."""
+        ref  = referencias or carregar_referencias()
+        data = f', ref. {ref["data_referencia"]}' if ref.get('data_referencia') else ''
+        return (f'RENTABILIDADE ESTIMADA dos produtos: bruta, R$ {valor:.0f} aplicados; '
+                f'CDI {ref["cdi"] * 100:.2f}% a.a., Selic {ref["selic"] * 100:.2f}% a.a.{data}\n')
+
+
+if __name__ == '__main__':
+    # Compila um catálogo sintético e mede a projeção vetorizada
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    textos = ['100% da Selic', '102% do CDI', '95% do CDI', 'CDI + 2%', 'Variável',
+              'Variável - 6% a 12% ao ano', 'IPCA + 5,5%', '12,5% a.a.']
+    riscos = list(VOLATILIDADE_RISCO)
+    catalogo = [{'nome': f'Produto {i}', 'rentabilidade': f'{textos[i % len(textos)]}',
+                 'risco': riscos[i % len(riscos)]} for i in range(n)]
+
+    inicio = time.perf_counter()
+    modelo = ModeloTaxas(catalogo)
+    compilado = time.perf_counter() - inicio
+
+    valores = np.linspace(100, 100_000, 100)
+    inicio = time.perf_counter()
+    projetado = modelo.retorno_projetado(valores, np.full(100, 24))
+    decorrido = time.perf_counter() - inicio
+    print(f'{n:,} produtos compilados em {compilado * 1000:.1f} ms; '
+          f'{projetado.size:,} projeções em {decorrido * 1000:.1f} ms')
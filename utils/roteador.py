@@ -0,0 +1,272 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+
+import numpy as np
+
+from utils.banco_metricas import TABELA_COMPARADOR, preparar, ler_periodo
+
+# ============================================================
+# utils/roteador.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Escolher, a cada pergunta, o modelo mais rápido que está saudável.
+#
+# Antes: o chat usava sempre o mesmo modelo, e o histórico do
+# comparador (latência por modelo) não servia para nada. Agora cada
+# modelo tem estatísticas contínuas:
+# - EWMA da latência (reage rápido a mudanças)
+# - p95 numa janela deslizante (o que o usuário sente na cauda)
+# - taxa de erro na janela + disjuntor (circuit breaker): um modelo
+#   que começa a falhar sai da rota por `pausa_s` e depois recebe uma
+#   única requisição de teste antes de voltar
+#
+# As latências ficam separadas por FONTE, porque não são comparáveis:
+# - 'chat': TTFT das respostas do chat (streaming, prompt completo) —
+#   a única comparada com o SLO
+# - 'comparador': latência total, sem streaming e só com a pergunta
+#   (histórico do comparador e novas comparações)
+# Sucessos e erros das duas fontes alimentam o mesmo disjuntor.
+#
+# Escolha: entre os modelos saudáveis cujo p95 do chat cumpre o SLO,
+# o de menor EWMA. Se nenhum cumpre, um modelo ainda sem dados do
+# chat (o mais rápido no comparador, depois a ordem de preferência
+# da lista); se não houver, o de menor p95 do chat.
+#
+# escolher() não muda estado: o disjuntor só passa para MEIO_ABERTO
+# em iniciar(), quando a requisição de teste é de fato enviada — o
+# reserva do hedge que nunca foi chamado não gasta o teste.
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não chama os modelos
+# ============================================================
+
+# Modelos disponíveis: nome exibido -> id na API da Groq
+MODELOS = {
+    'GPT OSS 120B':  'openai/gpt-oss-120b',
+    'GPT OSS 20B': 'openai/gpt-oss-20b',
+    'LLaMA 70B VERSATILE':      'llama-3.3-70b-versatile',
+    'Kimi K2 - Moonshot AI': 'moonshotai/kimi-k2-instruct-0905',
+    'Qwen3-32B - Alibaba Cloud': 'qwen/qwen3-32b',
+}
+
+# Fontes de latência
+CHAT       = 'chat'
+COMPARADOR = 'comparador'
+
+FECHADO     = 'fechado'      # saudável
+ABERTO      = 'aberto'       # fora da rota até aberto_ate
+MEIO_ABERTO = 'meio_aberto'  # uma requisição de teste em andamento
+
+
+class EstatisticasModelo:
+    """Latência (por fonte) e erros recentes de um modelo, mais o estado do disjuntor."""
+
+    def __init__(self, janela: int, alpha: float):
+        self.alpha      = alpha
+        self.janela     = janela
+        self.ewmas      = {}                      # fonte -> EWMA da latência
+        self.latencias  = {}                      # fonte -> deque de latências
+        self.resultados = deque(maxlen=janela)   # True = sucesso
+        self.estado     = FECHADO
+        self.aberto_ate = 0.0                     # fim da pausa (ABERTO) ou envio do teste (MEIO_ABERTO)
+
+    def registrar(self, latencia_s: float, sucesso: bool, fonte: str = CHAT):
+        self.resultados.append(sucesso)
+        if sucesso and latencia_s is not None:
+            self.latencias.setdefault(fonte, deque(maxlen=self.janela)).append(latencia_s)
+            anterior = self.ewmas.get(fonte)
+            self.ewmas[fonte] = latencia_s if anterior is None \
+                else self.alpha * latencia_s + (1 - self.alpha) * anterior
+
+    def ewma_s(self, fonte: str = CHAT) -> float:
+        return self.ewmas.get(fonte)
+
+    def p95_s(self, fonte: str = CHAT) -> float:
+        latencias = self.latencias.get(fonte)
+        return float(np.percentile(latencias, 95)) if latencias else None
+
+    def taxa_erro(self) -> float:
+        if not self.resultados:
+            return 0.0
+        return 1 - sum(self.resultados) / len(self.resultados)
+
+
+class RoteadorModelos:
+    """Escolhe o modelo de cada requisição pelas estatísticas recentes.
+
+    Parâmetros:
+        modelos (list): ids candidatos, em ordem de preferência
+        slo_s (float): TTFT alvo (p95) do chat, em segundos
+        alpha (float): peso da amostra nova na EWMA
+        janela (int): amostras na janela deslizante
+        limite_erro (float): taxa de erro que abre o disjuntor
+        minimo_chamadas (int): amostras mínimas para avaliar a taxa de erro
+        pausa_s (float): tempo com o disjuntor aberto antes do teste
+        relogio (callable): fonte de tempo
+    """
+
+    def __init__(self, modelos: list, slo_s: float = 2.0, alpha: float = 0.2, janela: int = 50,
+                 limite_erro: float = 0.5, minimo_chamadas: int = 4, pausa_s: float = 30,
+                 relogio=time.monotonic):
+        self.modelos         = list(modelos)
+        self.slo_s           = slo_s
+        self.limite_erro     = limite_erro
+        self.minimo_chamadas = minimo_chamadas
+        self.pausa_s         = pausa_s
+        self.relogio         = relogio
+        self._stats = {m: EstatisticasModelo(janela, alpha) for m in self.modelos}
+        self._lock  = threading.Lock()
+
+    def registrar(self, modelo: str, latencia_s: float, sucesso: bool, fonte: str = CHAT):
+        """Alimenta as estatísticas com o resultado de uma chamada.
+
+        Parâmetros:
+            modelo (str): id do modelo
+            latencia_s (float): TTFT (chat) ou latência total (comparador); None se falhou
+            sucesso (bool): a chamada respondeu
+            fonte (str): CHAT ou COMPARADOR
+        """
+        with self._lock:
+            stats = self._stats.get(modelo)
+            if stats is None:
+                return
+            stats.registrar(latencia_s, sucesso, fonte)
+
+            if stats.estado == MEIO_ABERTO:
+                # Resultado da requisição de teste decide o disjuntor
+                if sucesso:
+                    stats.estado = FECHADO
+                    stats.resultados.clear()
+                else:
+                    self._abrir(stats)
+            elif stats.estado == FECHADO and len(stats.resultados) >= self.minimo_chamadas \
+                    and stats.taxa_erro() >= self.limite_erro:
+                self._abrir(stats)
+
+    def _abrir(self, stats: EstatisticasModelo):
+        stats.estado     = ABERTO
+        stats.aberto_ate = self.relogio() + self.pausa_s
+
+    def _testavel(self, stats: EstatisticasModelo, agora: float) -> bool:
+        # Pausa acabou (ou o teste anterior nunca voltou, ex: stream
+        # cancelado): o modelo pode receber a requisição de teste
+        return (stats.estado == ABERTO and agora >= stats.aberto_ate) or \
+            (stats.estado == MEIO_ABERTO and agora >= stats.aberto_ate + self.pausa_s)
+
+    def iniciar(self, modelo: str):
+        """Avisa que uma requisição vai de fato para o modelo.
+
+        Se o disjuntor estava esperando o teste, esta requisição é o teste.
+        """
+        with self._lock:
+            stats = self._stats.get(modelo)
+            if stats is not None and self._testavel(stats, self.relogio()):
+                stats.estado     = MEIO_ABERTO
+                stats.aberto_ate = self.relogio()
+
+    def escolher(self, excluir=()) -> str:
+        """Modelo para a próxima requisição (None se não houver candidato).
+
+        Não altera o disjuntor — chame iniciar() ao enviar a requisição.
+        """
+        with self._lock:
+            agora = self.relogio()
+            saudaveis = []
+            for m in self.modelos:
+                if m in excluir:
+                    continue
+                stats = self._stats[m]
+                if self._testavel(stats, agora):
+                    return m
+                if stats.estado == FECHADO:
+                    saudaveis.append(m)
+
+            if not saudaveis:
+                # Todos com o disjuntor aberto: o que reabre primeiro
+                abertos = [m for m in self.modelos if m not in excluir]
+                return min(abertos, key=lambda m: self._stats[m].aberto_ate) if abertos else None
+
+            medidos = [m for m in saudaveis if self._stats[m].ewma_s(CHAT) is not None]
+            no_slo  = [m for m in medidos if self._stats[m].p95_s(CHAT) <= self.slo_s]
+            if no_slo:
+                return min(no_slo, key=lambda m: self._stats[m].ewma_s(CHAT))
+
+            # Sem dados do chat: o comparador só ordena entre eles
+            novos = [m for m in saudaveis if m not in medidos]
+            if novos:
+                com_comparador = [m for m in novos if self._stats[m].ewma_s(COMPARADOR) is not None]
+                if com_comparador:
+                    return min(com_comparador, key=lambda m: self._stats[m].ewma_s(COMPARADOR))
+                return novos[0]
+            return min(medidos, key=lambda m: self._stats[m].p95_s(CHAT))
+
+    def resumo(self) -> list:
+        """Estado de cada modelo, para exibir."""
+        with self._lock:
+            return [{
+                'modelo':              m,
+                'estado':              s.estado,
+                'ttft_ewma_s':         _arredondar(s.ewma_s(CHAT)),
+                'ttft_p95_s':          _arredondar(s.p95_s(CHAT)),
+                'comparador_ewma_s':   _arredondar(s.ewma_s(COMPARADOR)),
+                'taxa_erro':           round(s.taxa_erro(), 2),
+                'amostras':            len(s.resultados),
+            } for m, s in self._stats.items()]
+
+    def carregar_historico(self, df):
+        """Alimenta as estatísticas com linhas do comparador, em ordem.
+
+        Parâmetros:
+            df (pd.DataFrame): colunas 'modelo' (nome exibido ou id),
+                'latencia_s' e 'sucesso'
+        """
+        if df is None or df.empty:
+            return
+        for modelo, latencia, sucesso in df[['modelo', 'latencia_s', 'sucesso']].itertuples(index=False):
+            modelo  = MODELOS.get(modelo, modelo)
+            sucesso = str(sucesso).strip().lower() in ('true', '1')
+            try:
+                latencia = float(latencia)
+            except (TypeError, ValueError):
+                latencia = None
+            # O histórico não abre disjuntores — só entra nas estatísticas
+            with self._lock:
+                if modelo in self._stats:
+                    self._stats[modelo].registrar(latencia, sucesso, COMPARADOR)
+
+
+def _arredondar(valor):
+    return None if valor is None else round(valor, 2)
+
+
+_roteador = None
+_roteador_lock = threading.Lock()
+
+
+def obter_roteador() -> RoteadorModelos:
+    """Devolve o roteador do processo, já alimentado pelo histórico.
+
+    Configuração (lida na primeira chamada):
+        ROTEADOR_MODELOS    ids separados por vírgula, em ordem de preferência
+        ROTEADOR_SLO_S      TTFT alvo p95 do chat (padrão 2)
+        ROTEADOR_HISTORICO  dias de histórico do comparador (padrão 7)
+    """
+    global _roteador
+    with _roteador_lock:
+        if _roteador is None:
+            padrao = 'openai/gpt-oss-120b,openai/gpt-oss-20b,llama-3.3-70b-versatile'
+            modelos = [m.strip() for m in os.environ.get('ROTEADOR_MODELOS', padrao).split(',') if m.strip()]
+            _roteador = RoteadorModelos(modelos, slo_s=float(os.environ.get('ROTEADOR_SLO_S', 2)))
+            try:
+                preparar(TABELA_COMPARADOR)
+                dias = int(os.environ.get('ROTEADOR_HISTORICO', 7))
+                _roteador.carregar_historico(
+                    ler_periodo(TABELA_COMPARADOR, inicio=date.today() - timedelta(days=dias))
+                )
+            except Exception:
+                pass  # sem histórico o roteador começa pela ordem de preferência
+        return _roteador
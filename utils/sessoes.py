@@ -0,0 +1,377 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from itertools import islice
+
+from utils.janela import JanelaConversa
+
+# ============================================================
+# utils/sessoes.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Guardar as conversas do chat com memória limitada e sobrevivendo a
+# reinícios.
+#
+# Antes: st.session_state.chat_history era uma lista que crescia sem
+# limite em cada sessão e sumia quando o processo reiniciava — com
+# muitos usuários, o maior consumo de memória do app. Agora:
+# - cada conversa tem um id (vai na URL: ?sessao=<id>) e um log em
+#   disco, uma linha JSON compacta por mensagem (["u", "texto"]),
+#   acrescentada ao fim de cada turno
+# - só as `max_residentes` mensagens mais recentes ficam em memória;
+#   as antigas continuam no log e são lidas sob demanda (ex: se o
+#   resumo da janela ainda precisar delas)
+# - sessões frias (paradas há `ociosa_s` ou além de `max_sessoes`, LRU)
+#   saem da memória — o log já está em disco. Se alguém ainda segura a
+#   sessão despejada (ex: uma geração em andamento), obter() devolve o
+#   mesmo objeto: dois SessaoChat nunca escrevem no mesmo log
+# - ao reconectar com o mesmo id, a sessão volta preguiçosamente: só a
+#   cauda do log é lida, junto com o resumo da janela (<id>.json)
+# - estatisticas() informa a memória por sessão e o total
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não decide o que enviar ao modelo (isso é utils/janela.py)
+# ============================================================
+
+PASTA_SESSOES = 'data/sessoes'
+
+# Ids viram nomes de arquivo: só letras, números, '_' e '-'
+_ID_VALIDO = re.compile(r'^[\w-]{1,64}$')
+
+# Papéis abreviados no log
+_PAPEIS   = {'user': 'u', 'assistant': 'a', 'system': 's'}
+_PAPEIS_R = {v: k for k, v in _PAPEIS.items()}
+
+
+def id_valido(sessao_id: str) -> bool:
+    return bool(_ID_VALIDO.match(sessao_id or ''))
+
+
+def novo_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _tamanho(msg: dict) -> int:
+    # Estimativa do que a mensagem ocupa na memória (dict + texto)
+    return sys.getsizeof(msg) + sys.getsizeof(msg['content'])
+
+
+class SessaoChat:
+    """Uma conversa: cauda residente + log em disco.
+
+    Indexável como uma lista do histórico INTEIRO (índices absolutos):
+    len(), sessao[i] e sessao[a:b] funcionam mesmo para mensagens que
+    já saíram da memória — essas são lidas do log. Cada sessao[i] fora
+    da cauda relê o log: para percorrer, use iter(), reversed() ou uma
+    fatia, que leem a parte antiga uma vez só. Para exibir, use
+    recentes().
+
+    Parâmetros:
+        sessao_id (str): id da conversa
+        pasta (str): onde ficam <id>.jsonl e <id>.json
+        janela (JanelaConversa): janela de contexto desta conversa
+        max_residentes (int): mensagens mantidas em memória
+    """
+
+    def __init__(self, sessao_id: str, pasta: str, janela: JanelaConversa, max_residentes: int = 40):
+        self.sessao_id      = sessao_id
+        self.janela         = janela
+        self.max_residentes = max_residentes
+        self.cliente_id     = None
+        self.arquivo_log    = os.path.join(pasta, f'{sessao_id}.jsonl')
+        self.arquivo_meta   = os.path.join(pasta, f'{sessao_id}.json')
+
+        self._mensagens = []     # cauda residente
+        self._inicio    = 0      # índice absoluto de _mensagens[0]
+        self._salvas    = 0      # mensagens (absolutas) já no log
+        self._bytes     = 0
+        self._lock      = threading.RLock()
+        self.ultimo_uso = time.monotonic()
+        self.leituras_disco = 0
+
+    # ---------- lista do histórico ----------
+
+    def __len__(self) -> int:
+        return self._inicio + len(self._mensagens)
+
+    def __getitem__(self, item):
+        with self._lock:
+            if isinstance(item, slice):
+                inicio, fim, passo = item.indices(len(self))
+                if passo != 1:
+                    return list(self)[item]   # uma leitura do log, não uma por índice
+                if inicio >= self._inicio:
+                    return self._mensagens[inicio - self._inicio:fim - self._inicio]
+                antigas = self._ler_log(inicio, min(fim, self._inicio))
+                return antigas + self._mensagens[:max(fim - self._inicio, 0)]
+            if item < 0:
+                item += len(self)
+            if not 0 <= item < len(self):
+                raise IndexError(item)
+            if item >= self._inicio:
+                return self._mensagens[item - self._inicio]
+            return self._ler_log(item, item + 1)[0]
+
+    def __iter__(self):
+        # Uma passada: o log até a cauda residente, depois a cauda
+        with self._lock:
+            inicio, residentes = self._inicio, list(self._mensagens)
+        if inicio:
+            yield from self._ler_log(0, inicio)
+        yield from residentes
+
+    def __reversed__(self):
+        # Da mais recente para a mais antiga; a parte antiga só é lida
+        # (de uma vez) se quem percorre passar da cauda residente
+        with self._lock:
+            inicio, residentes = self._inicio, list(self._mensagens)
+        yield from reversed(residentes)
+        if inicio:
+            yield from reversed(self._ler_log(0, inicio))
+
+    def recentes(self) -> list:
+        """Mensagens residentes (as mais recentes), para exibir."""
+        with self._lock:
+            return list(self._mensagens)
+
+    def anteriores(self) -> int:
+        """Quantas mensagens estão só no disco."""
+        return self._inicio
+
+    def append(self, msg: dict) -> dict:
+        """Acrescenta uma mensagem; devolve a cópia guardada (para descartar())."""
+        with self._lock:
+            msg = {'role': msg['role'], 'content': msg['content']}
+            self._mensagens.append(msg)
+            self._bytes += _tamanho(msg)
+            self._aparar()
+            self.ultimo_uso = time.monotonic()
+            return msg
+
+    def pop(self) -> dict:
+        """Remove a última mensagem (só se ainda não foi para o log)."""
+        with self._lock:
+            if len(self) <= self._salvas or not self._mensagens:
+                raise IndexError('mensagem já salva no log')
+            msg = self._mensagens.pop()
+            self._bytes -= _tamanho(msg)
+            return msg
+
+    def descartar(self, msg: dict) -> bool:
+        """Remove `msg` se ela ainda for a última mensagem e não estiver no log.
+
+        Usado quando uma geração é cancelada de outra thread: só a
+        pergunta daquele turno sai — nunca uma mensagem mais nova.
+        """
+        with self._lock:
+            if self._mensagens and self._mensagens[-1] is msg and len(self) > self._salvas:
+                self.pop()
+                return True
+            return False
+
+    def _aparar(self):
+        # Só sai da memória o que já está no log
+        excesso = min(len(self._mensagens) - self.max_residentes, self._salvas - self._inicio)
+        if excesso > 0:
+            for msg in self._mensagens[:excesso]:
+                self._bytes -= _tamanho(msg)
+            del self._mensagens[:excesso]
+            self._inicio += excesso
+
+    # ---------- disco ----------
+
+    def salvar(self):
+        """Acrescenta ao log as mensagens novas e grava o estado da janela."""
+        with self._lock:
+            if not len(self) and not os.path.exists(self.arquivo_meta):
+                return   # conversa vazia: nada para guardar
+            novas = self._mensagens[self._salvas - self._inicio:]
+            if novas:
+                with open(self.arquivo_log, 'a', encoding='utf-8') as f:
+                    f.writelines(
+                        json.dumps([_PAPEIS.get(m['role'], m['role']), m['content']], ensure_ascii=False) + '\n'
+                        for m in novas
+                    )
+                self._salvas = len(self)
+            resumo, resumidos_ate = self.janela.estado()
+            meta = {'cliente_id': self.cliente_id, 'resumo': resumo,
+                    'resumidos_ate': min(resumidos_ate, self._salvas)}
+            temporario = f'{self.arquivo_meta}.{os.getpid()}.tmp'
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(temporario, self.arquivo_meta)
+            self._aparar()
+
+    def restaurar(self):
+        """Lê do disco o estado da janela e a cauda do log (reconexão)."""
+        with self._lock:
+            try:
+                with open(self.arquivo_meta, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = {}
+            self._reparar_cauda()
+            total = self._contar_linhas()
+            self.cliente_id = meta.get('cliente_id')
+            self._inicio    = max(total - self.max_residentes, 0)
+            self._mensagens = self._ler_log(self._inicio, None)
+            self._salvas    = len(self)
+            self._bytes     = sum(_tamanho(m) for m in self._mensagens)
+            self.janela.restaurar(meta.get('resumo', ''), min(meta.get('resumidos_ate', 0), len(self)))
+
+    def limpar(self):
+        """Apaga a conversa (memória e disco)."""
+        with self._lock:
+            self._mensagens = []
+            self._inicio = self._salvas = self._bytes = 0
+            self.janela.limpar()
+            for caminho in (self.arquivo_log, self.arquivo_meta):
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+
+    def _ler_log(self, inicio: int, fim) -> list:
+        self.leituras_disco += 1
+        try:
+            with open(self.arquivo_log, 'r', encoding='utf-8') as f:
+                linhas = list(islice(f, inicio, fim))
+        except FileNotFoundError:
+            return []
+        mensagens = []
+        for linha in linhas:
+            try:
+                papel, conteudo = json.loads(linha)
+            except ValueError:
+                continue
+            mensagens.append({'role': _PAPEIS_R.get(papel, papel), 'content': conteudo})
+        return mensagens
+
+    def _reparar_cauda(self):
+        # Uma queda no meio da escrita deixa a última linha sem '\n':
+        # corta até a última linha completa, senão o próximo acréscimo
+        # grudaria nela
+        try:
+            with open(self.arquivo_log, 'rb+') as f:
+                tamanho = f.seek(0, os.SEEK_END)
+                if tamanho == 0:
+                    return
+                f.seek(tamanho - 1)
+                if f.read(1) == b'\n':
+                    return
+                f.seek(0)
+                f.truncate(f.read().rfind(b'\n') + 1)
+        except FileNotFoundError:
+            pass
+
+    def _contar_linhas(self) -> int:
+        try:
+            with open(self.arquivo_log, 'rb') as f:
+                return sum(bloco.count(b'\n') for bloco in iter(lambda: f.read(1 << 16), b''))
+        except FileNotFoundError:
+            return 0
+
+    def memoria_bytes(self) -> int:
+        resumo, _ = self.janela.estado()
+        return self._bytes + sys.getsizeof(resumo)
+
+
+class ArmazemSessoes:
+    """Sessões de chat em memória limitada, com o resto em disco.
+
+    Parâmetros:
+        criar_janela (callable): () -> JanelaConversa de uma sessão nova
+        pasta (str): pasta dos logs
+        max_residentes (int): mensagens em memória por sessão
+        max_sessoes (int): sessões em memória ao mesmo tempo (LRU)
+        ociosa_s (float): sessão parada há mais que isso sai da memória
+    """
+
+    def __init__(self, criar_janela, pasta: str = PASTA_SESSOES, max_residentes: int = 40,
+                 max_sessoes: int = 500, ociosa_s: float = 1800):
+        self.pasta          = pasta
+        self.criar_janela   = criar_janela
+        self.max_residentes = max_residentes
+        self.max_sessoes    = max_sessoes
+        self.ociosa_s       = ociosa_s
+        os.makedirs(pasta, exist_ok=True)
+
+        self._sessoes  = OrderedDict()   # sessao_id -> SessaoChat
+        # Despejadas que ainda têm dono (geração em andamento, script no
+        # meio da execução): somem sozinhas quando ninguém mais as usa
+        self._despejadas = weakref.WeakValueDictionary()
+        self._lock     = threading.Lock()
+        self.restauradas = 0
+        self.despejadas  = 0
+
+    def obter(self, sessao_id: str) -> SessaoChat:
+        """A sessão do id — da memória, do disco ou nova. KeyError se o id for inválido."""
+        if not id_valido(sessao_id):
+            raise KeyError(sessao_id)
+        with self._lock:
+            sessao = self._sessoes.get(sessao_id)
+            if sessao is not None:
+                self._sessoes.move_to_end(sessao_id)
+            else:
+                # Despejada mas ainda em uso: volta a mesma, sem reler o disco
+                sessao = self._despejadas.pop(sessao_id, None)
+                if sessao is not None:
+                    self._sessoes[sessao_id] = sessao
+        if sessao is None:
+            sessao = SessaoChat(sessao_id, self.pasta, self.criar_janela(), self.max_residentes)
+            if os.path.exists(sessao.arquivo_log) or os.path.exists(sessao.arquivo_meta):
+                sessao.restaurar()
+                with self._lock:
+                    self.restauradas += 1
+            with self._lock:
+                # Outra thread pode ter restaurado a mesma sessão antes
+                sessao = self._sessoes.setdefault(sessao_id, sessao)
+        sessao.ultimo_uso = time.monotonic()
+        self._despejar()
+        return sessao
+
+    def _despejar(self):
+        agora = time.monotonic()
+        with self._lock:
+            frias = [s for s in self._sessoes.values() if agora - s.ultimo_uso > self.ociosa_s]
+            excesso = len(self._sessoes) - len(frias) - self.max_sessoes
+            if excesso > 0:
+                quentes = [s for s in self._sessoes.values() if s not in frias]
+                frias += quentes[:excesso]   # as menos usadas (ordem LRU)
+            for sessao in frias:
+                del self._sessoes[sessao.sessao_id]
+                self._despejadas[sessao.sessao_id] = sessao
+            self.despejadas += len(frias)
+        # Grava fora do lock do armazém — o disco não trava as outras sessões
+        for sessao in frias:
+            sessao.salvar()
+
+    def salvar_todas(self):
+        with self._lock:
+            sessoes = list(self._sessoes.values())
+        for sessao in sessoes:
+            sessao.salvar()
+
+    def estatisticas(self) -> dict:
+        """Memória por sessão (maiores primeiro) e totais."""
+        with self._lock:
+            sessoes = list(self._sessoes.values())
+        por_sessao = sorted((
+            {'sessao': s.sessao_id, 'mensagens': len(s), 'residentes': len(s._mensagens),
+             'memoria_kb': round(s.memoria_bytes() / 1024, 1)}
+            for s in sessoes
+        ), key=lambda r: -r['memoria_kb'])
+        return {
+            'em_memoria':  len(sessoes),
+            'memoria_kb':  round(sum(r['memoria_kb'] for r in por_sessao), 1),
+            'restauradas': self.restauradas,
+            'despejadas':  self.despejadas,
+            'por_sessao':  por_sessao,
+        }
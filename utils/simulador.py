@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.tokens import contar_mensagens, contar_tokens, TOKENS_POR_MENSAGEM
+
+# ============================================================
+# utils/simulador.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Imitar localmente o endpoint de chat da Groq para testes de carga.
+#
+# Testar latência e carga contra a API real gasta cota e depende da
+# rede. Este servidor responde em /openai/v1/chat/completions no
+# mesmo formato da Groq (com e sem streaming, usage em x_groq.usage
+# no último chunk), com tempos e falhas configuráveis e
+# reproduzíveis (semente fixa).
+#
+# Uso:
+#     python -m utils.simulador                 # sobe em 127.0.0.1:8765
+#     GROQ_SIMULADOR=http://127.0.0.1:8765 streamlit run app.py
+#
+# Configuração (variáveis de ambiente):
+#     SIMULADOR_PORTA        porta (padrão 8765)
+#     SIMULADOR_TTFT_S       tempo até o primeiro token (padrão 0.3)
+#     SIMULADOR_TOKENS_S     velocidade de geração (padrão 300)
+#     SIMULADOR_TOKENS       tokens por resposta, se max_tokens não vier (padrão 200)
+#     SIMULADOR_TAXA_ERRO    fração de respostas 500 (padrão 0)
+#     SIMULADOR_TAXA_429     fração de respostas 429 (padrão 0)
+#     SIMULADOR_RETRY_AFTER  segundos no header Retry-After do 429 (padrão 1)
+#     SIMULADOR_PREFILL_MS   ms por token de prompt fora do cache (padrão 0.05)
+#     SIMULADOR_SEMENTE      semente do sorteio de falhas (padrão 42)
+#     SIMULADOR_MODELOS      JSON {modelo: {"ttft_s": .., "tokens_s": ..}}
+#                            para dar a cada modelo seus próprios tempos
+#
+# Cache de prompt: o servidor lembra os prefixos de mensagens já
+# vistos e informa prompt_tokens_details.cached_tokens — e só cobra
+# prefill dos tokens fora do cache, como um provedor real.
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não gera respostas com sentido (só texto de enchimento)
+# ============================================================
+
+PALAVRAS = (
+    'Com base no seu perfil moderado, uma boa estratégia é manter a reserva '
+    'de emergência em produtos de liquidez diária e diversificar o restante '
+    'entre renda fixa e fundos, sempre respeitando seus objetivos e prazos.'
+).split()
+
+MAX_PREFIXOS = 1024
+
+
+class ConfigSimulador:
+    """Parâmetros do simulador, lidos do ambiente na criação."""
+
+    def __init__(self):
+        self.ttft_s        = float(os.environ.get('SIMULADOR_TTFT_S', 0.3))
+        self.tokens_s      = float(os.environ.get('SIMULADOR_TOKENS_S', 300))
+        self.tokens        = int(os.environ.get('SIMULADOR_TOKENS', 200))
+        self.taxa_erro     = float(os.environ.get('SIMULADOR_TAXA_ERRO', 0))
+        self.taxa_429      = float(os.environ.get('SIMULADOR_TAXA_429', 0))
+        self.retry_after   = float(os.environ.get('SIMULADOR_RETRY_AFTER', 1))
+        self.prefill_ms    = float(os.environ.get('SIMULADOR_PREFILL_MS', 0.05))
+        self.semente       = int(os.environ.get('SIMULADOR_SEMENTE', 42))
+        self.modelos       = json.loads(os.environ.get('SIMULADOR_MODELOS', '{}'))
+
+    def tempos(self, modelo: str) -> tuple:
+        """(ttft_s, tokens_s) do modelo."""
+        proprio = self.modelos.get(modelo, {})
+        return proprio.get('ttft_s', self.ttft_s), proprio.get('tokens_s', self.tokens_s)
+
+
+class EstadoSimulador:
+    """Sorteio de falhas (reproduzível) e prefixos já vistos."""
+
+    def __init__(self, config: ConfigSimulador):
+        self.config    = config
+        self._lock     = threading.Lock()
+        self._sorteio  = random.Random(config.semente)
+        self._prefixos = OrderedDict()   # hash do prefixo -> tokens do prefixo
+
+    def sortear_falha(self) -> int:
+        """Status HTTP de falha (429/500) ou None."""
+        with self._lock:
+            x = self._sorteio.random()
+        if x < self.config.taxa_429:
+            return 429
+        if x < self.config.taxa_429 + self.config.taxa_erro:
+            return 500
+        return None
+
+    def tokens_em_cache(self, mensagens: list) -> int:
+        """Tokens do maior prefixo de mensagens já visto; registra os novos."""
+        h = hashlib.sha256()
+        acumulado = 0
+        em_cache = 0
+        with self._lock:
+            # A última mensagem (pergunta atual) nunca conta como prefixo
+            for m in mensagens[:-1]:
+                h.update(json.dumps([m.get('role'), m.get('content')], ensure_ascii=False).encode('utf-8'))
+                acumulado += TOKENS_POR_MENSAGEM + contar_tokens(m.get('content') or '')
+                chave = h.hexdigest()
+                if chave in self._prefixos:
+                    self._prefixos.move_to_end(chave)
+                    em_cache = acumulado
+                else:
+                    self._prefixos[chave] = acumulado
+            while len(self._prefixos) > MAX_PREFIXOS:
+                self._prefixos.popitem(last=False)
+        return em_cache
+
+
+class ManipuladorSimulador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive, como a API real
+    estado: EstadoSimulador = None
+
+    def log_message(self, formato, *args):
+        pass  # sem log por requisição — atrapalha o benchmark
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/openai/v1/models':
+            self._json(200, {'object': 'list', 'data': []})
+        else:
+            self._erro(404, 'not_found', 'rota desconhecida')
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/openai/v1/chat/completions':
+            self._erro(404, 'not_found', 'rota desconhecida')
+            return
+        tamanho = int(self.headers.get('Content-Length', 0))
+        corpo   = json.loads(self.rfile.read(tamanho) or b'{}')
+
+        config = self.estado.config
+        falha  = self.estado.sortear_falha()
+        if falha == 429:
+            self._erro(429, 'rate_limit_exceeded', 'Rate limit reached (simulado)',
+                       {'Retry-After': f'{config.retry_after:g}'})
+            return
+        if falha == 500:
+            self._erro(500, 'internal_server_error', 'Erro interno (simulado)')
+            return
+
+        mensagens = corpo.get('messages', [])
+        modelo    = corpo.get('model', 'simulado')
+        ttft_s, tokens_s = config.tempos(modelo)
+
+        prompt_tokens = contar_mensagens(mensagens)
+        em_cache      = self.estado.tokens_em_cache(mensagens)
+        # Prefill: só os tokens fora do cache custam tempo
+        ttft_s += (prompt_tokens - em_cache) * config.prefill_ms / 1000
+
+        n_tokens = int(corpo.get('max_tokens') or corpo.get('max_completion_tokens') or config.tokens)
+        pedacos  = [PALAVRAS[i % len(PALAVRAS)] + ' ' for i in range(n_tokens)]
+        usage = {
+            'prompt_tokens':         prompt_tokens,
+            'completion_tokens':     n_tokens,
+            'total_tokens':          prompt_tokens + n_tokens,
+            'prompt_tokens_details': {'cached_tokens': em_cache},
+        }
+        ident = f'chatcmpl-{uuid.uuid4().hex[:24]}'
+
+        if corpo.get('stream'):
+            self._stream(ident, modelo, pedacos, usage, ttft_s, tokens_s)
+        else:
+            time.sleep(ttft_s + n_tokens / tokens_s)
+            self._json(200, {
+                'id':      ident,
+                'object':  'chat.completion',
+                'created': int(time.time()),
+                'model':   modelo,
+                'choices': [{
+                    'index':         0,
+                    'message':       {'role': 'assistant', 'content': ''.join(pedacos)},
+                    'finish_reason': 'stop',
+                }],
+                'usage': usage,
+            })
+
+    def _stream(self, ident, modelo, pedacos, usage, ttft_s, tokens_s):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def chunk(delta, finish_reason=None, extra=None):
+            dados = {
+                'id':      ident,
+                'object':  'chat.completion.chunk',
+                'created': int(time.time()),
+                'model':   modelo,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            dados.update(extra or {})
+            self._enviar(f'data: {json.dumps(dados, ensure_ascii=False)}\n\n')
+
+        try:
+            time.sleep(ttft_s)
+            chunk({'role': 'assistant', 'content': ''})
+            intervalo = 1 / tokens_s if tokens_s > 0 else 0
+            proximo   = time.perf_counter()
+            for pedaco in pedacos:
+                # Ritmo pelo relógio, não por sleep acumulado — não deriva
+                proximo += intervalo
+                espera = proximo - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+                chunk({'content': pedaco})
+            chunk({}, 'stop', {'x_groq': {'id': ident, 'usage': usage}})
+            self._enviar('data: [DONE]\n\n')
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # Cliente fechou o stream (ex: recusa detectada) — normal
+            self.close_connection = True
+
+    def _enviar(self, texto: str):
+        dados = texto.encode('utf-8')
+        self.wfile.write(f'{len(dados):x}\r\n'.encode('ascii') + dados + b'\r\n')
+        self.wfile.flush()
+
+    def _json(self, status: int, corpo: dict, headers: dict = None):
+        dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _erro(self, status: int, tipo: str, mensagem: str, headers: dict = None):
+        self._json(status, {'error': {'message': mensagem, 'type': tipo, 'code': tipo}}, headers)
+
+
+def criar_servidor(porta: int = None, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Cria (sem iniciar) o servidor simulado. porta=0 escolhe uma livre."""
+    if porta is None:
+        porta = int(os.environ.get('SIMULADOR_PORTA', 8765))
+    manipulador = type('Manipulador', (ManipuladorSimulador,), {'estado': EstadoSimulador(ConfigSimulador())})
+    servidor = ThreadingHTTPServer((host, porta), manipulador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def iniciar_em_fundo(porta: int = 0) -> tuple:
+    """Sobe o simulador numa thread (para scripts de benchmark).
+
+    Retorna:
+        tuple: (servidor, url_base) — chame servidor.shutdown() no fim
+    """
+    servidor = criar_servidor(porta)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    host, porta = servidor.server_address[:2]
+    return servidor, f'http://{host}:{porta}'
+
+
+if __name__ == '__main__':
+    servidor = criar_servidor()
+    host, porta = servidor.server_address[:2]
+    print(f'Simulador em http://{host}:{porta}  (GROQ_SIMULADOR=http://{host}:{porta})')
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,90 @@
+import time
+
+import numpy as np
+
+# ============================================================
+# utils/tempos.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Medir em que etapa o tempo de cada requisição é gasto.
+#
+# A latência total sozinha mistura montagem do contexto, rede/fila
+# do provedor e velocidade de geração. Aqui separamos:
+# - tempo_contexto_s: montar contexto + histórico
+# - tempo_envio_s:    create() até o provedor aceitar a requisição
+# - ttft_s:           envio até o primeiro chunk com texto (TTFT)
+# - itl_p50_ms/p95:   intervalo entre chunks (inter-token latency)
+# - tempo_render_s:   tempo gasto atualizando a tela
+#
+# Os instantes dos chunks vêm da thread que lê o stream (no momento da
+# chegada), não de quem desenha a tela: o tempo de render não vira ITL.
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não grava métricas (só devolve um dict)
+# ============================================================
+
+
+class CronometroRequisicao:
+    """Marca os instantes de uma requisição em streaming."""
+
+    def __init__(self):
+        self.t_inicio         = time.perf_counter()
+        self.t_envio          = None
+        self.tempo_contexto_s = None
+        self.tempo_envio_s    = None
+        self.t_chunks         = []    # instante de cada chunk com texto
+
+    def marcar_contexto(self):
+        """Fim da montagem do contexto / lista de mensagens."""
+        self.tempo_contexto_s = time.perf_counter() - self.t_inicio
+
+    def iniciar_envio(self, instante: float = None):
+        """Logo antes de client.chat.completions.create().
+
+        Parâmetros:
+            instante (float): perf_counter já marcado por quem envia (ex: a
+                corrida do hedge); None usa o momento atual
+        """
+        self.t_envio = instante if instante is not None else time.perf_counter()
+
+    def marcar_envio(self):
+        """Logo depois de create() devolver o stream."""
+        self.tempo_envio_s = time.perf_counter() - self.t_envio
+
+    def chunk(self, delta: str, instante: float = None):
+        """Registra a chegada de um chunk (ignora chunks sem texto).
+
+        Parâmetros:
+            delta (str): texto do chunk
+            instante (float): perf_counter de quando o chunk chegou, medido
+                na thread que lê o stream; None usa o momento atual
+        """
+        if delta:
+            self.t_chunks.append(instante if instante is not None else time.perf_counter())
+
+    def resumo(self, tempo_render_s: float = None) -> dict:
+        """Tempos por etapa, prontos para ir para as métricas.
+
+        Valores que não se aplicam (ex: resposta do cache) ficam None.
+        """
+        ttft = None
+        p50 = p95 = None
+        if self.t_envio is not None and self.t_chunks:
+            ttft = self.t_chunks[0] - self.t_envio
+        if len(self.t_chunks) > 1:
+            intervalos_ms = np.diff(self.t_chunks) * 1000
+            p50, p95 = np.percentile(intervalos_ms, [50, 95])
+
+        return {
+            'tempo_contexto_s': _arredondar(self.tempo_contexto_s, 3),
+            'tempo_envio_s':    _arredondar(self.tempo_envio_s, 3),
+            'ttft_s':           _arredondar(ttft, 3),
+            'itl_p50_ms':       _arredondar(p50, 1),
+            'itl_p95_ms':       _arredondar(p95, 1),
+            'tempo_render_s':   _arredondar(tempo_render_s, 3),
+        }
+
+
+def _arredondar(valor, casas):
+    return None if valor is None else round(float(valor), casas)
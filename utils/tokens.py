@@ -0,0 +1,145 @@
+import math
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# ============================================================
+# utils/tokens.py
+#
+# Responsabilidade ÚNICA deste arquivo:
+# Contar tokens LOCALMENTE, antes de enviar a requisição.
+#
+# Antes, os tokens só eram conhecidos pelo chunk.usage do último
+# chunk — e quando o provedor não mandava usage, a métrica ficava 0
+# e estragava as médias do dashboard. Agora:
+# - contamos o prompt antes do envio
+# - aplicamos um teto de tokens por requisição (corta contexto/histórico)
+# - estimamos os tokens quando o provedor não informa usage
+#
+# Tokenizador: tiktoken com o encoding o200k_base (a família usada
+# pelos modelos gpt-oss). Se o tiktoken não estiver instalado ou o
+# encoding não puder ser carregado (ex: sem internet na primeira vez),
+# cai para uma heurística por palavras — metodo() informa qual está ativo.
+#
+# O que este arquivo NÃO faz:
+# - Não importa Streamlit
+# - Não chama o modelo
+# ============================================================
+
+ENCODING = 'o200k_base'
+
+# Custo fixo aproximado de cada mensagem no formato de chat
+# (marcadores de papel/início/fim) e da resposta do assistente
+TOKENS_POR_MENSAGEM = 4
+TOKENS_POR_RESPOSTA = 3
+
+# Heurística: palavras e sinais de pontuação; palavras longas valem
+# mais de um token (~4 caracteres por token)
+_PALAVRAS = re.compile(r'\w+|[^\w\s]', re.UNICODE)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(ENCODING)
+    except Exception:
+        return None
+
+
+def metodo() -> str:
+    """'tiktoken' ou 'heuristica' — registrado junto com as estimativas."""
+    return 'tiktoken' if _encoding() is not None else 'heuristica'
+
+
+def contar_tokens(texto: str) -> int:
+    """Conta os tokens de um texto.
+
+    Parâmetros:
+        texto (str): texto a contar
+
+    Retorna:
+        int: tokens (exatos com tiktoken, aproximados na heurística)
+    """
+    if not texto:
+        return 0
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(texto, disallowed_special=()))
+    return sum(math.ceil(len(p) / 4) for p in _PALAVRAS.findall(texto))
+
+
+def contar_mensagens(mensagens: list) -> int:
+    """Tokens de uma lista de mensagens de chat, como o provedor conta."""
+    return TOKENS_POR_RESPOSTA + sum(
+        TOKENS_POR_MENSAGEM + contar_tokens(m['content']) for m in mensagens
+    )
+
+
+def aplicar_teto(fixas: list, contexto: str, historico: list, teto: int,
+                 remontar_contexto=None) -> tuple:
+    """Garante que o prompt caiba em `teto` tokens antes do envio.
+
+    Ordem dos cortes:
+    1. remonta o contexto com um orçamento menor (se remontar_contexto
+       for informado) — o contexto é o maior e o mais fácil de reduzir
+    2. remove as mensagens mais antigas do histórico (a última — a
+       pergunta atual — sempre fica)
+
+    Parâmetros:
+        fixas (list): mensagens que nunca são cortadas (system prompt)
+        contexto (str): CONTEXTO já montado
+        historico (list): mensagens da conversa (já na janela)
+        teto (int): máximo de tokens do prompt; <= 0 desliga
+        remontar_contexto (callable): função (orcamento) -> str
+
+    Retorna:
+        tuple: (mensagens, contexto, tokens_prompt, cortes) — cortes
+            é um dict {'contexto': tokens removidos, 'historico': mensagens removidas}
+    """
+    historico = list(historico)
+    cortes = {'contexto': 0, 'historico': 0}
+
+    def montar():
+        return fixas + [{'role': 'user', 'content': contexto}] + historico
+
+    total = contar_mensagens(montar())
+    if teto <= 0 or total <= teto:
+        return montar(), contexto, total, cortes
+
+    if remontar_contexto is not None:
+        excesso = total - teto
+        tokens_contexto = contar_tokens(contexto)
+        novo = remontar_contexto(max(tokens_contexto - excesso, 1))
+        cortes['contexto'] = tokens_contexto - contar_tokens(novo)
+        contexto = novo
+        total = contar_mensagens(montar())
+
+    while total > teto and len(historico) > 1:
+        removida = historico.pop(0)
+        cortes['historico'] += 1
+        total -= TOKENS_POR_MENSAGEM + contar_tokens(removida['content'])
+
+    return montar(), contexto, total, cortes
+
+
+def tokens_em_cache(usage) -> int:
+    """Tokens do prompt que o provedor leu do cache de prompt.
+
+    Formato OpenAI: usage.prompt_tokens_details.cached_tokens. Aceita
+    objeto ou dict; devolve None se o provedor não informar.
+    """
+    if usage is None:
+        return None
+    detalhes = usage.get('prompt_tokens_details') if isinstance(usage, dict) \
+        else getattr(usage, 'prompt_tokens_details', None)
+    if detalhes is None:
+        return None
+    if isinstance(detalhes, dict):
+        return detalhes.get('cached_tokens')
+    return getattr(detalhes, 'cached_tokens', None)